@@ -11,7 +11,15 @@ import logging
 from logging.handlers import TimedRotatingFileHandler
 from flask_cors import CORS
 
-from .services.model_loader import clean_model_cache
+from .services import backends
+from .services.admission import admission
+from .services.batching import BatchScheduler
+from .services.inference_pool import inference_pool, pool_settings
+from .services.metadata_cache import metadata_cache
+from .services.metrics import registry
+from .services.result_cache import result_cache
+from .services.model_loader import clean_model_cache, model_cache
+from .services.warmup import ModelUsage, WarmupService
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -42,7 +50,7 @@ def create_app(config_class=Config):
     app.logger.info('Microservice started')
 
     # Initialize the database
-    from app.models import filemanager
+    from app.models import filemanager, upload_session
 
     db.init_app(app)
     migrate.init_app(app, db)
@@ -58,12 +66,64 @@ def create_app(config_class=Config):
     app.register_blueprint(filemanager_bp, url_prefix='/api/v1/filemanager')
     app.register_blueprint(predict_bp, url_prefix='/api/v1/predict')
 
+    metadata_cache.ttl = app.config['METADATA_CACHE_TTL']
+    metadata_cache.max_entries = app.config['METADATA_CACHE_MAX_ENTRIES']
+    from app.services.file_listing import FileSearch, file_counts
+    file_counts.ttl = app.config['FILE_LIST_COUNT_TTL']
+    with app.app_context():
+        FileSearch.detect()
+    admission.configure(
+        max_inflight=app.config['ADMISSION_MAX_INFLIGHT'],
+        max_inflight_per_model=app.config['ADMISSION_MAX_INFLIGHT_PER_MODEL'],
+        model_limits=app.config['ADMISSION_MODEL_LIMITS'],
+        retry_after=app.config['ADMISSION_RETRY_AFTER']
+    )
+    result_cache.configure(
+        app.config['RESULT_CACHE_ENABLED'],
+        max_entries=app.config['RESULT_CACHE_MAX_ENTRIES'],
+        ttl=app.config['RESULT_CACHE_TTL'],
+        disk_path=app.config['RESULT_CACHE_DISK_PATH']
+    )
+    backends.configure(app.config['INFERENCE_BACKEND'], app.config['MODEL_BACKENDS'], app.config['SERVE_QUANTIZED'])
+    model_cache.configure(
+        max_bytes=app.config['MODEL_CACHE_MAX_BYTES'],
+        max_models=app.config['MODEL_CACHE_MAX_MODELS'],
+        pinned=app.config['MODEL_CACHE_PINNED']
+    )
+
+    # Under gunicorn the master started the pool and attached this worker already (gunicorn.conf.py)
+    inference_pool.timeout = app.config['INFERENCE_TIMEOUT']
+    if not inference_pool.enabled and inference_pool.start(app.config['INFERENCE_WORKERS'],
+                                                           app.config['INFERENCE_WORKER_MODELS'],
+                                                           pool_settings(app.config)):
+        inference_pool.attach(0)
+
+    from app.services.PredictService import PredictService, predict_pipeline
+    if app.config['PIPELINE_ENABLED']:
+        predict_pipeline.configure(PredictService.pipeline_stages(app.config))
+
+    from app.services.upload_session import UploadSessionService
     scheduler = BackgroundScheduler()
     if not any(job.name == "clean_model_cache_job" for job in scheduler.get_jobs()):
-        scheduler.add_job(clean_model_cache, trigger='interval', hours=1, id='clean_model_cache_job')
+        scheduler.add_job(clean_model_cache, trigger='interval', hours=1, id='clean_model_cache_job',
+                          kwargs={'max_age_minutes': app.config['MODEL_CACHE_MAX_IDLE_MINUTES']})
+    if app.config['RESULT_CACHE_ENABLED'] and \
+            not any(job.name == "purge_result_cache_job" for job in scheduler.get_jobs()):
+        scheduler.add_job(result_cache.purge_expired, trigger='interval', minutes=10, id='purge_result_cache_job')
+    if not any(job.name == "purge_upload_sessions_job" for job in scheduler.get_jobs()):
+        scheduler.add_job(UploadSessionService.purge_expired, trigger='interval', minutes=30,
+                          id='purge_upload_sessions_job', args=[app])
+    if not any(job.name == "save_model_usage_job" for job in scheduler.get_jobs()):
+        scheduler.add_job(ModelUsage.save, trigger='interval', minutes=5, id='save_model_usage_job',
+                          args=[app.config['MODEL_USAGE_FILE']])
 
     scheduler.start()
 
+    # Preload and warm up models in the background
+    ModelUsage.half_life = app.config['MODEL_USAGE_HALF_LIFE_HOURS'] * 3600
+    ModelUsage.load(app.config['MODEL_USAGE_FILE'])
+    WarmupService.start_preload(app)
+
     # Define the routes
     @app.get('/')
     def index():
@@ -73,9 +133,46 @@ def create_app(config_class=Config):
     def api_v1():
         return jsonify({'status': 'service is running'}), 200
 
+    @app.get('/api/v1/ready')
+    def ready():
+        status_code = 200 if WarmupService.is_ready() else 503
+        return jsonify(WarmupService.state), status_code
+
+    @app.get('/api/v1/inference-workers')
+    def inference_workers():
+        return jsonify({'enabled': inference_pool.enabled, **(inference_pool.stats() if inference_pool.enabled else {})}), 200
+
+    @app.get('/api/v1/queue')
+    def queue_depth():
+        """
+        Work currently admitted and waiting, for load balancers and tuning
+        """
+        return jsonify({
+            'admission': admission.stats(),
+            'batchers': BatchScheduler.stats(),
+            'pipeline': predict_pipeline.stats(),
+            'inference_workers': inference_pool.stats() if inference_pool.enabled else None
+        }), 200
+
+    @app.get('/api/v1/pipeline')
+    def pipeline_stats():
+        return jsonify(predict_pipeline.stats()), 200
+
+    @app.get('/metrics')
+    def metrics():
+        return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
     @app.get('/api/v1/gpu')
     def check_gpu():
         from app.services.checkGPUService import check_gpu
         return jsonify(check_gpu()), 200
 
+    @app.get('/api/v1/model-cache')
+    def model_cache_stats():
+        return jsonify({
+            **model_cache.stats(),
+            'metadata': metadata_cache.stats(),
+            'results': result_cache.stats()
+        }), 200
+
     return app
\ No newline at end of file
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -8,13 +9,119 @@ class Config:
     DETECT_FOLDER = 'public/detect'
     IMAGE_FOLDER = 'public/images'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024 # 16MB
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 16 * 1024 * 1024)) # 16MB
+    # Default chunk size of upload sessions, must stay below MAX_CONTENT_LENGTH
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)) # 8MB
+    # Hours an upload session is kept after its last chunk, expired ones are garbage-collected
+    UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", 24))
+    # Largest file an upload session accepts
+    UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", 2 * 1024 * 1024 * 1024)) # 2GB, 0 = unlimited
+    # Seconds without a chunk after which a legacy upload (no upload_id) of the same file may start over
+    UPLOAD_LEGACY_IDLE_SECONDS = float(os.getenv("UPLOAD_LEGACY_IDLE_SECONDS", 30))
+
+    # Total of the file listing: exact, cached, approximate or none, and the seconds cached totals are kept
+    FILE_LIST_TOTAL = os.getenv("FILE_LIST_TOTAL", "exact")
+    FILE_LIST_COUNT_TTL = int(os.getenv("FILE_LIST_COUNT_TTL", 30))
+
+    # File cleanup keeps files younger than this, their entry may not be committed yet
+    CLEANUP_MIN_AGE_MINUTES = float(os.getenv("CLEANUP_MIN_AGE_MINUTES", 60))
+    # A model file touched this recently is kept when its entry is deleted, an upload may be deduplicated onto it
+    MODEL_DELETE_GRACE_SECONDS = float(os.getenv("MODEL_DELETE_GRACE_SECONDS", 300))
+    # Leftover chunks in public/temp older than this are removed by the file cleanup
+    CLEANUP_TEMP_MAX_AGE_HOURS = float(os.getenv("CLEANUP_TEMP_MAX_AGE_HOURS", 24))
+
     DEBUG = os.getenv("DEBUG", "true").lower() == "true"
     PORT = int(os.getenv("PORT", 10010))
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3')
     SQLALCHEMY_TRACK_MODIFICATIONS = True
     LOG_FILE = 'logs/app.log'
 
+    # Model cache, evicts least recently used models over the budget
+    MODEL_CACHE_MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024)) # 2GB, 0 = unlimited
+    MODEL_CACHE_MAX_MODELS = int(os.getenv("MODEL_CACHE_MAX_MODELS", 0)) # 0 = unlimited
+    MODEL_CACHE_PINNED = [int(_id) for _id in os.getenv("MODEL_CACHE_PINNED", "").split(",") if _id.strip()]
+    MODEL_CACHE_MAX_IDLE_MINUTES = int(os.getenv("MODEL_CACHE_MAX_IDLE_MINUTES", 0)) # 0 = never evict by age
+
+    # Seconds FileManager metadata stays cached on the predict path
+    METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", 300))
+    METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", 1024)) # 0 = unlimited
+
+    # Models loaded and warmed up in the background at startup: "none", "all", "top:N" or "1,2,3"
+    PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "none")
+    MODEL_USAGE_FILE = os.getenv("MODEL_USAGE_FILE", "cache_dir/model_usage.json")
+    # Hours after which a prediction counts half in the top:N usage ranking, 0 = never decay
+    MODEL_USAGE_HALF_LIFE_HOURS = float(os.getenv("MODEL_USAGE_HALF_LIFE_HOURS", 72))
+
+    # Inference backend: torch, onnx or openvino, falls back to the .pt file until the export exists
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+    # Per-model backend, e.g. {"3": "onnx"}
+    MODEL_BACKENDS = json.loads(os.getenv("MODEL_BACKENDS", "{}"))
+    # Serve the INT8 variant of a model once it passed validation
+    SERVE_QUANTIZED = os.getenv("SERVE_QUANTIZED", "true").lower() == "true"
+    # Share of the quantize images held out to validate the INT8 variant, the rest calibrates it
+    QUANTIZE_VALIDATION_FRACTION = float(os.getenv("QUANTIZE_VALIDATION_FRACTION", 0.2))
+    # Seconds a finished quantize job stays reported
+    QUANTIZE_JOB_TTL = int(os.getenv("QUANTIZE_JOB_TTL", 3600))
+    # Backends exported in the background after a model upload, e.g. "onnx,openvino"
+    EXPORT_BACKENDS = [backend.strip() for backend in os.getenv("EXPORT_BACKENDS", "").split(",") if backend.strip()]
+
+    # Inference worker processes, 0 = run inference in the HTTP worker threads
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 0))
+    # Model to worker assignment, e.g. {"3": 0, "5": 1}, other models are assigned by id
+    INFERENCE_WORKER_MODELS = json.loads(os.getenv("INFERENCE_WORKER_MODELS", "{}"))
+    INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", 0)) # torch threads per worker, 0 = default
+    # Seconds a request waits for an inference worker when it has no shorter deadline
+    INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", 300))
+
+    # Micro-batching of predict requests
+    BATCH_ENABLED = os.getenv("BATCH_ENABLED", "true").lower() == "true"
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 8))
+    BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 10))
+    # Per-model overrides, e.g. {"3": {"max_batch_size": 16, "max_wait_ms": 20}}
+    BATCH_OVERRIDES = json.loads(os.getenv("BATCH_OVERRIDES", "{}"))
+    # Share one inference between identical in-flight requests (same model id and image digest)
+    PREDICT_COALESCE = os.getenv("PREDICT_COALESCE", "false").lower() == "true"
+    # Cache of predict results keyed by model version, image hash and predict params
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "false").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 10000))
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 3600)) # seconds
+    RESULT_CACHE_DISK_PATH = os.getenv("RESULT_CACHE_DISK_PATH", "") # e.g. cache_dir/result_cache.sqlite3
+    # JPEG draft decode size used when the model input size is not known yet
+    INGEST_DRAFT_SIZE = int(os.getenv("INGEST_DRAFT_SIZE", 640))
+    # Batch endpoint limits
+    BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 64))
+    BATCH_MAX_IMAGE_BYTES = int(os.getenv("BATCH_MAX_IMAGE_BYTES", 32 * 1024 * 1024)) # uncompressed size of a zip entry
+    BATCH_DECODE_WORKERS = int(os.getenv("BATCH_DECODE_WORKERS", 0)) # 0 = based on cpu count
+    # Tiled detection (`tiled=true` on predict), defaults for the tile size, overlap fraction and merge NMS IoU
+    TILE_SIZE = int(os.getenv("TILE_SIZE", 640))
+    TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", 0.2))
+    TILE_NMS_IOU = float(os.getenv("TILE_NMS_IOU", 0.5))
+    # Tiled requests needing more tiles than this are rejected, 0 = unlimited
+    TILE_MAX_TILES = int(os.getenv("TILE_MAX_TILES", 64))
+    # Staged predict pipeline (decode -> inference -> serialize) with bounded queues between the stages
+    PIPELINE_ENABLED = os.getenv("PIPELINE_ENABLED", "false").lower() == "true"
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 64)) # max jobs waiting per stage
+    PIPELINE_DECODE_WORKERS = int(os.getenv("PIPELINE_DECODE_WORKERS", 0)) # 0 = based on cpu count
+    PIPELINE_INFERENCE_WORKERS = int(os.getenv("PIPELINE_INFERENCE_WORKERS", 4))
+    PIPELINE_SERIALIZE_WORKERS = int(os.getenv("PIPELINE_SERIALIZE_WORKERS", 2))
+    # Admission control of the predict endpoints, 0 = unlimited
+    ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", 64))
+    ADMISSION_MAX_INFLIGHT_PER_MODEL = int(os.getenv("ADMISSION_MAX_INFLIGHT_PER_MODEL", 16))
+    # Per-model limits, e.g. {"3": 4}
+    ADMISSION_MODEL_LIMITS = json.loads(os.getenv("ADMISSION_MODEL_LIMITS", "{}"))
+    ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1)) # seconds, Retry-After of rejected requests
+    # Longest deadline a request may ask for with X-Request-Deadline / X-Request-Timeout-Ms, in seconds
+    DEADLINE_MAX_SECONDS = float(os.getenv("DEADLINE_MAX_SECONDS", 300))
+    # Priority classes (high, normal, low) of predict work waiting for inference
+    PRIORITY_DEFAULT = os.getenv("PRIORITY_DEFAULT", "normal")
+    PRIORITY_BATCH_DEFAULT = os.getenv("PRIORITY_BATCH_DEFAULT", "low")
+    # API key to priority class, e.g. {"operator-key": "high", "reinspection-key": "low"}
+    PRIORITY_API_KEYS = json.loads(os.getenv("PRIORITY_API_KEYS", "{}"))
+    # Let the priority field / X-Priority header raise the priority above the default, not only lower it
+    PRIORITY_ALLOW_CLIENT_OVERRIDE = os.getenv("PRIORITY_ALLOW_CLIENT_OVERRIDE", "false").lower() == "true"
+    # Low priority work waiting longer than this is served before higher classes
+    PRIORITY_STARVATION_MS = float(os.getenv("PRIORITY_STARVATION_MS", 500))
+
 class DevelopmentConfig(Config):
     DEBUG = True
     FLASK_ENV = 'development'
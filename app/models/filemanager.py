@@ -1,4 +1,6 @@
 # models/filemanager.py
+import json
+
 from app import db
 
 class FileManager(db.Model):
@@ -7,13 +9,19 @@ class FileManager(db.Model):
     """
 
     __tablename__ = 'file_manager'
+    # keyset pagination of the listing, newest first
+    __table_args__ = (db.Index('ix_file_manager_created_at_id', 'created_at', 'id'),)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
+    # SHA-256 of the model file, entries with identical weights share one file named after it
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
     image_name = db.Column(db.String(255), nullable=True)
     description = db.Column(db.String(255), nullable=True)
     file_type = db.Column(db.String(255), nullable=True)
+    # default predict parameters of the model as a JSON object, e.g. {"conf": 0.4, "max_det": 100}
+    predict_params = db.Column(db.Text, nullable=True)
 
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), server_onupdate=db.func.now())
@@ -26,9 +34,11 @@ class FileManager(db.Model):
             'id': self.id,
             'name': self.name,
             'filename': self.filename,
+            'content_hash': self.content_hash,
             'image_name': self.image_name,
             'description': self.description,
             'file_type': self.file_type,
+            'predict_params': json.loads(self.predict_params) if self.predict_params else {},
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
\ No newline at end of file
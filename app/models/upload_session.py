@@ -0,0 +1,71 @@
+# models/upload_session.py
+from app import db
+
+
+class UploadSession(db.Model):
+    """
+    Chunked model upload in progress
+    Chunks are written at their offset into one preallocated part file, the rows in
+    upload_chunk record which chunks have arrived.
+    """
+
+    __tablename__ = 'upload_session'
+
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=True)  # unknown for legacy uploads without a session
+    chunk_size = db.Column(db.Integer, nullable=True)
+    total_chunks = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='open')  # open, finalizing, complete
+    sha256 = db.Column(db.String(64), nullable=True)  # hash of the whole file, checked before finalizing
+    expires_at = db.Column(db.DateTime, nullable=True)  # pushed back by every chunk
+
+    # FileManager fields applied when the upload completes
+    name = db.Column(db.String(255), nullable=True)
+    description = db.Column(db.String(255), nullable=True)
+    file_manager_id = db.Column(db.Integer, nullable=True)
+    image_name = db.Column(db.String(255), nullable=True)
+    predict_params = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), server_onupdate=db.func.now())
+
+    chunks = db.relationship('UploadChunk', backref='session', lazy='dynamic', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<UploadSession {self.id}>'
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'file_type': self.file_type,
+            'total_size': self.total_size,
+            'chunk_size': self.chunk_size,
+            'total_chunks': self.total_chunks,
+            'status': self.status,
+            'sha256': self.sha256,
+            'expires_at': self.expires_at,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+class UploadChunk(db.Model):
+    """
+    Chunk of an upload session that has been written
+    """
+
+    __tablename__ = 'upload_chunk'
+
+    session_id = db.Column(db.String(32), db.ForeignKey('upload_session.id', ondelete='CASCADE'), primary_key=True)
+    chunk_number = db.Column(db.Integer, primary_key=True)
+    offset = db.Column(db.BigInteger, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<UploadChunk {self.session_id}:{self.chunk_number}>'
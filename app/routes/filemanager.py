@@ -2,7 +2,12 @@
 from flask import Blueprint, request, jsonify, current_app
 from http import HTTPStatus
 
+from app.models.filemanager import FileManager
+from app.services.file_listing import TOTAL_MODES
 from app.services.filemanager import FileManagerService
+from app.services.predict_params import PredictParams
+from app.services.PredictService import PredictService
+from app.services.quantization import QuantizationService
 filemanager_bp = Blueprint('filemanager', __name__)
 
 """
@@ -28,6 +33,15 @@ def get_filemanager():
         in: query
         type: string
         description: Search term for filtering files
+      - name: cursor
+        in: query
+        type: string
+        description: Keyset pagination instead of page numbers, empty for the first page then the next_cursor of the previous page
+      - name: total
+        in: query
+        type: string
+        enum: [exact, cached, approximate, none]
+        description: How the total is computed, FILE_LIST_TOTAL by default (none with a cursor)
     responses:
         200:
             description: List of files with pagination info
@@ -39,6 +53,8 @@ def get_filemanager():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', None, type=str)
+        cursor = request.args.get('cursor', None, type=str)
+        total = request.args.get('total') or ('none' if cursor is not None else current_app.config['FILE_LIST_TOTAL'])
 
         # test error handling
         # raise TypeError("This is a test error")
@@ -48,9 +64,15 @@ def get_filemanager():
             return jsonify({'error': 'Page number must be greater than 0'}), HTTPStatus.BAD_REQUEST
         if per_page < 1 or per_page > 100:
             return jsonify({'error': 'Per page must be between 1 and 100'}), HTTPStatus.BAD_REQUEST
+        if total not in TOTAL_MODES:
+            return jsonify({'error': f"Total must be one of {', '.join(TOTAL_MODES)}"}), HTTPStatus.BAD_REQUEST
 
         # Get file list from service
-        result = FileManagerService.get_file_list(search=search, page=page, per_page=per_page)
+        try:
+            result = FileManagerService.get_file_list(search=search, page=page, per_page=per_page, cursor=cursor,
+                                                      total=total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), HTTPStatus.BAD_REQUEST
 
         # Return response
         return jsonify({
@@ -96,6 +118,88 @@ def get_file_info(_id):
         }), HTTPStatus.INTERNAL_SERVER_ERROR
 
 
+@filemanager_bp.route('/<int:_id>/quantize', methods=['POST'])
+def quantize_model(_id):
+    """
+    Build an INT8 variant of a cls model and validate it against the FP32 model
+    Runs in the background, poll GET /<id>/quantize for the job state and the report.
+    ---
+    parameters:
+      - name: files
+        in: formData
+        type: file
+        description: Images (multipart list or zip), QUANTIZE_VALIDATION_FRACTION of them are held out for validation
+      - name: min_agreement
+        in: formData
+        type: number
+        default: 0.98
+        description: Minimum top-1 agreement with the FP32 model to serve the INT8 variant
+    responses:
+        202:
+            description: Quantization started
+        400:
+            description: Invalid parameters
+        409:
+            description: Quantization of this model is already running
+    """
+    try:
+        file_manager = FileManager.query.get(_id)
+        if not file_manager:
+            return jsonify({'status': 'error', 'message': 'File not found'}), HTTPStatus.NOT_FOUND
+
+        min_agreement = request.form.get('min_agreement', 0.98, type=float)
+        files = request.files.getlist('files') + request.files.getlist('file')
+        try:
+            uploads = PredictService.read_batch_uploads(files, current_app.config['BATCH_MAX_FILES'],
+                                                        current_app.config['BATCH_MAX_IMAGE_BYTES'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
+        images = [image for _, image, error in PredictService.decode_images(uploads) if not error]
+
+        result, status_code = QuantizationService.start(current_app._get_current_object(), file_manager, images,
+                                                        min_agreement)
+        return jsonify(result), status_code
+
+    except Exception as e:
+        current_app.logger.error(f"Error in quantize_model: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@filemanager_bp.route('/<int:_id>/quantize', methods=['GET'])
+def get_quantize_report(_id):
+    """
+    Get the last INT8 validation report of a model and the state of its quantize job
+    responses:
+        200:
+            description: Validation report, with the job state when one ran in this process
+        202:
+            description: Quantization is running and no earlier report exists
+        404:
+            description: Model has not been quantized
+    """
+    try:
+        file_manager = FileManager.query.get(_id)
+        if not file_manager:
+            return jsonify({'status': 'error', 'message': 'File not found'}), HTTPStatus.NOT_FOUND
+
+        report = QuantizationService.get_report(file_manager)
+        job = QuantizationService.job(file_manager.id)
+        if not report:
+            if job:
+                status_code = HTTPStatus.ACCEPTED if job['status'] == 'running' else HTTPStatus.OK
+                return jsonify({'status': 'success', 'data': None, 'job': job}), status_code
+            return jsonify({'status': 'error', 'message': 'Model has not been quantized'}), HTTPStatus.NOT_FOUND
+
+        return jsonify({'status': 'success', 'data': report, 'job': job}), HTTPStatus.OK
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), HTTPStatus.INTERNAL_SERVER_ERROR
+
 """
 Create file manager entry
 """
@@ -144,6 +248,71 @@ size_map = {
     'large': (600, 400),
 }
 
+@filemanager_bp.route('/upload-sessions', methods=['POST'])
+def create_upload_session():
+    """
+    Start a chunked model upload
+    The model file is preallocated, the chunks are then sent to /upload-chunk-model with the
+    upload_id, in any order and in parallel. Chunk n covers bytes n * chunk_size to (n + 1) * chunk_size.
+    ---
+    parameters:
+      - name: filename
+        in: formData
+        type: string
+      - name: file_type
+        in: formData
+        type: string
+        default: cls
+      - name: total_size
+        in: formData
+        type: integer
+        required: true
+        description: Size of the model file in bytes, at most UPLOAD_MAX_SIZE
+      - name: chunk_size
+        in: formData
+        type: integer
+        description: Chunk size in bytes, UPLOAD_CHUNK_SIZE by default and at most MAX_CONTENT_LENGTH
+      - name: sha256
+        in: formData
+        type: string
+        description: SHA-256 hex digest of the whole file, checked before the upload completes
+    responses:
+        201:
+            description: Upload session with upload_id, chunk_size and total_chunks
+        400:
+            description: Invalid parameters
+    """
+    try:
+        data = request.form.to_dict() if request.form else (request.get_json(silent=True) or {})
+        if 'predict_params' in data:
+            data['predict_params'] = PredictParams.parse(data['predict_params'])
+        result, status_code = FileManagerService.create_upload_session(data, request.files.get('image'))
+        return jsonify(result), status_code
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
+    except Exception as e:
+        current_app.logger.error(f"Error in create_upload_session: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+@filemanager_bp.route('/upload-sessions/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    """
+    Upload session status
+    Lists the byte ranges and chunks already received, so an interrupted upload only sends the
+    missing chunks.
+    responses:
+        200:
+            description: Session with received_ranges, missing_chunks and the checksum of every chunk
+        404:
+            description: Unknown or expired upload session
+    """
+    try:
+        result, status_code = FileManagerService.get_upload_session(upload_id)
+        return jsonify(result), status_code
+    except Exception as e:
+        current_app.logger.error(f"Error in get_upload_session: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
 @filemanager_bp.route('/upload-chunk-model', methods=['POST'])
 def upload_chunk_model():
     if 'file' not in request.files:
@@ -154,12 +323,22 @@ def upload_chunk_model():
             'name': request.form.get('name'),
             'chunk_number': int(request.form.get('chunk_number', 0)),
             'total_chunks': int(request.form.get('total_chunks', 1)),
-            'description': request.form.get('description', ''),
+            'description': request.form.get('description'),
             'filename': request.form.get('filename', 'uploaded_file'),
             'file_type': request.form.get('file_type', 'cls'),
             'id': request.form.get('id', 0),
-            'image': request.files.get('image')
+            'image': request.files.get('image'),
+            'upload_id': request.form.get('upload_id'),
+            # SHA-256 hex digest of the chunk
+            'checksum': request.form.get('checksum') or request.headers.get('X-Chunk-SHA256'),
+            'predict_params': None
         }
+        if 'predict_params' in request.form:
+            # default predict params of the model as a JSON object, checked before any chunk is stored
+            try:
+                data['predict_params'] = PredictParams.parse(request.form['predict_params'])
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
         result, status_code = FileManagerService.handle_chunk_upload(file, data)
 
         return jsonify(result), status_code
@@ -221,17 +400,42 @@ def delete_file():
 @filemanager_bp.post('/clear-file')
 def clear():
     """
-    Clear file
-    return:
+    Start removing model files, images and temp files no entry references, in the background
+    The cleanup state is kept per worker process: with several workers a cleanup may start in each
+    of them and GET /clear-file reports the one of the worker that answers.
+    ---
+    parameters:
+      - name: dry_run
+        in: query
+        type: boolean
+        default: false
+        description: Only report what would be removed
+    responses:
+        202:
+            description: Cleanup started, poll GET /clear-file for progress and reclaimed bytes
+        409:
+            description: A cleanup is already running
     """
     try:
-        result, status_code = FileManagerService.clear_file()
-        if not result:
-            return jsonify({'status': 'error', 'message': 'Error in clear'}), HTTPStatus.NOT_FOUND
-        return jsonify({'status': 'success', 'message': 'Remove file success'}), HTTPStatus.OK
+        data = request.form.to_dict() if request.form else (request.get_json(silent=True) or {})
+        dry_run = str(request.args.get('dry_run', data.get('dry_run', 'false'))).lower() in ('1', 'true', 'yes')
+        result, status_code = FileManagerService.clear_file(dry_run)
+        return jsonify(result), status_code
     except Exception as e:
         current_app.logger.error(f"Error in clear: {str(e)}")
         return jsonify({
             "status": "error",
             "message": str(e)
         }), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@filemanager_bp.get('/clear-file')
+def clear_status():
+    """
+    Progress of the last file cleanup of this worker process
+    responses:
+        200:
+            description: Status, phase, scanned and removed counts, reclaimed bytes and removed files
+    """
+    from app.services.cleanup import CleanupService
+    return jsonify({'status': 'success', 'data': CleanupService.state}), HTTPStatus.OK
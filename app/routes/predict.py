@@ -1,39 +1,226 @@
 # app/routes/predict.py
-import io
+import hashlib
+import time
+from functools import wraps
 from http import HTTPStatus
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g
+from app.services.admission import admission, Deadline, DeadlineExceeded
+from app.services.image_ingest import ImageIngest
+from app.services.metrics import PREDICT_REQUESTS, PREDICT_STAGE_SECONDS
+from app.services.predict_params import PredictParams
+from app.services.priority import Priority
 from app.services.PredictService import PredictService
-from PIL import Image
+from app.services.response_format import ResponseFormat
 
 predict_bp = Blueprint('predict', __name__)
 
+def _admitted(view):
+    """
+    Admission control of a predict endpoint
+    Rejects the request with 503 (service saturated) or 429 (model saturated) and Retry-After
+    when the in-flight limits are reached, and with 504 when its deadline has already passed.
+    The deadline is available to the view as g.deadline.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            deadline = Deadline.from_headers(request.headers, max_budget=current_app.config['DEADLINE_MAX_SECONDS'])
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid deadline header'}), HTTPStatus.BAD_REQUEST
+        if Deadline.expired(deadline):
+            admission.reject_deadline()
+            return jsonify({'status': 'error', 'message': 'Request deadline exceeded'}), HTTPStatus.GATEWAY_TIMEOUT
+
+        model_id = request.args.get('id') or request.form.get('id') or ''
+        reason = admission.try_acquire(model_id)
+        if reason:
+            status_code = HTTPStatus.SERVICE_UNAVAILABLE if reason == 'global' else HTTPStatus.TOO_MANY_REQUESTS
+            message = 'Server is busy' if reason == 'global' else 'Too many requests for this model'
+            PREDICT_REQUESTS.inc(model_id='', file_type='', status=int(status_code))
+            return jsonify({'status': 'error', 'message': message}), status_code, \
+                {'Retry-After': str(admission.retry_after)}
+
+        g.deadline = deadline
+        try:
+            return view(*args, **kwargs)
+        except DeadlineExceeded as e:
+            admission.reject_deadline()
+            PREDICT_REQUESTS.inc(model_id='', file_type='', status=int(HTTPStatus.GATEWAY_TIMEOUT))
+            return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.GATEWAY_TIMEOUT
+        finally:
+            admission.release(model_id)
+    return wrapper
+
+def _bypass_result_cache():
+    """
+    Request asks to skip the result cache with `X-Result-Cache: bypass` or `Cache-Control: no-cache`
+    """
+    return (request.headers.get('X-Result-Cache', '').lower() == 'bypass'
+            or 'no-cache' in request.headers.get('Cache-Control', '').lower())
+
+def _tiling_options(params):
+    """
+    Tiled detection options of the request, `tiled=true` with optional `tile_size` and `tile_overlap`
+    :param params: request form or query args
+    :return: {'tile_size', 'overlap', 'iou', 'max_tiles'} or None when tiling is not requested
+    :raises ValueError: on invalid values
+    """
+    if params.get('tiled', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    tile_size = int(params.get('tile_size', current_app.config['TILE_SIZE']))
+    overlap = float(params.get('tile_overlap', current_app.config['TILE_OVERLAP']))
+    if tile_size < 32:
+        raise ValueError('tile_size must be at least 32')
+    if not 0 <= overlap < 0.9:
+        raise ValueError('tile_overlap must be between 0 and 0.9')
+    return {'tile_size': tile_size, 'overlap': overlap, 'iou': current_app.config['TILE_NMS_IOU'],
+            'max_tiles': current_app.config['TILE_MAX_TILES']}
+
+def _predict_params():
+    """
+    Predict params of the request from the query string and form fields (the form wins)
+    conf, iou, classes (comma separated ids), max_det, imgsz and top_k
+    :raises ValueError: on invalid values
+    """
+    return PredictParams.parse({**request.args.to_dict(), **request.form.to_dict()})
+
+def _priority(default=None):
+    """
+    Priority class of the request from the API key, `priority` field or X-Priority header
+    :raises ValueError: on an unknown class
+    """
+    return Priority.resolve(
+        request.form.get('priority') or request.args.get('priority'),
+        request.headers.get('X-Priority'),
+        request.headers.get('X-API-Key'),
+        current_app.config,
+        default
+    )
+
 @predict_bp.route('/', methods=['POST'])
+@_admitted
 def predict():
     """
     Predict the class of the image
+    The image is a multipart `file` (encoded image or .npy array) with the model `id` in the form,
+    or a raw RGB uint8 body (Content-Type: application/octet-stream) with the model id in the `id`
+    query parameter and the shape in the X-Image-Height / X-Image-Width / X-Image-Channels headers.
+    Detect models can run tiled with `tiled=true` (form field or query parameter) for large images.
+    Predict params (conf, iou, classes, max_det, imgsz, top_k) override the model defaults.
+    The priority class (high, normal, low) comes from the API key; `priority` or X-Priority can only lower it.
+    The response format follows the Accept header, see ResponseFormat.
+    """
+    try:
+        try:
+            tiling = _tiling_options(request.form if request.form.get('tiled') else request.args)
+            params = _predict_params()
+            priority = _priority()
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
+
+        use_cache = not _bypass_result_cache()
+        hashed = current_app.config['PREDICT_COALESCE'] or (use_cache and current_app.config['RESULT_CACHE_ENABLED'])
+
+        # The image is decoded lazily by PredictService, in the decode stage when the pipeline is enabled
+        if request.mimetype == 'application/octet-stream':
+            _id = request.args.get('id')
+            data = request.get_data()
+            try:
+                shape = (int(request.headers.get('X-Image-Height', 0)),
+                         int(request.headers.get('X-Image-Width', 0)),
+                         int(request.headers.get('X-Image-Channels', 3)))
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
+            image = lambda: ImageIngest.from_raw(data, *shape)
+            digest = hashlib.sha256(data).hexdigest() if hashed else None
+        else:
+            _id = request.form.get('id')
+            image_file = request.files.get('file')
+
+            if not image_file:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'No image provided'
+                }), HTTPStatus.BAD_REQUEST
+
+            if image_file.filename == '' or not PredictService.allowed_file(image_file.filename):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'No selected file or invalid file type'
+                }), HTTPStatus.BAD_REQUEST
+
+            # Decode straight from the upload stream, JPEGs at a reduced resolution near the model input size
+            # (tiled requests keep the full resolution, that is what the tiles are cut from)
+            digest = ImageIngest.hash_stream(image_file.stream) if hashed else None
+            target_size = None if tiling else PredictService.input_size(_id, params.get('imgsz'))
+            image = lambda: ImageIngest.decode_stream(image_file.stream, image_file.filename, target_size)
+
+        mimetype = ResponseFormat.negotiate(request.accept_mimetypes)
+        result, status_code = PredictService.predict(_id, image, digest, use_cache, tiling, params, g.deadline,
+                                                     priority, ResponseFormat.layout(mimetype))
+        # unknown ids are not used as labels to keep the metric cardinality bounded
+        model_id = _id if status_code == HTTPStatus.OK else ''
+        file_type = result.get('type', '')
+        PREDICT_REQUESTS.inc(model_id=model_id, file_type=file_type, status=int(status_code))
+
+        return ResponseFormat.render(result, status_code, mimetype)
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Error in predict: {str(e)}")
+        return jsonify({"error": str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@predict_bp.route('/batch', methods=['POST'])
+@_admitted
+def predict_batch():
+    """
+    Predict many images with one model
+    Images are sent as a multipart list in `files` (or `file`) and/or as zip archives.
+    The response has one entry per image in the original order.
+    Predict params (conf, iou, classes, max_det, imgsz, top_k) apply to every image.
+    Batch requests default to the PRIORITY_BATCH_DEFAULT class (low).
     """
     try:
         _id = request.form.get('id')
-        image_file = request.files.get('file')
+        try:
+            params = _predict_params()
+            priority = _priority(current_app.config['PRIORITY_BATCH_DEFAULT'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
+        files = request.files.getlist('files') + request.files.getlist('file')
 
-        if not image_file:
+        if not files:
             return jsonify({
                 'status': 'error',
                 'message': 'No image provided'
             }), HTTPStatus.BAD_REQUEST
 
-        if image_file.filename == '' or not PredictService.allowed_file(image_file.filename):
-            return jsonify({
-                'status': 'error',
-                'message': 'No selected file or invalid file type'
-            }), HTTPStatus.BAD_REQUEST
+        try:
+            uploads = PredictService.read_batch_uploads(files, current_app.config['BATCH_MAX_FILES'],
+                                                        current_app.config['BATCH_MAX_IMAGE_BYTES'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), HTTPStatus.BAD_REQUEST
 
-        image = Image.open(io.BytesIO(image_file.read()))
+        started = time.perf_counter()
+        items = PredictService.decode_images(uploads, PredictService.input_size(_id, params.get('imgsz')))
+        decode_time = time.perf_counter() - started
 
-        result, status_code = PredictService.predict(_id, image)
+        Deadline.check(g.deadline)
+        mimetype = ResponseFormat.negotiate(request.accept_mimetypes)
+        result, status_code = PredictService.predict_batch(_id, items, params, g.deadline, priority,
+                                                           ResponseFormat.layout(mimetype))
+        # unknown ids are not used as labels to keep the metric cardinality bounded
+        model_id = _id if status_code == HTTPStatus.OK else ''
+        file_type = result.get('type', '')
+        PREDICT_STAGE_SECONDS.observe(decode_time, stage='decode', model_id=model_id, file_type=file_type)
+        PREDICT_REQUESTS.inc(model_id=model_id, file_type=file_type, status=int(status_code))
 
-        return jsonify(result), status_code
+        return ResponseFormat.render(result, status_code, mimetype)
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        current_app.logger.error(f"Error in predict: {str(e)}")
+        current_app.logger.error(f"Error in predict_batch: {str(e)}")
         return jsonify({"error": str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -1,11 +1,33 @@
 # app/services/PredictService.py
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 
 import torch
+from flask import current_app
+from PIL import UnidentifiedImageError
 
-from app.services.model_loader import get_model, clean_model_cache
+from app.services.admission import Deadline, DeadlineExceeded
+from app.services.batching import BatchScheduler
+from app.services.coalescing import RequestCoalescer
+from app.services.metadata_cache import metadata_cache
+from app.services.metrics import PREDICT_STAGE_SECONDS
+from app.services.image_ingest import ImageIngest
+from app.services.inference_pool import inference_pool
+from app.services.model_loader import acquire_model, model_cache, model_key, release_model
+from app.services.pipeline import Pipeline, PIPELINE_QUEUE_DEPTH
+from app.services.predict_params import PredictParams
+from app.services.result_cache import result_cache
+from app.services.tiling import TiledDetection
+from app.services.warmup import ModelUsage
 
-ALLOWED_EXTENSIONS = { 'jpg', 'png', 'pt'} # set of allowed file extensions
+ALLOWED_EXTENSIONS = { 'jpg', 'jpeg', 'png', 'npy', 'pt'} # set of allowed file extensions
+
+_decode_executor = None
+_coalescer = RequestCoalescer()
+predict_pipeline = Pipeline()
+PIPELINE_QUEUE_DEPTH.set_function(predict_pipeline.depths)
 
 class PredictService:
     """
@@ -19,93 +41,616 @@ class PredictService:
     Service class for the prediction
     """
     @staticmethod
-    def predict(_id, image):
+    def _load_model(_id):
         """
-        Predict the class of the image
+        Look up the FileManager entry and load its model
+        The entry comes from the in-process metadata cache, so a warm cache skips the database.
+        The model is leased until release_model(key) is called, so a hot swap keeps the version
+        alive until the request has finished with it.
+        :param _id: FileManager id
+        :return: (metadata, key, model, None) or (None, None, None, (error response, status code))
         """
-        # Load the image
-        from app.models.filemanager import FileManager
-        file_manager = FileManager.query.filter_by(id=_id).first()
+        file_manager = metadata_cache.get(_id)
 
         if not file_manager:
-            return {
+            return None, None, None, ({
                 'status': 'error',
                 'message': 'File not found'
-            }, HTTPStatus.NOT_FOUND
+            }, HTTPStatus.NOT_FOUND)
 
         # Load the model
-        path_model = "models"
-        if file_manager.file_type == 'cls':
-            path_model = "models/cls"
-        elif file_manager.file_type == 'detect':
-            path_model = "models/detect"
-        print("path_model", path_model)
-        print("file_manager.filename", file_manager.filename)
-
-        model = get_model(file_manager.filename, path_model, file_manager.id)
+        with PREDICT_STAGE_SECONDS.time(stage='model', model_id=file_manager.id, file_type=file_manager.file_type):
+            key, model = acquire_model(file_manager.filename, file_manager.path, file_manager.id,
+                                       file_manager.content_hash)
 
         if not model:
-            return {
+            return None, None, None, ({
+                'status': 'error',
+                'message': 'Model not found'
+            }, HTTPStatus.NOT_FOUND)
+
+        ModelUsage.record(file_manager.id)
+        return file_manager, key, model, None
+
+    @staticmethod
+    def _process_result(file_manager, result, params=None):
+        with PREDICT_STAGE_SECONDS.time(stage='postprocess', model_id=file_manager.id,
+                                        file_type=file_manager.file_type):
+            return (PredictService.process_cls_result(result, (params or {}).get('top_k'))
+                    if file_manager.file_type == 'cls'
+                    else PredictService.process_detect_result(result, (params or {}).get('layout') == 'columnar'))
+
+    @staticmethod
+    def predict(_id, image, digest=None, use_cache=True, tiling=None, params=None, deadline=None,
+                priority='normal', layout='rows'):
+        """
+        Predict the class of the image
+        :param _id: FileManager id
+        :param image: image to predict, or a callable decoding it so the decode can run in the pipeline
+        :param digest: hash of the image bytes, used by the result cache and, when PREDICT_COALESCE
+                       is enabled, to share one result between identical in-flight predictions
+        :param use_cache: False to bypass the result cache for this request
+        :param tiling: {'tile_size', 'overlap', 'iou', 'max_tiles'} to run tiled detection, None for a full-frame pass
+        :param params: predict params of the request (PredictParams.parse), merged over the model defaults
+        :param deadline: monotonic request deadline, work still pending when it passes raises DeadlineExceeded
+        :param priority: priority class used when the image waits for inference
+        :param layout: rows (one object per detection) or columnar (parallel arrays, ResponseFormat)
+        """
+        file_manager = metadata_cache.get(_id)
+        params = PredictService._with_layout(
+            PredictParams.resolve(file_manager.predict_params, params, file_manager.file_type), file_manager, layout) \
+            if file_manager else {}
+        cache_params = {'tiling': tiling, 'predict': params} if tiling or params else None
+
+        cache_key = None
+        requested = None
+        if digest and use_cache and result_cache.enabled and file_manager:
+            requested = model_key(file_manager.filename, file_manager.path, file_manager.id,
+                                  file_manager.content_hash)
+            cache_key = result_cache.make_key(file_manager.id, requested[1], digest, cache_params)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                return cached, HTTPStatus.OK
+
+        # keys of the model versions that actually ran, the previous version keeps serving during a swap
+        served = []
+        if digest and current_app.config.get('PREDICT_COALESCE', False):
+            coalesce_key = (str(_id), digest, result_cache.make_key('', '', '', cache_params))
+            app = current_app._get_current_object()
+
+            def shared():
+                # runs on a coalescer thread without the deadline of the first caller, every caller
+                # waits for it until its own deadline, see RequestCoalescer
+                with app.app_context():
+                    return PredictService._run(_id, image, tiling, params, None, priority, served)
+
+            result, status_code = _coalescer.run(coalesce_key, shared, deadline)
+        else:
+            result, status_code = PredictService._run(_id, image, tiling, params, deadline, priority, served)
+
+        # only results of the requested version are cached under its key
+        if cache_key and status_code == HTTPStatus.OK and served and all(key == requested for key in served):
+            result_cache.put(cache_key, result)
+        return result, status_code
+
+    @staticmethod
+    def _with_layout(params, file_manager, layout):
+        """
+        Add the result layout of detect models to resolved predict params, it travels with them to
+        the post-processing and is part of the result cache key
+        """
+        if layout == 'columnar' and file_manager.file_type == 'detect':
+            return dict(params, layout=layout)
+        return params
+
+    @staticmethod
+    def _run(_id, image, tiling=None, params=None, deadline=None, priority='normal', served=None):
+        """
+        Run one prediction, through the staged pipeline when PIPELINE_ENABLED
+        :param served: list the key of the model version that ran is appended to
+        """
+        if predict_pipeline.enabled:
+            future = predict_pipeline.submit(current_app._get_current_object(), _id=_id, image=image,
+                                             tiling=tiling, params=params, deadline=deadline, priority=priority,
+                                             served=served)
+            return Deadline.wait(future, deadline)
+
+        image, error = PredictService._decode(_id, image)
+        if error:
+            return error
+        return PredictService._predict(_id, image, tiling, params, deadline, priority, served)
+
+    @staticmethod
+    def _decode(_id, image):
+        """
+        Decode the image when the caller passed a decode callable
+        :return: (image, None) or (None, (error response, status code))
+        """
+        if not callable(image):
+            return image, None
+
+        file_manager = metadata_cache.get(_id)
+        # unknown ids are not used as labels to keep the metric cardinality bounded
+        labels = {'model_id': file_manager.id, 'file_type': file_manager.file_type} if file_manager else \
+            {'model_id': '', 'file_type': ''}
+        try:
+            with PREDICT_STAGE_SECONDS.time(stage='decode', **labels):
+                return image(), None
+        except (ValueError, UnidentifiedImageError) as e:
+            return None, ({
+                'status': 'error',
+                'message': f'Invalid image: {str(e)}'
+            }, HTTPStatus.BAD_REQUEST)
+
+    @staticmethod
+    def pipeline_stages(config):
+        """
+        Stages of the predict pipeline: decode -> inference -> serialize
+        Inference only hands the image to the model batcher, the batch result is forwarded to the
+        serialize stage from the batcher callback, so no pipeline thread waits on the model.
+        :return: list of (name, handler, workers, max queue size)
+        """
+        queue_size = config.get('PIPELINE_QUEUE_SIZE', 64)
+        decode_workers = config.get('PIPELINE_DECODE_WORKERS') or min(8, os.cpu_count() or 1)
+        return [
+            ('decode', PredictService._decode_stage, decode_workers, queue_size),
+            ('inference', PredictService._inference_stage, config.get('PIPELINE_INFERENCE_WORKERS', 4), queue_size),
+            ('serialize', PredictService._serialize_stage, config.get('PIPELINE_SERIALIZE_WORKERS', 2), queue_size),
+        ]
+
+    @staticmethod
+    def _decode_stage(job):
+        Deadline.check(job.state['deadline'])
+        image, error = PredictService._decode(job.state['_id'], job.state['image'])
+        if error:
+            job.finish(error)
+            return None
+        job.state['image'] = image
+        return 'inference'
+
+    @staticmethod
+    def _inference_stage(job):
+        _id, image, tiling, params = job.state['_id'], job.state['image'], job.state['tiling'], job.state['params']
+        deadline, priority, served = job.state['deadline'], job.state['priority'], job.state.get('served')
+        if inference_pool.enabled or tiling or not current_app.config.get('BATCH_ENABLED', True):
+            # these paths run inference and post-processing in one call
+            job.finish(PredictService._predict(_id, image, tiling, params, deadline, priority, served))
+            return None
+
+        file_manager, key, model, error = PredictService._load_model(_id)
+        if error:
+            job.finish(error)
+            return None
+        if served is not None:
+            served.append(key)
+
+        job.state.update(file_manager=file_manager, key=key)
+        try:
+            job.state['batch'] = BatchScheduler.submit(
+                file_manager.id, model, image, current_app.config, file_manager.file_type,
+                PredictParams.predict_kwargs(params, file_manager.file_type), deadline, priority)
+        except Exception:
+            release_model(key)
+            raise
+        # the callback runs on the batcher thread, it must not wait for room in the serialize queue
+        job.state['batch'].add_done_callback(lambda _: predict_pipeline.hand_off(job, 'serialize'))
+        return None
+
+    @staticmethod
+    def _serialize_stage(job):
+        file_manager = job.state['file_manager']
+        try:
+            result = job.state['batch'].result()
+            job.finish(({
+                'status': 'success',
+                'type': file_manager.file_type,
+                'result': PredictService._process_result(file_manager, result, job.state['params'])
+            }, HTTPStatus.OK))
+        finally:
+            release_model(job.state['key'])
+        return None
+
+    @staticmethod
+    def _submit_to_pool(_id, images, params=None, served=None):
+        """
+        Send images to the inference worker that owns the model
+        :param served: list the key of the model version is appended to
+        :return: (metadata, future, None) or (None, None, (error response, status code))
+        """
+        file_manager = metadata_cache.get(_id)
+        if not file_manager:
+            return None, None, ({
+                'status': 'error',
+                'message': 'File not found'
+            }, HTTPStatus.NOT_FOUND)
+
+        key = model_key(file_manager.filename, file_manager.path, file_manager.id, file_manager.content_hash)
+        model_path = os.path.join(file_manager.path, key[1])
+        if not os.path.exists(model_path):
+            return None, None, ({
                 'status': 'error',
                 'message': 'Model not found'
-            }, HTTPStatus.NOT_FOUND
+            }, HTTPStatus.NOT_FOUND)
+
+        ModelUsage.record(file_manager.id)
+        if served is not None:
+            served.append(key)
+        future = inference_pool.submit(file_manager.id, key, model_path, file_manager.file_type, images, params)
+        return file_manager, future, None
+
+    @staticmethod
+    def _predict(_id, image, tiling=None, params=None, deadline=None, priority='normal', served=None):
+        Deadline.check(deadline)
+        if inference_pool.enabled:
+            if tiling:
+                return {
+                    'status': 'error',
+                    'message': 'Tiled detection is not available when INFERENCE_WORKERS is enabled'
+                }, HTTPStatus.BAD_REQUEST
+
+            # Inference and post-processing run in the worker process that owns the model
+            file_manager, future, error = PredictService._submit_to_pool(_id, [image], params, served)
+            if error:
+                return error
+            with PREDICT_STAGE_SECONDS.time(stage='inference', model_id=file_manager.id,
+                                            file_type=file_manager.file_type):
+                processed_result = inference_pool.wait(future, deadline)[0]
+            return {
+                'status': 'success',
+                'type': file_manager.file_type,
+                'result': processed_result
+            }, HTTPStatus.OK
+
+        file_manager, key, model, error = PredictService._load_model(_id)
+        if error:
+            return error
+        if served is not None:
+            served.append(key)
 
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        try:
+            kwargs = PredictParams.predict_kwargs(params, file_manager.file_type)
+            if tiling:
+                if file_manager.file_type != 'detect':
+                    return {
+                        'status': 'error',
+                        'message': 'Tiled prediction is only supported for detect models'
+                    }, HTTPStatus.BAD_REQUEST
+                tiles = TiledDetection.count(*TiledDetection.image_size(image), tiling['tile_size'],
+                                             tiling['overlap'])
+                if tiling.get('max_tiles') and tiles > tiling['max_tiles']:
+                    return {
+                        'status': 'error',
+                        'message': f"Image needs {tiles} tiles, at most {tiling['max_tiles']} are allowed, "
+                                   f"use a larger tile_size or a smaller tile_overlap"
+                    }, HTTPStatus.BAD_REQUEST
+                result = TiledDetection.predict(
+                    image, tiling['tile_size'], tiling['overlap'], tiling['iou'],
+                    lambda tiles: PredictService._predict_tiles(file_manager, model, tiles, kwargs, deadline,
+                                                                priority),
+                    max_det=kwargs.get('max_det'))
+            # Predict the image, batched together with concurrent requests for the same model
+            elif current_app.config.get('BATCH_ENABLED', True):
+                result = Deadline.wait(BatchScheduler.submit(file_manager.id, model, image, current_app.config,
+                                                             file_manager.file_type, kwargs, deadline, priority),
+                                       deadline)
+            else:
+                with PREDICT_STAGE_SECONDS.time(stage='inference', model_id=file_manager.id,
+                                                file_type=file_manager.file_type):
+                    with torch.no_grad():
+                        result = model.predict(image, **kwargs)
 
-        model.info()
+                # Clean the model cache
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
 
-        print("Model loaded successfully on device:", device)
+            processed_result = PredictService._process_result(file_manager, result, params)
 
-        
-        # Predict the
-        with torch.no_grad():
-            result = model.predict(image)
+            # Return the result
+            return {
+                'status': 'success',
+                'type': file_manager.file_type,
+                'result': processed_result
+            }, HTTPStatus.OK
+        finally:
+            release_model(key)
+
+    @staticmethod
+    def _predict_tiles(file_manager, model, tiles, kwargs=None, deadline=None, priority='normal'):
+        """
+        Predict the tiles of one image as batches
+        :param kwargs: model.predict arguments
+        :param deadline: monotonic request deadline
+        :param priority: priority class of the request
+        :return: one ultralytics Results per tile
+        """
+        kwargs = kwargs or {}
+        if current_app.config.get('BATCH_ENABLED', True):
+            # Submitted together so the model batcher flushes them as full batches
+            futures = [BatchScheduler.submit(file_manager.id, model, tile, current_app.config, file_manager.file_type,
+                                             kwargs, deadline, priority)
+                       for tile in tiles]
+            return [Deadline.wait(future, deadline)[0] for future in futures]
 
-        # Clean the model cache
-        if device.type == 'cuda':
+        max_batch_size, _ = BatchScheduler.settings_for(file_manager.id, current_app.config)
+        results = []
+        with PREDICT_STAGE_SECONDS.time(stage='inference', model_id=file_manager.id,
+                                        file_type=file_manager.file_type):
+            with torch.no_grad():
+                for start in range(0, len(tiles), max_batch_size):
+                    results.extend(model.predict(tiles[start:start + max_batch_size], **kwargs))
+        if torch.cuda.is_available():
             torch.cuda.empty_cache()
+        return results
+
+    @staticmethod
+    def predict_batch(_id, items, params=None, deadline=None, priority='low', layout='rows'):
+        """
+        Predict many images with one model
+        :param _id: FileManager id
+        :param items: list of (filename, image or None, error message or None) in input order
+        :param params: predict params of the request (PredictParams.parse), merged over the model defaults
+        :param deadline: monotonic request deadline
+        :param priority: priority class of the request
+        :param layout: rows or columnar, see predict
+        :return: response with one entry per input in the original order, status code
+        """
+        Deadline.check(deadline)
+        if inference_pool.enabled:
+            return PredictService._predict_batch_in_pool(_id, items, params, deadline, layout)
+
+        file_manager, key, model, error = PredictService._load_model(_id)
+        if error:
+            return error
+
+        try:
+            params = PredictParams.resolve(file_manager.predict_params, params, file_manager.file_type)
+            params = PredictService._with_layout(params, file_manager, layout)
+            kwargs = PredictParams.predict_kwargs(params, file_manager.file_type)
+            valid = [(index, image) for index, (_, image, item_error) in enumerate(items) if not item_error]
+            results = {}
+
+            if current_app.config.get('BATCH_ENABLED', True):
+                # All futures go to the model batcher at once so they are flushed as full batches
+                futures = [(index, BatchScheduler.submit(file_manager.id, model, image, current_app.config,
+                                                         file_manager.file_type, kwargs, deadline, priority))
+                           for index, image in valid]
+                for index, future in futures:
+                    try:
+                        results[index] = Deadline.wait(future, deadline)
+                    except Exception as e:
+                        results[index] = e
+                if any(isinstance(result, DeadlineExceeded) for result in results.values()):
+                    raise DeadlineExceeded('Request deadline exceeded while queued for inference')
+            else:
+                max_batch_size, _ = BatchScheduler.settings_for(file_manager.id, current_app.config)
+                for start in range(0, len(valid), max_batch_size):
+                    chunk = valid[start:start + max_batch_size]
+                    try:
+                        with PREDICT_STAGE_SECONDS.time(stage='inference', model_id=file_manager.id,
+                                                        file_type=file_manager.file_type):
+                            with torch.no_grad():
+                                predicted = list(model.predict([image for _, image in chunk], **kwargs))
+                        if len(predicted) != len(chunk):
+                            # results cannot be matched to their images
+                            raise RuntimeError(f"model.predict returned {len(predicted)} results "
+                                               f"for {len(chunk)} images")
+                        for (index, _), result in zip(chunk, predicted):
+                            results[index] = [result]
+                    except Exception as e:
+                        for index, _ in chunk:
+                            results[index] = e
+
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+
+            response = []
+            for index, (filename, _, item_error) in enumerate(items):
+                entry = {'index': index, 'filename': filename}
+                result = results.get(index)
+                if item_error:
+                    entry.update({'status': 'error', 'message': item_error})
+                elif isinstance(result, Exception):
+                    entry.update({'status': 'error', 'message': str(result)})
+                else:
+                    entry.update({'status': 'success',
+                                  'result': PredictService._process_result(file_manager, result, params)})
+                response.append(entry)
 
-        processed_result = (PredictService.process_cls_result(result)
-                            if file_manager.file_type == 'cls'
-                            else PredictService.process_detect_result(result))
-        clean_model_cache(max_age_minutes=1)
+            return {
+                'status': 'success',
+                'type': file_manager.file_type,
+                'results': response
+            }, HTTPStatus.OK
+        finally:
+            release_model(key)
+
+    @staticmethod
+    def _predict_batch_in_pool(_id, items, params=None, deadline=None, layout='rows'):
+        valid = [(index, image) for index, (_, image, item_error) in enumerate(items) if not item_error]
+        file_manager = metadata_cache.get(_id)
+        params = PredictService._with_layout(
+            PredictParams.resolve(file_manager.predict_params, params, file_manager.file_type), file_manager, layout) \
+            if file_manager else {}
+        file_manager, future, error = PredictService._submit_to_pool(_id, [image for _, image in valid], params)
+        if error:
+            return error
+
+        try:
+            processed = inference_pool.wait(future, deadline)
+            if len(processed) != len(valid):
+                raise RuntimeError(f"Inference worker returned {len(processed)} results for {len(valid)} images")
+            results = dict(zip([index for index, _ in valid], processed))
+            batch_error = None
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            results = {}
+            batch_error = str(e)
+
+        response = []
+        for index, (filename, _, item_error) in enumerate(items):
+            entry = {'index': index, 'filename': filename}
+            if item_error or batch_error:
+                entry.update({'status': 'error', 'message': item_error or batch_error})
+            else:
+                entry.update({'status': 'success', 'result': results[index]})
+            response.append(entry)
 
-        # Return the result
-        print("======= End of Prediction Result =======")
         return {
             'status': 'success',
             'type': file_manager.file_type,
-            'result': processed_result
+            'results': response
         }, HTTPStatus.OK
 
     @staticmethod
-    def process_detect_result(result):
+    def read_batch_uploads(files, max_files=None, max_image_bytes=None):
+        """
+        Expand the uploaded files of a batch request into (filename, bytes) pairs
+        Zip archives are expanded in archive order. The entry count and the uncompressed size of
+        every entry are checked from the archive directory before anything is decompressed.
+        :param files: list of werkzeug FileStorage
+        :param max_files: maximum number of images, None for no limit
+        :param max_image_bytes: maximum uncompressed size of a zip entry, larger entries are rejected
+        :return: list of (filename, bytes or None, error message or None)
+        :raises ValueError: when there are more than max_files images
+        """
+        uploads = []
+        archives = []
+        count = 0
+        for file in files:
+            if file.filename.lower().endswith('.zip'):
+                try:
+                    archive = zipfile.ZipFile(file.stream)
+                except zipfile.BadZipFile:
+                    archives.append((file, None, []))
+                    count += 1
+                    continue
+                entries = [info for info in archive.infolist() if not info.is_dir()]
+                archives.append((file, archive, entries))
+                count += len(entries)
+            else:
+                archives.append((file, None, None))
+                count += 1
+            if max_files is not None and count > max_files:
+                raise ValueError(f'Too many images, at most {max_files} per request')
+
+        for file, archive, entries in archives:
+            if entries is None:
+                uploads.append(PredictService._checked_upload(file.filename, file.read))
+            elif archive is None:
+                uploads.append((file.filename, None, 'Invalid zip archive'))
+            else:
+                with archive:
+                    for info in entries:
+                        if max_image_bytes and info.file_size > max_image_bytes:
+                            uploads.append((info.filename, None, 'Image too large'))
+                            continue
+                        uploads.append(PredictService._checked_upload(
+                            info.filename, lambda info=info: archive.read(info)))
+        return uploads
+
+    @staticmethod
+    def _checked_upload(filename, read):
+        if not filename or not PredictService.allowed_file(filename):
+            return filename, None, 'No selected file or invalid file type'
+        return filename, read(), None
+
+    @staticmethod
+    def input_size(_id, imgsz=None):
+        """
+        Input size of a model, used to decode images close to the size the model needs
+        The request imgsz wins over the model default imgsz, then the size the loaded model was
+        trained with, otherwise INGEST_DRAFT_SIZE.
+        """
+        if imgsz:
+            return imgsz
+        default = current_app.config.get('INGEST_DRAFT_SIZE', 640)
+        file_manager = metadata_cache.get(_id)
+        if not file_manager:
+            return default
+        if file_manager.predict_params.get('imgsz'):
+            return file_manager.predict_params['imgsz']
+        model = model_cache.peek(model_cache.active_key(file_manager.id))
+        imgsz = getattr(model, 'overrides', {}).get('imgsz') if model is not None else None
+        if isinstance(imgsz, (list, tuple)):
+            imgsz = max(imgsz)
+        return int(imgsz) if imgsz else default
+
+    @staticmethod
+    def decode_images(uploads, target_size=None):
+        """
+        Decode uploaded images in parallel
+        :param uploads: list of (filename, bytes or None, error message or None)
+        :param target_size: model input size, JPEGs are decoded in draft mode close to it
+        :return: list of (filename, image or None, error message or None) in input order
+        """
+        global _decode_executor
+        if _decode_executor is None:
+            workers = current_app.config.get('BATCH_DECODE_WORKERS') or min(8, (os.cpu_count() or 1) + 2)
+            _decode_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decode')
+
+        def decode(upload):
+            filename, data, error = upload
+            if error:
+                return upload
+            try:
+                return filename, ImageIngest.decode_bytes(data, filename, target_size), None
+            except Exception as e:
+                return filename, None, f'Invalid image: {str(e)}'
+
+        return list(_decode_executor.map(decode, uploads))
+
+    @staticmethod
+    def process_detect_result(result, columnar=False):
         """
         Process the detection result
+        :param columnar: parallel arrays taken straight from the tensors instead of one object per box
         """
-        boxes = result[0].boxes
+        boxes = result[0].boxes.cpu()
         names = result[0].names
 
-        detections = []
-        for i in range(len(boxes.xyxy)):
-            detections.append({
-                'box': boxes.xyxy[i].tolist(),
-                'confidence': float(boxes.conf[i]),
-                'class': int(boxes.cls[i]),
-                'name': names[int(boxes.cls[i])]
-            })
+        # one tolist() per tensor instead of per box element
+        xyxy = boxes.xyxy.tolist()
+        confidences = boxes.conf.tolist()
+        classes = boxes.cls.int().tolist()
 
-        return detections
+        if columnar:
+            return {
+                'boxes': xyxy,
+                'confidence': confidences,
+                'class': classes,
+                'names': {str(cls): names[cls] for cls in sorted(set(classes))},
+            }
+
+        return [{
+            'box': box,
+            'confidence': confidence,
+            'class': cls,
+            'name': names[cls]
+        } for box, confidence, cls in zip(xyxy, confidences, classes)]
 
     @staticmethod
-    def process_cls_result(result):
+    def process_cls_result(result, top_k=None):
+        """
+        Process the classification result
+        :param top_k: also return the k most likely classes
+        """
         try:
             probs = result[0].probs
-            return {
-                'class': int(probs.data.argmax()),
-                'confidence': float(probs.data.max()),
-                'class_name': probs.names[int(probs.data.argmax())]
+            names = result[0].names
+            processed = {
+                'class': int(probs.top1),
+                'confidence': float(probs.top1conf),
+                'class_name': names[int(probs.top1)]
             }
+            if top_k:
+                confidences, classes = probs.data.topk(min(top_k, len(probs.data)))
+                processed['top_k'] = [{
+                    'class': cls,
+                    'confidence': confidence,
+                    'class_name': names[cls]
+                } for cls, confidence in zip(classes.tolist(), confidences.tolist())]
+            return processed
         except AttributeError:
             return {
                 'class': None,
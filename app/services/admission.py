@@ -0,0 +1,167 @@
+# app/services/admission.py
+import math
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from app.services.metrics import registry
+
+ADMISSION_INFLIGHT = registry.gauge(
+    'admission_inflight', 'Predict requests admitted and not finished yet, per model', ['model_id'])
+ADMISSION_REJECTED = registry.counter(
+    'admission_rejected_total', 'Predict requests rejected by admission control', ['reason'])
+
+
+class DeadlineExceeded(Exception):
+    """
+    The request deadline passed before the work was done, the result is not wanted anymore
+    """
+
+
+class Deadline:
+    """
+    Per-request deadline from the X-Request-Deadline (absolute unix time in seconds) or
+    X-Request-Timeout-Ms (budget in milliseconds from arrival) header
+    Kept as a time.monotonic() value so it can be checked cheaply in any thread.
+    """
+
+    @staticmethod
+    def from_headers(headers, now=None, max_budget=None):
+        """
+        :param max_budget: longest budget in seconds a header may ask for, longer ones are clamped
+        :return: monotonic deadline or None when the request has none
+        :raises ValueError: on a malformed or non-finite header
+        """
+        now = time.time() if now is None else now
+        if headers.get('X-Request-Deadline'):
+            budget = float(headers['X-Request-Deadline']) - now
+        elif headers.get('X-Request-Timeout-Ms'):
+            budget = float(headers['X-Request-Timeout-Ms']) / 1000.0
+        else:
+            return None
+        if not math.isfinite(budget):
+            raise ValueError('Deadline header must be a finite number')
+        if max_budget:
+            budget = min(budget, max_budget)
+        return time.monotonic() + budget
+
+    @staticmethod
+    def expired(deadline):
+        return deadline is not None and time.monotonic() >= deadline
+
+    @staticmethod
+    def remaining(deadline):
+        """
+        Seconds left, None without a deadline, usable as a Future.result timeout
+        """
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    @staticmethod
+    def wait(future, deadline):
+        """
+        Wait for a future until the deadline
+        :raises DeadlineExceeded: when the deadline passes first
+        """
+        try:
+            return future.result(timeout=Deadline.remaining(deadline))
+        except FutureTimeoutError:
+            raise DeadlineExceeded('Request deadline exceeded')
+
+    @staticmethod
+    def check(deadline):
+        """
+        :raises DeadlineExceeded: when the deadline has passed
+        """
+        if Deadline.expired(deadline):
+            raise DeadlineExceeded('Request deadline exceeded')
+
+
+class AdmissionController:
+    """
+    Bounded number of in-flight predict requests, globally and per model
+    Requests over a limit are rejected right away instead of queueing behind work that will
+    time out anyway: 503 when the service is saturated, 429 when one model is.
+    A limit of 0 means unlimited.
+    """
+
+    def __init__(self):
+        self.max_inflight = 0
+        self.max_inflight_per_model = 0
+        self.model_limits = {}
+        self.retry_after = 1
+        self._inflight = 0
+        self._per_model = {}
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = {'global': 0, 'model': 0, 'deadline': 0}
+
+    def configure(self, max_inflight=0, max_inflight_per_model=0, model_limits=None, retry_after=1):
+        """
+        :param model_limits: per-model limits overriding max_inflight_per_model, e.g. {"3": 4}
+        :param retry_after: seconds sent in the Retry-After header of rejected requests
+        """
+        with self._lock:
+            self.max_inflight = max_inflight
+            self.max_inflight_per_model = max_inflight_per_model
+            self.model_limits = {str(_id): int(limit) for _id, limit in (model_limits or {}).items()}
+            self.retry_after = retry_after
+
+    def limit_for(self, model_id):
+        return self.model_limits.get(str(model_id), self.max_inflight_per_model)
+
+    def try_acquire(self, model_id):
+        """
+        Admit a request
+        :return: None when admitted, otherwise 'global' or 'model' (the limit that was hit)
+        """
+        model_id = str(model_id)
+        with self._lock:
+            if self.max_inflight and self._inflight >= self.max_inflight:
+                reason = 'global'
+            elif self.limit_for(model_id) and self._per_model.get(model_id, 0) >= self.limit_for(model_id):
+                reason = 'model'
+            else:
+                self._inflight += 1
+                self._per_model[model_id] = self._per_model.get(model_id, 0) + 1
+                self.admitted += 1
+                return None
+            self.rejected[reason] += 1
+        ADMISSION_REJECTED.inc(reason=reason)
+        return reason
+
+    def release(self, model_id):
+        model_id = str(model_id)
+        with self._lock:
+            self._inflight -= 1
+            count = self._per_model.get(model_id, 0) - 1
+            if count > 0:
+                self._per_model[model_id] = count
+            else:
+                # unknown ids do not stay in the table
+                self._per_model.pop(model_id, None)
+
+    def reject_deadline(self):
+        with self._lock:
+            self.rejected['deadline'] += 1
+        ADMISSION_REJECTED.inc(reason='deadline')
+
+    def inflight(self):
+        with self._lock:
+            return {(model_id,): count for model_id, count in self._per_model.items()}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inflight': self._inflight,
+                'max_inflight': self.max_inflight,
+                'max_inflight_per_model': self.max_inflight_per_model,
+                'models': {model_id: {'inflight': count, 'limit': self.limit_for(model_id)}
+                           for model_id, count in self._per_model.items()},
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+                'retry_after': self.retry_after,
+            }
+
+
+admission = AdmissionController()
+ADMISSION_INFLIGHT.set_function(admission.inflight)
@@ -0,0 +1,167 @@
+# app/services/backends.py
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+# Global backend and per-model overrides, set from Config in create_app
+_settings = {
+    'default': 'torch',
+    'models': {},
+    'serve_quantized': True,
+}
+
+
+def configure(default='torch', models=None, serve_quantized=True):
+    """
+    Set the inference backend used for all models and the per-model overrides
+    :param default: one of BACKENDS
+    :param models: mapping of FileManager id to backend, e.g. {"3": "onnx"}
+    :param serve_quantized: serve a validated INT8 variant when one exists
+    """
+    _settings['default'] = default if default in BACKENDS else 'torch'
+    _settings['models'] = {str(_id): backend for _id, backend in (models or {}).items() if backend in BACKENDS}
+    _settings['serve_quantized'] = serve_quantized
+
+
+def backend_for(model_id):
+    return _settings['models'].get(str(model_id), _settings['default'])
+
+
+def artifact_name(model_name, backend):
+    """
+    File (or directory) name of an exported model, stored next to the original
+    Names follow the ultralytics export defaults.
+    """
+    stem = os.path.splitext(model_name)[0]
+    if backend == 'int8':
+        return f"{stem}.int8.onnx"
+    if backend == 'onnx':
+        return f"{stem}.onnx"
+    if backend == 'openvino':
+        return f"{stem}_openvino_model"
+    return model_name
+
+
+def source_name(name):
+    """
+    Name of the original weights an exported artifact was made from, or the name itself
+    """
+    for suffix in ('.int8.onnx', '.int8.json'):
+        if name.endswith(suffix):
+            return f"{name[:-len(suffix)]}.pt"
+    if name.endswith('_openvino_model'):
+        return f"{name[:-len('_openvino_model')]}.pt"
+    if name.endswith('.onnx'):
+        return f"{name[:-len('.onnx')]}.pt"
+    return name
+
+
+def resolve_model_file(model_folder, model_name, model_id, backend=None):
+    """
+    Pick the file to load for a model: a validated INT8 variant, the exported artifact of its
+    backend if it exists, otherwise the original weights
+    :return: file name inside model_folder
+    """
+    if _settings['serve_quantized'] and backend is None:
+        # The INT8 variant is only stored under this name once it passed validation
+        quantized = artifact_name(model_name, 'int8')
+        if os.path.exists(os.path.join(model_folder, quantized)):
+            return quantized
+
+    name = artifact_name(model_name, backend or backend_for(model_id))
+    if name != model_name and os.path.exists(os.path.join(model_folder, name)):
+        return name
+    return model_name
+
+
+def export_model(model_path, backends, imgsz=None):
+    """
+    Export .pt weights to other backends next to the original file
+    Exports run in a staging folder and are moved into place when complete, so a request
+    never resolves a half written artifact.
+    :param model_path: path of the .pt file
+    :param backends: backends to export, "torch" is ignored
+    :param imgsz: input size, defaults to the training size of the model
+    :return: mapping of backend to exported path for the successful exports
+    """
+    from ultralytics import YOLO
+
+    model_folder, model_name = os.path.split(model_path)
+    staging = os.path.join(model_folder, f".export_{uuid.uuid4().hex}")
+    os.makedirs(staging)
+    exported = {}
+    try:
+        shutil.copy2(model_path, os.path.join(staging, model_name))
+        model = YOLO(os.path.join(staging, model_name))
+        for backend in backends:
+            if backend not in ('onnx', 'openvino'):
+                continue
+            try:
+                # dynamic axes so the exported model accepts the batches built by the batcher
+                kwargs = {'format': backend, 'dynamic': True}
+                if imgsz:
+                    kwargs['imgsz'] = imgsz
+                model.export(**kwargs)
+
+                name = artifact_name(model_name, backend)
+                target = os.path.join(model_folder, name)
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                os.replace(os.path.join(staging, name), target)
+                exported[backend] = target
+                logger.info(f"Exported {model_path} to {backend}: {target}")
+            except Exception as e:
+                logger.error(f"Export of {model_path} to {backend} failed: {str(e)}")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return exported
+
+
+def remove_artifacts(model_folder, model_name):
+    """
+    Delete the exported artifacts of a model
+    """
+    names = [artifact_name(model_name, backend) for backend in ('onnx', 'openvino', 'int8')]
+    names.append(f"{os.path.splitext(model_name)[0]}.int8.json")
+    for name in names:
+        path = os.path.join(model_folder, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def export_async(app, model_id, backends):
+    """
+    Export a newly uploaded model in the background, then swap the cache over to the
+    exported artifact if it is the backend configured for the model
+    """
+    def run():
+        from app.models.filemanager import FileManager
+        from app.services.model_loader import get_model_folder
+        from app.services.warmup import WarmupService
+
+        with app.app_context():
+            try:
+                entry = FileManager.query.get(model_id)
+                if not entry:
+                    return
+                folder = get_model_folder(entry.file_type)
+                # artifacts of weights shared with another entry are already exported
+                pending = [backend for backend in backends
+                           if not os.path.exists(os.path.join(folder, artifact_name(entry.filename, backend)))]
+                if pending:
+                    export_model(os.path.join(folder, entry.filename), pending)
+
+                if resolve_model_file(folder, entry.filename, entry.id) != entry.filename:
+                    WarmupService.load_and_warm(entry, app.config, swap=True)
+            except Exception as e:
+                app.logger.error(f"Error exporting model {model_id}: {str(e)}")
+
+    threading.Thread(target=run, name=f"model-export-{model_id}", daemon=True).start()
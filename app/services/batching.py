@@ -0,0 +1,254 @@
+# app/services/batching.py
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from app.services.admission import Deadline, DeadlineExceeded
+from app.services.metrics import BATCH_SIZE, PREDICT_STAGE_SECONDS
+from app.services.priority import PRIORITY_CLASSES, PRIORITY_QUEUED, PriorityQueue
+
+logger = logging.getLogger(__name__)
+
+
+class _BatchItem:
+    """
+    One image waiting to be predicted together with the future of its caller
+    """
+    __slots__ = ('model', 'image', 'kwargs', 'deadline', 'priority', 'future', 'enqueued_at')
+
+    def __init__(self, model, image, kwargs=None, deadline=None, priority='normal'):
+        self.model = model
+        self.image = image
+        self.kwargs = kwargs or {}
+        self.deadline = deadline
+        self.priority = priority or 'normal'
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class ModelBatcher:
+    """
+    Collect predict calls for one model and run them as a single batched model.predict([...])
+    A batch is flushed when it reaches max_batch_size or when the oldest item waited max_wait_ms.
+    Queued items are taken by priority class, see PriorityQueue.
+    """
+
+    def __init__(self, key, max_batch_size=8, max_wait_ms=10.0, file_type=None, starvation_ms=500.0):
+        self.key = key
+        self.file_type = file_type or ''
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = PriorityQueue(starvation_ms)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # per batch statistics
+        self.batches = 0
+        self.items = 0
+        self.last_batch_size = 0
+        self.last_latency_ms = 0.0
+        self.last_throughput = 0.0
+
+    def submit(self, model, image, kwargs=None, deadline=None, priority='normal'):
+        """
+        Queue an image for prediction
+        :param model: loaded YOLO model
+        :param image: PIL image, numpy array or anything accepted by model.predict
+        :param kwargs: model.predict arguments (conf, iou, ...), only items with equal arguments share a batch
+        :param deadline: monotonic deadline, the item is dropped if it is still queued when it passes
+        :param priority: priority class, one of PRIORITY_CLASSES
+        :return: Future resolved with a single element list of ultralytics Results
+        """
+        item = _BatchItem(model, image, kwargs, deadline, priority)
+        self._queue.put(item)
+        self._ensure_worker()
+        return item.future
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"batcher-{self.key}", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """
+        Block for the first item, then gather more until the batch is full or the window closes
+        Items already queued when the window closes still fill the batch.
+        """
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = max(0.0, deadline - time.perf_counter())
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self._predict(batch)
+
+    def _predict(self, batch):
+        # Items whose caller gave up already are not worth a slot in the batch
+        live = []
+        for item in batch:
+            if Deadline.expired(item.deadline):
+                item.future.set_exception(DeadlineExceeded('Request deadline exceeded while queued for inference'))
+            else:
+                live.append(item)
+        if not live:
+            return
+        batch = live
+
+        # Items carry their own model reference so a reloaded model is picked up by the next batch,
+        # and their own predict arguments, which apply to a whole model.predict call
+        groups = {}
+        for item in batch:
+            groups.setdefault((id(item.model), json.dumps(item.kwargs, sort_keys=True)), []).append(item)
+
+        for items in groups.values():
+            model = items[0].model
+            started = time.perf_counter()
+            try:
+                with torch.no_grad():
+                    results = model.predict([item.image for item in items], verbose=False, **items[0].kwargs)
+            except Exception as e:
+                for item in items:
+                    item.future.set_exception(e)
+                logger.error(f"Batch predict failed for model {self.key}: {str(e)}")
+                continue
+            finished = time.perf_counter()
+
+            results = list(results)
+            if len(results) != len(items):
+                # results cannot be matched to their images, no caller may wait forever
+                error = RuntimeError(f"model.predict returned {len(results)} results for {len(items)} images")
+                for item in items:
+                    item.future.set_exception(error)
+                logger.error(f"Batch predict failed for model {self.key}: {str(error)}")
+                continue
+
+            for item, result in zip(items, results):
+                item.future.set_result([result])
+
+            self._report(items, started, finished)
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _report(self, items, started, finished):
+        size = len(items)
+        inference = finished - started
+        waited = started - min(item.enqueued_at for item in items)
+
+        self.batches += 1
+        self.items += size
+        self.last_batch_size = size
+        self.last_latency_ms = (finished - min(item.enqueued_at for item in items)) * 1000
+        self.last_throughput = size / inference if inference > 0 else 0.0
+
+        for item in items:
+            PREDICT_STAGE_SECONDS.observe(started - item.enqueued_at, stage='queue', model_id=self.key,
+                                          file_type=self.file_type)
+        PREDICT_STAGE_SECONDS.observe(inference, stage='inference', model_id=self.key, file_type=self.file_type)
+        BATCH_SIZE.observe(size, model_id=self.key)
+
+        logger.info(
+            f"Batch model={self.key} size={size} wait={waited * 1000:.1f}ms "
+            f"inference={inference * 1000:.1f}ms latency={self.last_latency_ms:.1f}ms "
+            f"throughput={self.last_throughput:.1f} img/s"
+        )
+
+    def stats(self):
+        return {
+            'key': str(self.key),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'queued': self._queue.qsize(),
+            'queued_by_priority': self._queue.depths(),
+            'promoted': self._queue.promoted,
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+            'last_batch_size': self.last_batch_size,
+            'last_latency_ms': self.last_latency_ms,
+            'last_throughput': self.last_throughput,
+        }
+
+
+class BatchScheduler:
+    """
+    Registry of one ModelBatcher per model
+    """
+    _batchers = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def settings_for(model_id, config):
+        """
+        Resolve batch settings for a model, per-model overrides win over the global values
+        :param model_id: FileManager id
+        :param config: app config mapping
+        :return: (max_batch_size, max_wait_ms)
+        """
+        override = config.get('BATCH_OVERRIDES', {}).get(str(model_id), {})
+        max_batch_size = override.get('max_batch_size', config.get('BATCH_MAX_SIZE', 8))
+        max_wait_ms = override.get('max_wait_ms', config.get('BATCH_MAX_WAIT_MS', 10))
+        return max_batch_size, max_wait_ms
+
+    @staticmethod
+    def get_batcher(key, max_batch_size, max_wait_ms, file_type=None, starvation_ms=500.0):
+        with BatchScheduler._lock:
+            batcher = BatchScheduler._batchers.get(key)
+            if batcher is None:
+                batcher = ModelBatcher(key, max_batch_size, max_wait_ms, file_type, starvation_ms)
+                BatchScheduler._batchers[key] = batcher
+            elif file_type:
+                batcher.file_type = file_type
+            return batcher
+
+    @staticmethod
+    def submit(model_id, model, image, config, file_type=None, predict_kwargs=None, deadline=None,
+               priority='normal'):
+        """
+        Submit an image to the batcher of the given model
+        :param file_type: model file_type, used as a metrics label
+        :param predict_kwargs: model.predict arguments of the request
+        :param deadline: monotonic request deadline (admission.Deadline)
+        :param priority: priority class of the request
+        :return: Future resolved with a single element list of ultralytics Results
+        """
+        max_batch_size, max_wait_ms = BatchScheduler.settings_for(model_id, config)
+        batcher = BatchScheduler.get_batcher(model_id, max_batch_size, max_wait_ms, file_type,
+                                             config.get('PRIORITY_STARVATION_MS', 500))
+        return batcher.submit(model, image, predict_kwargs, deadline, priority)
+
+    @staticmethod
+    def stats():
+        with BatchScheduler._lock:
+            batchers = list(BatchScheduler._batchers.values())
+        return [batcher.stats() for batcher in batchers]
+
+    @staticmethod
+    def queued_by_priority():
+        """
+        Queued items of all batchers per priority class
+        """
+        with BatchScheduler._lock:
+            batchers = list(BatchScheduler._batchers.values())
+        totals = {(priority,): 0 for priority in PRIORITY_CLASSES}
+        for batcher in batchers:
+            for priority, count in batcher._queue.depths().items():
+                totals[(priority,)] += count
+        return totals
+
+
+PRIORITY_QUEUED.set_function(BatchScheduler.queued_by_priority)
@@ -0,0 +1,219 @@
+# app/services/cleanup.py
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from app import db
+from app.models.filemanager import FileManager
+from app.models.upload_session import UploadSession
+from app.services.backends import source_name
+from app.services.filemanager import FileManagerService
+from app.services.model_loader import clean_model_cache
+
+MAX_REPORTED_FILES = 1000
+# names per IN query of the reference check before removing
+_RECHECK_BATCH = 500
+
+
+class CleanupService:
+    """
+    Background sweep of files no longer referenced by any FileManager entry
+    The referenced names are loaded with one query up front, the directories are scanned with
+    os.scandir: model files and exported artifacts in models/cls and models/detect, images in
+    public/images and its size folders, and old chunks left in public/temp.
+    Files newer than CLEANUP_MIN_AGE_MINUTES are kept, their entry may not be committed yet.
+    The state and the lock are per process: with several gunicorn workers each worker runs its
+    own sweep and reports only its own progress.
+    """
+    state = {
+        'status': 'idle',
+        'dry_run': False,
+        'phase': None,
+        'scanned': 0,
+        'removed': 0,
+        'reclaimed_bytes': 0,
+        'errors': 0,
+        'files': [],
+        'error': None,
+        'started_at': None,
+        'finished_at': None,
+    }
+    _lock = threading.Lock()
+
+    @staticmethod
+    def start(app, dry_run=False):
+        """
+        Start a sweep in a background thread
+        :param dry_run: only report what would be removed
+        :return: False when a sweep is already running
+        """
+        with CleanupService._lock:
+            if CleanupService.state['status'] == 'running':
+                return False
+            CleanupService.state.update({
+                'status': 'running',
+                'dry_run': dry_run,
+                'phase': None,
+                'scanned': 0,
+                'removed': 0,
+                'reclaimed_bytes': 0,
+                'errors': 0,
+                'files': [],
+                'error': None,
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+            })
+        threading.Thread(target=CleanupService.run, args=(app, dry_run), name='orphan-cleanup', daemon=True).start()
+        return True
+
+    @staticmethod
+    def run(app, dry_run=False):
+        with app.app_context():
+            state = CleanupService.state
+            try:
+                models, images = CleanupService.referenced()
+                cutoff = time.time() - app.config.get('CLEANUP_MIN_AGE_MINUTES', 60) * 60
+
+                for file_type in ('cls', 'detect'):
+                    state['phase'] = f"models/{file_type}"
+                    # exported artifacts are kept as long as their original weights are referenced
+                    CleanupService._sweep(os.path.join('models', file_type),
+                                          lambda name: source_name(name) in models, cutoff, dry_run,
+                                          still_referenced=CleanupService.referenced_models)
+
+                image_dir = os.path.join('public', 'images')
+                for folder in ('', *FileManagerService.SIZE_MAP):
+                    state['phase'] = os.path.join(image_dir, folder).rstrip(os.sep)
+                    CleanupService._sweep(os.path.join(image_dir, folder), lambda name: name in images, cutoff,
+                                          dry_run, files_only=True, still_referenced=CleanupService.referenced_images)
+
+                state['phase'] = 'public/temp'
+                temp_cutoff = time.time() - app.config.get('CLEANUP_TEMP_MAX_AGE_HOURS', 24) * 3600
+                for root in CleanupService._directories(os.path.join('public', 'temp')):
+                    CleanupService._sweep(root, lambda name: False, temp_cutoff, dry_run, files_only=True)
+
+                if not dry_run:
+                    clean_model_cache()
+                state['status'] = 'done'
+            except Exception as e:
+                state['status'] = 'failed'
+                state['error'] = str(e)
+                app.logger.error(f"Error in file cleanup: {str(e)}")
+            finally:
+                db.session.remove()
+                state['phase'] = None
+                state['finished_at'] = datetime.now().isoformat()
+                app.logger.info(f"File cleanup finished{' (dry run)' if dry_run else ''}: "
+                                f"{state['removed']} removed, {state['reclaimed_bytes']} bytes reclaimed")
+
+    @staticmethod
+    def referenced():
+        """
+        Model file and image names in use
+        :return: (model filenames, image names)
+        """
+        models, images = set(), set()
+        for filename, image_name in db.session.query(FileManager.filename, FileManager.image_name):
+            models.add(filename)
+            if image_name:
+                images.add(image_name)
+        # images of uploads still in progress
+        for (image_name,) in db.session.query(UploadSession.image_name).filter(
+                UploadSession.status != 'complete', UploadSession.image_name.isnot(None)):
+            images.add(image_name)
+        return models, images
+
+    @staticmethod
+    def referenced_models(names):
+        """
+        Model files and exported artifacts among names whose weights are referenced now
+        """
+        sources = {source_name(name) for name in names}
+        referenced = CleanupService._referenced_in(FileManager.filename, sources)
+        return {name for name in names if source_name(name) in referenced}
+
+    @staticmethod
+    def referenced_images(names):
+        """
+        Images among names referenced now by an entry or an upload in progress
+        """
+        return CleanupService._referenced_in(FileManager.image_name, names) | CleanupService._referenced_in(
+            UploadSession.image_name, names, UploadSession.status != 'complete')
+
+    @staticmethod
+    def _referenced_in(column, names, *criteria):
+        names = list(names)
+        referenced = set()
+        for start in range(0, len(names), _RECHECK_BATCH):
+            batch = names[start:start + _RECHECK_BATCH]
+            referenced.update(value for (value,) in db.session.query(column).filter(column.in_(batch), *criteria))
+        return referenced
+
+    @staticmethod
+    def _sweep(directory, keep, cutoff, dry_run, files_only=False, still_referenced=None):
+        """
+        Remove the entries of a directory that are not kept and older than cutoff
+        Dot entries are uploads and exports in progress and are never touched. The names were
+        loaded before the scan, so right before removing the candidates are checked again with
+        still_referenced and the ones referenced in the meantime are kept.
+        :param still_referenced: candidate names -> set of the ones referenced now
+        """
+        if not os.path.isdir(directory):
+            return
+        state = CleanupService.state
+        candidates = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or (files_only and not entry.is_file(follow_symlinks=False)):
+                    continue
+                state['scanned'] += 1
+                if keep(entry.name):
+                    continue
+                try:
+                    if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                        continue
+                    candidates.append((entry, CleanupService._size(entry)))
+                except OSError:
+                    state['errors'] += 1
+
+        if still_referenced and candidates:
+            referenced = still_referenced([entry.name for entry, _ in candidates])
+            candidates = [(entry, size) for entry, size in candidates if entry.name not in referenced]
+
+        for entry, size in candidates:
+            try:
+                if not dry_run:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.remove(entry.path)
+                state['removed'] += 1
+                state['reclaimed_bytes'] += size
+                if len(state['files']) < MAX_REPORTED_FILES:
+                    state['files'].append(entry.path)
+            except OSError:
+                state['errors'] += 1
+
+    @staticmethod
+    def _size(entry):
+        if not entry.is_dir(follow_symlinks=False):
+            return entry.stat(follow_symlinks=False).st_size
+        total = 0
+        for root, _, files in os.walk(entry.path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+        return total
+
+    @staticmethod
+    def _directories(directory):
+        """
+        A directory and all its subdirectories
+        """
+        if not os.path.isdir(directory):
+            return []
+        return [root for root, _, _ in os.walk(directory)]
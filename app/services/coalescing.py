@@ -0,0 +1,72 @@
+# app/services/coalescing.py
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.services.admission import Deadline
+
+
+class RequestCoalescer:
+    """
+    Share one result between identical in-flight calls
+    The first caller for a key starts the work on an executor thread, every caller, the first one
+    included, waits for its result until its own deadline. The work itself is not bound to the first
+    caller's deadline, callers arriving later may have more time. Nothing is kept once the work
+    has finished.
+    """
+
+    def __init__(self, max_workers=32):
+        self.max_workers = max_workers
+        self._executor = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def run(self, key, fn, deadline=None):
+        """
+        Run fn once for all concurrent callers with the same key
+        :param key: hashable identity of the work
+        :param fn: callable producing the result, without a deadline of its own, it runs on another
+                   thread so it has to set up any context it needs (e.g. the Flask app context)
+        :param deadline: monotonic deadline of this caller
+        :return: result of fn
+        :raises DeadlineExceeded: when the deadline of this caller passed
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.executed += 1
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='coalesced')
+                executor = self._executor
+            else:
+                self.coalesced += 1
+
+        if owner:
+            executor.submit(self._execute, key, fn, future)
+        return Deadline.wait(future, deadline)
+
+    def _execute(self, key, fn, future):
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key)
+            future.set_exception(e)
+        else:
+            self._finish(key)
+            future.set_result(result)
+
+    def _finish(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inflight': len(self._inflight),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+            }
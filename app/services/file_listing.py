@@ -0,0 +1,146 @@
+# app/services/file_listing.py
+import base64
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import String, and_, inspect, or_, text, type_coerce
+
+from app import db
+from app.models.filemanager import FileManager
+
+logger = logging.getLogger(__name__)
+
+TOTAL_MODES = ('exact', 'cached', 'approximate', 'none')
+
+
+class Cursor:
+    """
+    Opaque keyset cursor on (created_at, id), the listing order
+    A page after a cursor is an index range scan instead of an OFFSET over all previous rows.
+    """
+
+    @staticmethod
+    def encode(item):
+        payload = [item.created_at.isoformat(sep=' '), item.id]
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode(cursor):
+        """
+        :return: (created_at as text, id)
+        :raises ValueError: on a malformed cursor
+        """
+        try:
+            created_at, _id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            return str(created_at), int(_id)
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+
+    @staticmethod
+    def after(query, cursor):
+        """
+        Filter a query to the rows after a cursor in (created_at desc, id desc) order
+        """
+        created_at, _id = Cursor.decode(cursor)
+        if db.engine.dialect.name == 'sqlite':
+            # SQLite stores the server default timestamps as text without microseconds, compare the text
+            column = type_coerce(FileManager.created_at, String)
+        else:
+            column = FileManager.created_at
+            created_at = datetime.fromisoformat(created_at)
+        return query.filter(or_(column < created_at, and_(column == created_at, FileManager.id < _id)))
+
+
+class FileSearch:
+    """
+    Indexed search on name, description and file_type
+    PostgreSQL: pg_trgm GIN indexes, used by the planner for ILIKE '%term%'.
+    SQLite: an FTS5 table with the trigram tokenizer kept in sync by triggers, substring matches
+    for terms of at least 3 characters. Shorter terms, and databases without the index, use ILIKE.
+    The indexes are created by the migrations (5c1e9a7d2b43), not at runtime.
+    """
+    fts_enabled = False
+
+    @staticmethod
+    def detect():
+        """
+        Use the FTS5 table on SQLite if the migration created it, called at startup inside an app context
+        """
+        engine = db.engine
+        try:
+            FileSearch.fts_enabled = engine.dialect.name == 'sqlite' and inspect(engine).has_table('file_manager_fts')
+        except Exception as e:
+            FileSearch.fts_enabled = False
+            logger.warning(f"Search index not available, searching with ILIKE: {str(e)}")
+
+    @staticmethod
+    def filter(query, search):
+        if FileSearch.fts_enabled and len(search) >= 3:
+            match = '"' + search.replace('"', '""') + '"'
+            return query.filter(text(
+                "file_manager.id IN (SELECT rowid FROM file_manager_fts WHERE file_manager_fts MATCH :match)"
+            ).bindparams(match=match))
+
+        search_term = f"%{search}%"
+        return query.filter(
+            or_(
+                FileManager.name.ilike(search_term),
+                FileManager.file_type.ilike(search_term),
+                FileManager.description.ilike(search_term)
+            )
+        )
+
+
+class CountCache:
+    """
+    Listing totals per search term, kept for ttl seconds and cleared when entries change
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, search, count):
+        """
+        :param count: callable returning the exact total, called on a miss
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(search)
+            if cached and cached[1] > now:
+                return cached[0]
+        total = count()
+        with self._lock:
+            self._entries[search] = (total, now + self.ttl)
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+file_counts = CountCache()
+
+
+def count_items(query, search, mode):
+    """
+    Total of a listing query
+    :param mode: exact (COUNT), cached (COUNT cached per search term), approximate (planner
+                 estimate on PostgreSQL without a search, cached otherwise) or none
+    :return: total or None for mode none
+    """
+    if mode == 'none':
+        return None
+    if mode == 'exact':
+        return query.count()
+    if mode == 'approximate' and not search and db.engine.dialect.name == 'postgresql':
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'file_manager'")).scalar()
+        # -1 until the table is analyzed
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+    return file_counts.get(search, query.count)
@@ -1,15 +1,23 @@
 # services/filemanager.py
+import json
 import os
+import time
 import uuid
 from http import HTTPStatus
 
 from flask import current_app
-from sqlalchemy import or_
 from app import db
 from app.models.filemanager import FileManager
+from app.models.upload_session import UploadSession
 from werkzeug.utils import secure_filename
 
-from app.services.model_loader import clean_model_cache
+from app.services.backends import export_async, remove_artifacts
+from app.services.file_listing import Cursor, FileSearch, count_items, file_counts
+from app.services.metadata_cache import metadata_cache
+from app.services.model_loader import get_model_folder, model_cache, model_key
+from app.services.predict_params import PredictParams
+from app.services.upload_session import UploadInProgress, UploadSessionService
+from app.services.warmup import WarmupService
 
 
 class FileManagerService:
@@ -21,43 +29,62 @@ class FileManagerService:
     }
 
     @staticmethod
-    def get_file_list(search=None, page=1, per_page=10):
+    def get_file_list(search=None, page=1, per_page=10, cursor=None, total='exact'):
         """
         Query file list with pagination
+        Pages by page number (OFFSET) or, when cursor is given, by keyset on (created_at, id):
+        an empty cursor is the first page and every page returns the cursor of the next one.
         :param search:
         :param page:
         :param per_page:
+        :param cursor: None for page numbers
+        :param total: exact, cached, approximate or none (file_listing.count_items)
         :return:
+        :raises ValueError: on an invalid cursor
         """
         query = FileManager.query
 
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    FileManager.name.ilike(search_term),
-                    FileManager.file_type.ilike(search_term),
-                    FileManager.description.ilike(search_term)
-                )
-            )
+            query = FileSearch.filter(query, search)
+
+        total_items = count_items(query, search, total)
+        total_pages = (total_items + per_page - 1) // per_page if total_items is not None else None
+        # one extra row tells whether there is a next page without relying on the total
+        query = query.order_by(FileManager.created_at.desc(), FileManager.id.desc())
+
+        if cursor is not None:
+            if cursor:
+                query = Cursor.after(query, cursor)
+            items = query.limit(per_page + 1).all()
+            has_next = len(items) > per_page
+            items = items[:per_page]
+            return {
+                'items': [item.to_dict() for item in items],
+                'pagination': {
+                    'total_items': total_items,
+                    'total_pages': total_pages,
+                    'per_page': per_page,
+                    'has_next': has_next,
+                    'next_cursor': Cursor.encode(items[-1]) if has_next else None
+                }
+            }
 
-        total_items = query.count()
-        total_pages = (total_items + per_page - 1) // per_page
-        page = min(max(page, 1), total_pages) if total_pages > 0 else 1
+        if total == 'exact':
+            page = min(max(page, 1), total_pages) if total_pages > 0 else 1
 
-        items = query.order_by(FileManager.created_at.desc()) \
-            .offset((page - 1) * per_page) \
-            .limit(per_page) \
+        items = query.offset((page - 1) * per_page) \
+            .limit(per_page + 1) \
             .all()
+        has_next = len(items) > per_page
 
         return {
-            'items': [item.to_dict() for item in items],
+            'items': [item.to_dict() for item in items[:per_page]],
             'pagination': {
                 'total_items': total_items,
                 'total_pages': total_pages,
                 'current_page': page,
                 'per_page': per_page,
-                'has_next': page < total_pages,
+                'has_next': has_next,
                 'has_prev': page > 1
             }
         }
@@ -103,59 +130,150 @@ class FileManagerService:
         return existing is None
 
     @staticmethod
-    def handle_chunk_upload(file, data):
+    def create_upload_session(data, image=None):
         """
-        Handle chunk upload
-        :param file:
-        :param data:
-        :return:
+        Start a chunked model upload, the model file is preallocated and the chunks can then be
+        sent in any order and in parallel
+        :param data: filename, file_type, total_size, chunk_size and the FileManager fields
+        :param image: image file, saved right away
+        :return: tuple of response data and status code
+        :raises ValueError: on invalid sizes or file type
         """
-        try:
-            path_temp = os.path.join('public', 'temp', data['file_type'])
-            os.makedirs(path_temp, exist_ok=True)
+        data = dict(data)
+        if data.get('predict_params') is not None:
+            data['predict_params'] = json.dumps(data['predict_params'])
+        data['image_name'] = FileManagerService._save_image(image) if image else None
+        session = UploadSessionService.create(data)
+        return {
+            'status': 'success',
+            'message': 'Upload session created',
+            'data': session.to_dict()
+        }, HTTPStatus.CREATED
 
-            filename = data['filename'].split('.')[0]
-            extension = os.path.splitext(file.filename)[1]
-            temp_filename = f"{filename}_{data['chunk_number']}{extension}"
+    @staticmethod
+    def get_upload_session(upload_id):
+        """
+        Status of an upload session, with the chunk ranges already received to resume from
+        :param upload_id:
+        :return: tuple of response data and status code
+        """
+        session = db.session.get(UploadSession, upload_id)
+        if not session:
+            return {
+                'status': 'error',
+                'message': 'Upload session not found'
+            }, HTTPStatus.NOT_FOUND
 
-            file.save(os.path.join(path_temp, temp_filename))
+        return {
+            'status': 'success',
+            'data': UploadSessionService.status(session),
+            'message': 'Upload session retrieved successfully'
+        }, HTTPStatus.OK
 
-            # if this is the last chunk, merge all chunks
-            if data['chunk_number'] == data['total_chunks'] - 1:
-                return FileManagerService._process_final_chunk(file, data, extension)
+    @staticmethod
+    def handle_chunk_upload(file, data):
+        """
+        Handle chunk upload
+        The chunk is written at its offset into the part file of the upload session, the request
+        completing the session renames it to the final model file. Without an upload_id the session
+        is implicit and the chunks are expected in order, starting with chunk 0.
+        :param file: chunk file
+        :param data: chunk_number, upload_id or filename / file_type / total_chunks, FileManager fields
+        :return: tuple of response data and status code
+        """
+        try:
+            if data.get('upload_id'):
+                session = db.session.get(UploadSession, data['upload_id'])
+                if not session or session.status != 'open':
+                    return {'status': 'error', 'message': 'Upload session not found'}, HTTPStatus.NOT_FOUND
+                chunk_filename = session.filename
+            else:
+                stem = data['filename'].split('.')[0]
+                extension = os.path.splitext(file.filename)[1]
+                chunk_filename = f"{stem}_{data['chunk_number']}{extension}"
+                file.stream.seek(0, os.SEEK_END)
+                chunk_size = file.stream.tell()
+                file.stream.seek(0)
+                try:
+                    session = UploadSessionService.legacy_session(
+                        dict(data, filename=f"{stem}{extension}"), chunk_size)
+                except ValueError as e:
+                    return {'status': 'error', 'message': str(e)}, HTTPStatus.BAD_REQUEST
+                except UploadInProgress as e:
+                    return {'status': 'error', 'message': str(e)}, HTTPStatus.CONFLICT
+                if not session:
+                    return {'status': 'error', 'message': 'Upload not started, send chunk 0 first'}, \
+                        HTTPStatus.BAD_REQUEST
+
+            try:
+                UploadSessionService.write_chunk(session, data['chunk_number'], file.stream, data.get('checksum'))
+            except ValueError as e:
+                return {'status': 'error', 'message': str(e)}, HTTPStatus.BAD_REQUEST
+
+            # only one of the requests completing the session concurrently finalizes it
+            if UploadSessionService.is_complete(session) and UploadSessionService.claim(session):
+                content_hash = None
+                try:
+                    content_hash = UploadSessionService.file_hash(session)
+                    if session.sha256 and content_hash != session.sha256:
+                        UploadSessionService.reopen(session)
+                        return {
+                            'status': 'error',
+                            'message': 'File hash mismatch, the chunks have to be sent again',
+                            'upload_id': session.id
+                        }, HTTPStatus.UNPROCESSABLE_ENTITY
+                    new_filename = UploadSessionService.finalize(session, content_hash)
+                    return FileManagerService._process_final_chunk(
+                        new_filename, FileManagerService._session_fields(session, data), content_hash)
+                except Exception:
+                    # a session left finalizing could never be completed, sending a chunk again retries
+                    UploadSessionService.release(session, content_hash)
+                    raise
 
             return {
                 "message": "Chunk uploaded successfully",
-                "filename": temp_filename,
+                "filename": chunk_filename,
+                "upload_id": session.id,
                 "type": "chunk"
             }, 201
 
-
         except Exception as e:
             current_app.logger.error(f"Error in chunk upload: {str(e)}")
             raise
 
     @staticmethod
-    def _process_final_chunk(file, data, extension):
+    def _session_fields(session, data):
+        """
+        FileManager fields of a completed upload, values sent with the last chunk win over the
+        ones given when the session was created
+        """
+        predict_params = data.get('predict_params')
+        if predict_params is None and session.predict_params is not None:
+            predict_params = json.loads(session.predict_params)
+        return {
+            'name': data['name'] if data.get('name') is not None else session.name,
+            'description': (data['description'] if data.get('description') is not None
+                            else session.description) or '',
+            'id': data.get('id') or session.file_manager_id,
+            'file_type': session.file_type,
+            'image': data.get('image'),
+            'image_name': session.image_name,
+            'predict_params': predict_params
+        }
+
+    @staticmethod
+    def _process_final_chunk(new_filename, data, content_hash=None):
         """
         Process final chunk
-        :param file: อัพโหลดไฟล์
-        :param data: ข้อมูลที่เกี่ยวข้อง
-        :param extension: นามสกุลไฟล์
+        :param new_filename: model file name in models/<file_type>
+        :param data: FileManager fields of the upload (_session_fields)
+        :param content_hash: SHA-256 of the model file
         :return: tuple ของ response data และ status code
         """
         try:
-            path_models = os.path.join('models', data['file_type'])
-            new_filename = FileManagerService._merge_chunks(
-                data['filename'],
-                data['total_chunks'],
-                data['file_type'],
-                extension
-            )
-
-            # save image file
+            # save image file, the one given when the session was created otherwise
             image = data.get('image')
-            image_filename = FileManagerService._save_image(image) if image else ""
+            image_filename = FileManagerService._save_image(image) if image else data.get('image_name') or ""
 
             # if data['id'] is provided, update existing record
             if data.get('id'):
@@ -167,11 +285,25 @@ class FileManagerService:
                 file_manager.name = data['name']
                 file_manager.description = data['description']
                 file_manager.filename = new_filename
+                file_manager.content_hash = content_hash
                 file_manager.image_name = image_filename
                 file_manager.file_type = data['file_type']
+                if data.get('predict_params') is not None:
+                    file_manager.predict_params = json.dumps(data['predict_params']) if data['predict_params'] else None
                 file_manager.updated_at = db.func.now()
 
-                db.session.commit()
+                # Keep serving the cached version until the new file is loaded and warm
+                key = model_key(new_filename, get_model_folder(data['file_type']), file_manager.id, content_hash)
+                model_cache.begin_swap(key)
+                try:
+                    db.session.commit()
+                except Exception:
+                    model_cache.cancel_swap(key)
+                    raise
+                metadata_cache.invalidate(file_manager.id)
+                file_counts.clear()
+                WarmupService.warm_async(current_app._get_current_object(), file_manager.id, swap=True)
+                FileManagerService._export_async(file_manager.id)
 
                 return {
                     "message": "File updated successfully",
@@ -185,12 +317,18 @@ class FileManagerService:
                     name=data['name'],
                     description=data['description'],
                     filename=new_filename,
+                    content_hash=content_hash,
                     image_name=image_filename,
-                    file_type=data['file_type']
+                    file_type=data['file_type'],
+                    predict_params=json.dumps(data['predict_params']) if data.get('predict_params') else None
                 )
 
                 db.session.add(file_manager)
                 db.session.commit()
+                metadata_cache.invalidate(file_manager.id)
+                file_counts.clear()
+                WarmupService.warm_async(current_app._get_current_object(), file_manager.id)
+                FileManagerService._export_async(file_manager.id)
 
                 return {
                     "message": "File uploaded successfully",
@@ -205,30 +343,14 @@ class FileManagerService:
             raise
 
     @staticmethod
-    def _merge_chunks(filename, total_chunks, file_type, extension):
+    def _export_async(_id):
         """
-        Merge chunks into a single file
-        :param filename:
-        :param total_chunks:
-        :param file_type:
-        :param extension:
-        :return:
+        Export the uploaded model to the backends in EXPORT_BACKENDS in the background
+        :param _id: FileManager id
         """
-        path_temp = os.path.join('public', 'temp', file_type)
-        path_models = os.path.join('models', file_type)
-        os.makedirs(path_models, exist_ok=True)
-
-        new_filename = f"{filename}_{uuid.uuid4()}{extension}"
-        new_filename = secure_filename(new_filename)
-
-        with open(os.path.join(path_models, new_filename), 'wb') as final_file:
-            for i in range(total_chunks):
-                chunk_path = os.path.join(path_temp, f"{filename}_{i}{extension}")
-                with open(chunk_path, 'rb') as chunk_file:
-                    final_file.write(chunk_file.read())
-                os.remove(chunk_path)
-
-        return new_filename
+        backends = current_app.config.get('EXPORT_BACKENDS', [])
+        if backends:
+            export_async(current_app._get_current_object(), _id, backends)
 
     @staticmethod
     def _save_image(image):
@@ -284,7 +406,7 @@ class FileManagerService:
             dict: updated file information
 
         Raises:
-            ValueError: if name is not provided
+            ValueError: if name is not provided or predict_params is invalid
         """
         try:
             # Validate input
@@ -304,9 +426,15 @@ class FileManagerService:
             # Update fields
             file_manager.name = data.get('name')
             file_manager.description = data.get('description', '')
+            if 'predict_params' in data:
+                # default predict params of the model, an empty value clears them
+                params = PredictParams.parse(data['predict_params'])
+                file_manager.predict_params = json.dumps(params) if params else None
 
             # Save changes
             db.session.commit()
+            metadata_cache.invalidate(_id)
+            file_counts.clear()
 
             return {
                 'status': 'success',
@@ -340,15 +468,13 @@ class FileManagerService:
             FileManagerService.delete_image(file_manager.image_name)
 
             file_type = file_manager.file_type if file_manager.file_type else 'cls'
-            path_models = os.path.join('models', file_type)
-
-            path = os.path.join(path_models, file_manager.filename)
-            if os.path.exists(path):
-                os.remove(path)
-                current_app.logger.info(f"Removed model file: { file_manager.filename }")
+            FileManagerService._remove_model_file(os.path.join('models', file_type), file_manager)
 
             db.session.delete(file_manager)
             db.session.commit()
+            metadata_cache.invalidate(_id)
+            file_counts.clear()
+            model_cache.evict_model(_id)
 
             return {
                 'status': 'success',
@@ -361,44 +487,64 @@ class FileManagerService:
             raise Exception(f"Failed to delete file: {str(e)}")
 
     @staticmethod
-    def clear_file():
+    def _remove_model_file(path_models, file_manager):
         """
-        Clear all files in models/cls and models/detect that are not in the database.
-        :return: Response dictionary and HTTP status code
+        Remove the model file of an entry being deleted unless another entry uses it
+        The file is shared by the entries uploaded with the same content, and an upload deduplicated
+        onto it touches it before its own entry is committed. So the file is first moved aside, then
+        the references are counted again and a file touched within MODEL_DELETE_GRACE_SECONDS is put
+        back; the file cleanup removes it later if it stays unreferenced.
         """
-        def clear_directory(directory):
-            """
-            Helper function to clear files in a directory that are not in the database.
-            :param directory: Path to the directory
-            """
-            if not os.path.exists(directory):
-                current_app.logger.warning(f"Directory {directory} does not exist.")
+        references = FileManagerService._model_references(file_manager)
+        if references:
+            current_app.logger.info(f"Keep model file: {file_manager.filename}, {references} references left")
+            return
+
+        path = os.path.join(path_models, file_manager.filename)
+        # not a dot file, the file cleanup collects it if the process dies before removing it
+        aside = f"{path}.{uuid.uuid4().hex}.deleting"
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            aside = None
+
+        if aside:
+            grace = current_app.config.get('MODEL_DELETE_GRACE_SECONDS', 300)
+            if time.time() - os.stat(aside).st_mtime < grace or FileManagerService._model_references(file_manager):
+                os.replace(aside, path)
+                current_app.logger.info(f"Keep model file: {file_manager.filename}, in use by an upload")
                 return
+            os.remove(aside)
+            current_app.logger.info(f"Removed model file: {file_manager.filename}")
+        remove_artifacts(path_models, file_manager.filename)
 
-            files = os.listdir(directory)
-            for filename in files:
-                file_path = os.path.join(directory, filename)
-                exit_file = FileManager.query.filter_by(filename=filename).first()
-                if not exit_file:
-                    try:
-                        os.remove(file_path)
-                        current_app.logger.info(f"Removed: {filename}")
-                    except Exception as e:
-                        current_app.logger.error(f"Error deleting {filename}: {str(e)}")
-                else:
-                    current_app.logger.info(f"Keep: {filename}")
-
-        # Clear files in models/cls
-        cls_directory = os.path.join("models", "cls")
-        current_app.logger.info("Clearing files in models/cls")
-        clear_directory(cls_directory)
-
-        # Clear files in models/detect
-        detect_directory = os.path.join("models", "detect")
-        current_app.logger.info("Clearing files in models/detect")
-        clear_directory(detect_directory)
-        clean_model_cache(max_age_minutes=45)
+    @staticmethod
+    def _model_references(file_manager):
+        """
+        Other entries using the model file of an entry
+        """
+        return FileManager.query.filter(FileManager.filename == file_manager.filename,
+                                        FileManager.file_type == file_manager.file_type,
+                                        FileManager.id != file_manager.id).count()
+
+    @staticmethod
+    def clear_file(dry_run=False):
+        """
+        Start removing the files in models, public/images and public/temp that no entry references,
+        the sweep runs in the background, its progress is in CleanupService.state
+        :param dry_run: only report what would be removed
+        :return: Response dictionary and HTTP status code
+        """
+        from app.services.cleanup import CleanupService
+
+        if not CleanupService.start(current_app._get_current_object(), dry_run):
+            return {
+                'status': 'error',
+                'message': 'File cleanup is already running',
+                'data': CleanupService.state
+            }, HTTPStatus.CONFLICT
         return {
             'status': 'success',
-            'message': 'All files deleted successfully'
-        }, HTTPStatus.OK
\ No newline at end of file
+            'message': 'File cleanup started',
+            'data': CleanupService.state
+        }, HTTPStatus.ACCEPTED
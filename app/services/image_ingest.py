@@ -0,0 +1,78 @@
+# app/services/image_ingest.py
+import hashlib
+import io
+
+import numpy as np
+from PIL import Image
+
+_HASH_CHUNK = 1024 * 1024
+
+
+class ImageIngest:
+    """
+    Turn uploads into model inputs with as little copying and decoding as possible
+    - encoded images are decoded straight from the upload stream, JPEGs in draft mode so the
+      decoder already downscales close to the model input size
+    - raw RGB uint8 buffers and .npy arrays skip PIL entirely
+    Numpy results are BGR, which is what ultralytics expects for arrays.
+    """
+
+    @staticmethod
+    def hash_stream(stream):
+        """
+        SHA-256 of a seekable stream without reading it into memory at once
+        """
+        digest = hashlib.sha256()
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+        stream.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def decode_stream(stream, filename='', target_size=None):
+        """
+        Decode an uploaded file
+        :param stream: seekable binary stream positioned at the start of the file
+        :param filename: used to detect .npy uploads
+        :param target_size: model input size, JPEGs are decoded at the smallest scale still >= this size
+        :return: PIL image (RGB) or numpy array (BGR)
+        """
+        if filename.lower().endswith('.npy'):
+            return ImageIngest.from_array(np.load(stream, allow_pickle=False))
+
+        image = Image.open(stream)
+        if target_size and image.format == 'JPEG':
+            image.draft('RGB', (target_size, target_size))
+        # convert forces the decode here instead of later in the inference thread
+        return image.convert('RGB')
+
+    @staticmethod
+    def decode_bytes(data, filename='', target_size=None):
+        return ImageIngest.decode_stream(io.BytesIO(data), filename, target_size)
+
+    @staticmethod
+    def from_raw(data, height, width, channels=3):
+        """
+        Wrap a raw RGB (or grayscale) uint8 buffer without decoding
+        :raises ValueError: if the buffer does not match the shape
+        """
+        expected = height * width * channels
+        if len(data) != expected:
+            raise ValueError(f"Raw image has {len(data)} bytes, expected {expected} for {height}x{width}x{channels}")
+        return ImageIngest.from_array(np.frombuffer(data, dtype=np.uint8).reshape(height, width, channels))
+
+    @staticmethod
+    def from_array(array):
+        """
+        Validate an RGB uint8 array (HxWx3, HxWx1 or HxW) and return it as BGR for ultralytics
+        """
+        if array.dtype != np.uint8:
+            raise ValueError(f"Expected a uint8 array, got {array.dtype}")
+        if array.ndim == 2:
+            array = array[:, :, None]
+        if array.ndim != 3 or array.shape[2] not in (1, 3):
+            raise ValueError(f"Expected an HxWx3 or HxW array, got shape {array.shape}")
+        if array.shape[2] == 1:
+            array = np.repeat(array, 3, axis=2)
+        return np.ascontiguousarray(array[:, :, ::-1])
@@ -0,0 +1,313 @@
+# app/services/inference_pool.py
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from app.services.admission import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(index, tasks, results, settings):
+    """
+    Inference worker process
+    Owns the models assigned to it, collects queued tasks into batches, runs model.predict and the
+    result post-processing, then sends plain python results back to the HTTP process.
+    Task: (task_id, reply slot, key, model_path, file_type, images, predict params)
+    Result, put on the queue of the reply slot: (task_id, ok, list of processed results or error message)
+    """
+    import json
+
+    import torch
+
+    from app.services import backends
+    from app.services.model_loader import ModelCache, _model_loader
+    from app.services.predict_params import PredictParams
+    from app.services.PredictService import PredictService
+
+    torch.set_num_threads(settings['torch_threads'] or torch.get_num_threads())
+    backends.configure(**settings['backends'])
+    cache = ModelCache(max_bytes=settings['cache_max_bytes'])
+    max_batch_size = settings['max_batch_size']
+    max_wait = settings['max_wait_ms'] / 1000.0
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        # Gather more queued tasks until the batch is full or the window closes
+        batch = [task]
+        size = len(task[5])
+        deadline = time.perf_counter() + max_wait
+        while size < max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                task = tasks.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if task is None:
+                tasks.put(None)
+                break
+            batch.append(task)
+            size += len(task[5])
+
+        # predict params apply to a whole model.predict call, so they are part of the group
+        groups = {}
+        for task in batch:
+            groups.setdefault((task[2], json.dumps(task[6], sort_keys=True)), []).append(task)
+
+        for (key, _), group in groups.items():
+            try:
+                _, _, _, model_path, file_type, _, params = group[0]
+                kwargs = PredictParams.predict_kwargs(params, file_type)
+                model = cache.get_or_load(key, _model_loader(model_path))
+                if model is None:
+                    raise FileNotFoundError('Model not found')
+
+                images = [image for task in group for image in task[5]]
+                predicted = []
+                with torch.no_grad():
+                    for start in range(0, len(images), max_batch_size):
+                        predicted.extend(model.predict(images[start:start + max_batch_size], verbose=False,
+                                                       **kwargs))
+                if len(predicted) != len(images):
+                    # results cannot be matched to their tasks
+                    raise RuntimeError(f"model.predict returned {len(predicted)} results for {len(images)} images")
+
+                offset = 0
+                for task_id, slot, _, _, _, task_images, _ in group:
+                    processed = []
+                    for result in predicted[offset:offset + len(task_images)]:
+                        processed.append(PredictService.process_cls_result([result], params.get('top_k'))
+                                         if file_type == 'cls'
+                                         else PredictService.process_detect_result(
+                                             [result], params.get('layout') == 'columnar'))
+                    offset += len(task_images)
+                    results[slot].put((task_id, True, processed))
+            except Exception as e:
+                for task in group:
+                    results[task[1]].put((task[0], False, f"{type(e).__name__}: {str(e)}"))
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+def pool_settings(config):
+    """
+    Settings passed to every inference worker, from an app config mapping
+    """
+    return {
+        'max_batch_size': config['BATCH_MAX_SIZE'],
+        'max_wait_ms': config['BATCH_MAX_WAIT_MS'],
+        'cache_max_bytes': config['MODEL_CACHE_MAX_BYTES'],
+        'torch_threads': config['INFERENCE_WORKER_THREADS'],
+        'backends': {
+            'default': config['INFERENCE_BACKEND'],
+            'models': config['MODEL_BACKENDS'],
+            'serve_quantized': config['SERVE_QUANTIZED'],
+        },
+    }
+
+
+class InferencePool:
+    """
+    Pool of inference worker processes, separate from the HTTP worker threads
+    Every model is owned by exactly one worker, chosen from the configured assignments or by
+    model id, so models are not duplicated across processes. Work is sent over local queues.
+
+    The pool is started once by the process owning it: the gunicorn master (see gunicorn.conf.py)
+    or, without gunicorn, the process running create_app. Each process sending work attaches to
+    its own reply slot, a result queue only it reads. The owner checks the workers on a timer,
+    restarts dead ones and tells every slot to fail the futures the dead worker held.
+    """
+
+    def __init__(self, target=_worker_main, check_interval=1.0):
+        self._context = multiprocessing.get_context('spawn')
+        self._target = target
+        self._check_interval = check_interval
+        self._workers = []
+        self._queues = []
+        self._results = []
+        self._pids = None
+        self._futures = {}
+        self._assignments = {}
+        self._settings = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._owner = None
+        self._slot = None
+        self._monitor = None
+        self._collector = None
+        self._running = False
+        self.timeout = 300.0
+
+    @property
+    def enabled(self):
+        return self._slot is not None
+
+    @property
+    def slots(self):
+        return len(self._results)
+
+    def start(self, workers, assignments=None, settings=None, slots=1):
+        """
+        Start the worker processes, in the process owning the pool
+        :param workers: number of worker processes
+        :param assignments: mapping of model id to worker index, e.g. {"3": 0, "5": 1}
+        :param settings: settings passed to every worker (batching, cache budget, backends)
+        :param slots: number of processes that attach to the pool, e.g. the gunicorn workers
+        :return: True if the pool was started
+        """
+        if self._running or workers <= 0:
+            return False
+        self._assignments = {str(_id): int(index) % workers for _id, index in (assignments or {}).items()}
+        self._settings = settings or {}
+        # SimpleQueue writes in the calling thread, a worker dying after a put cannot leave the
+        # write lock held by an unfinished feeder thread and block the results of the other workers
+        self._results = [self._context.SimpleQueue() for _ in range(max(1, slots))]
+        self._pids = self._context.Array('q', workers)
+        for index in range(workers):
+            self._queues.append(self._context.Queue())
+            self._workers.append(None)
+            self._spawn(index)
+
+        self._owner = os.getpid()
+        self._running = True
+        self._monitor = threading.Thread(target=self._watch, name='inference-pool-monitor', daemon=True)
+        self._monitor.start()
+        atexit.register(self.stop)
+        logger.info(f"Inference pool started with {workers} workers and {self.slots} reply slots")
+        return True
+
+    def attach(self, slot):
+        """
+        Receive results on a reply slot, called once in every process sending work
+        Called after a fork as well, so the state of the parent is not reused.
+        """
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._slot = slot
+        self._collector = threading.Thread(target=self._collect, name='inference-pool-results', daemon=True)
+        self._collector.start()
+
+    def _spawn(self, index):
+        process = self._context.Process(
+            target=self._target,
+            args=(index, self._queues[index], self._results, self._settings),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._workers[index] = process
+        self._pids[index] = process.pid
+
+    def stop(self):
+        """
+        Stop the worker processes, only the owner of the pool stops them
+        """
+        if not self._running or os.getpid() != self._owner:
+            return
+        self._running = False
+        for task_queue in self._queues:
+            task_queue.put(None)
+        for process in self._workers:
+            process.join(timeout=5)
+        logger.info("Inference pool stopped")
+
+    def worker_for(self, model_id):
+        return self._assignments.get(str(model_id), int(model_id) % len(self._queues))
+
+    def submit(self, model_id, key, model_path, file_type, images, params=None):
+        """
+        Queue images for a model on the worker that owns it
+        :param params: effective predict params (PredictParams.resolve)
+        :return: Future resolved with one processed result per image
+        """
+        index = self.worker_for(model_id)
+        future = Future()
+        # the pid keeps ids unique when a restarted HTTP worker reuses the slot
+        task_id = (os.getpid(), next(self._ids))
+        with self._lock:
+            self._futures[task_id] = (index, future)
+        self._queues[index].put((task_id, self._slot, key, model_path, file_type, list(images), params or {}))
+        return future
+
+    def wait(self, future, deadline=None):
+        """
+        Wait for a pool result until the request deadline, never longer than the pool timeout
+        :raises DeadlineExceeded: when the deadline or the timeout passes first
+        """
+        limit = time.monotonic() + self.timeout
+        return Deadline.wait(future, limit if deadline is None else min(deadline, limit))
+
+    def _collect(self):
+        """
+        Route the results of this slot to their futures
+        A result without task id reports a worker that exited, its pending futures fail.
+        """
+        results = self._results[self._slot]
+        while True:
+            task_id, ok, payload = results.get()
+            if task_id is None:
+                self._fail_worker(payload)
+                continue
+
+            with self._lock:
+                _, future = self._futures.pop(task_id, (None, None))
+            if future is None:
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _fail_worker(self, index):
+        with self._lock:
+            lost = [task_id for task_id, (owner, _) in self._futures.items() if owner == index]
+            futures = [self._futures.pop(task_id)[1] for task_id in lost]
+        for future in futures:
+            future.set_exception(RuntimeError(f"Inference worker {index} exited"))
+
+    def _watch(self):
+        while self._running:
+            self._check_workers()
+            time.sleep(self._check_interval)
+
+    def _check_workers(self):
+        """
+        Restart workers that died and report them to every reply slot
+        """
+        for index, process in enumerate(self._workers):
+            if not self._running or process.is_alive():
+                continue
+            logger.error(f"Inference worker {index} exited with code {process.exitcode}, restarting")
+            self._pids[index] = 0
+            for results in self._results:
+                results.put((None, False, index))
+            self._spawn(index)
+
+    def stats(self):
+        with self._lock:
+            pending = [owner for owner, _ in self._futures.values()]
+        return {
+            'slot': self._slot,
+            'workers': [{
+                'index': index,
+                'pid': self._pids[index] or None,
+                'alive': bool(self._pids[index]),
+                'pending': pending.count(index),
+                'models': sorted(_id for _id, owner in self._assignments.items() if owner == index),
+            } for index in range(len(self._queues))],
+        }
+
+
+inference_pool = InferencePool()
@@ -0,0 +1,129 @@
+# app/services/metadata_cache.py
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+from app.services.model_loader import get_model_folder
+from app.services.predict_params import PredictParams
+
+ModelMetadata = namedtuple('ModelMetadata', ['id', 'filename', 'file_type', 'path', 'predict_params', 'content_hash'])
+
+
+class MetadataCache:
+    """
+    In-process TTL cache of the FileManager fields the predict path needs
+    (id -> filename, file_type, path, default predict params, content hash)
+    Entries are invalidated explicitly when a FileManager entry changes. The TTL bounds staleness
+    for changes made by another worker process. A lookup that raced with an invalidation is not
+    cached, and the least recently used entries are dropped over max_entries.
+    """
+
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Bumped by invalidate and clear, a lookup only caches its row if no bump happened meanwhile
+        self._generation = 0
+        self._invalidated = {} # id -> generation of its last invalidation, kept while a lookup may need it
+        self._cleared_at = 0
+        self._loading = Counter() # generation -> lookups in flight that started at it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, _id):
+        """
+        Get the metadata of a FileManager entry, querying the database on a miss
+        :param _id: FileManager id
+        :return: ModelMetadata or None if the entry does not exist
+        """
+        try:
+            _id = int(_id)
+        except (TypeError, ValueError):
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(_id)
+            if cached and cached[1] > now:
+                self._entries.move_to_end(_id)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+            generation = self._generation
+            self._loading[generation] += 1
+
+        metadata = None
+        try:
+            metadata = self._load(_id)
+        finally:
+            with self._lock:
+                # An invalidation while the row was read may have made it stale
+                if metadata is not None and self._invalidated.get(_id, 0) <= generation \
+                        and self._cleared_at <= generation:
+                    self._entries[_id] = (metadata, now + self.ttl)
+                    self._entries.move_to_end(_id)
+                    while self.max_entries and len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                self._loading[generation] -= 1
+                if not self._loading[generation]:
+                    del self._loading[generation]
+                self._prune_invalidated()
+        return metadata
+
+    def _prune_invalidated(self):
+        """
+        Forget invalidations no lookup in flight started before, called with _lock held
+        """
+        if not self._invalidated:
+            return
+        if not self._loading:
+            self._invalidated.clear()
+            return
+        oldest = min(self._loading)
+        for _id in [_id for _id, generation in self._invalidated.items() if generation <= oldest]:
+            del self._invalidated[_id]
+
+    @staticmethod
+    def _load(_id):
+        from app.models.filemanager import FileManager
+        file_manager = FileManager.query.filter_by(id=_id).first()
+        if not file_manager:
+            return None
+
+        return ModelMetadata(
+            id=file_manager.id,
+            filename=file_manager.filename,
+            file_type=file_manager.file_type,
+            path=get_model_folder(file_manager.file_type),
+            predict_params=PredictParams.load(file_manager.predict_params),
+            content_hash=file_manager.content_hash
+        )
+
+    def invalidate(self, _id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(int(_id), None)
+            if self._loading:
+                self._invalidated[int(_id)] = self._generation
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cleared_at = self._generation
+            self._invalidated.clear()
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+metadata_cache = MetadataCache()
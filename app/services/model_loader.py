@@ -1,13 +1,386 @@
 # app/services/model_loader.py
 
 import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
 import torch
 from ultralytics import YOLO
-from datetime import datetime, timedelta
 
-model_cache = {}
-model_access_time = {}
-clean_model_time = datetime.now()
+from app.services.backends import resolve_model_file
+from app.services.metrics import (MODEL_CACHE_BYTES, MODEL_CACHE_EVICTIONS, MODEL_CACHE_LOOKUPS,
+                                  MODEL_CACHE_MODELS, MODEL_LOAD_SECONDS)
+
+
+class _CacheEntry:
+    __slots__ = ('model', 'size', 'loaded_at', 'last_access')
+
+    def __init__(self, model, size):
+        self.model = model
+        self.size = size
+        self.loaded_at = datetime.now()
+        self.last_access = self.loaded_at
+
+
+class ModelCache:
+    """
+    Thread-safe LRU cache of loaded models
+    Models are evicted in least recently used order once the cache exceeds its byte budget
+    (or its model count limit). Pinned models are never evicted.
+    Loads are single-flight: concurrent misses for one key wait for the thread that is loading it.
+
+    Keys are (content, version) so a replaced model file loads as a new entry, content being the
+    SHA-256 of the weights (the model id for files stored before content addressing). Model ids with
+    identical weights share one entry. The active version of a model id keeps serving while a new
+    version warms up, activate() switches over atomically and the old version is released once its
+    in-flight leases are returned and no other model id serves it. Metrics and sizes are reported
+    per FileManager id, the content hash is only the cache key.
+    """
+
+    def __init__(self, max_bytes=0, max_models=0):
+        self.max_bytes = max_bytes # 0 = unlimited
+        self.max_models = max_models # 0 = unlimited
+        self._entries = OrderedDict()
+        self._pinned = set()
+        self._loading = {}
+        self._active = {}
+        self._pending = set()
+        self._refs = Counter()
+        self._retired = set()
+        self._model_ids = {} # key -> FileManager ids that loaded or serve it
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced_loads = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_time_total = 0.0
+        self.last_load_time = 0.0
+
+    def configure(self, max_bytes=None, max_models=None, pinned=None):
+        """
+        Update the budget and the pinned models, then evict what no longer fits
+        """
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if max_models is not None:
+                self.max_models = max_models
+            if pinned is not None:
+                self._pinned = set(pinned)
+            self.trim()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        """
+        Get a model and mark it as most recently used
+        :return: model or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.last_access = datetime.now()
+            self._entries.move_to_end(key)
+            return entry.model
+
+    def peek(self, key):
+        """
+        Get a cached model without counting a lookup or changing the LRU order
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.model if entry is not None else None
+
+    def get_or_load(self, key, loader, model_id=None):
+        """
+        Get a model, loading it once if it is not cached
+        Only one thread runs the loader for a key, the others wait on its future.
+        :param key: cache key
+        :param loader: callable returning (model, size) or None when the model does not exist
+        :param model_id: FileManager id the model is loaded for, used in the metrics
+        :return: model or None
+        """
+        with self._lock:
+            if model_id is not None:
+                self._model_ids.setdefault(key, set()).add(model_id)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                MODEL_CACHE_LOOKUPS.inc(result='hit')
+                entry.last_access = datetime.now()
+                self._entries.move_to_end(key)
+                return entry.model
+
+            MODEL_CACHE_LOOKUPS.inc(result='miss')
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self._loading[key] = future
+            else:
+                self.coalesced_loads += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            started = time.perf_counter()
+            loaded = loader()
+            if loaded is None:
+                with self._lock:
+                    self._model_ids.pop(key, None)
+                future.set_result(None)
+                return None
+
+            model, size = loaded
+            self.put(key, model, size, time.perf_counter() - started, model_id)
+            future.set_result(model)
+            return model
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def put(self, key, model, size, load_time=0.0, model_id=None):
+        """
+        Store a loaded model and evict least recently used models over the budget
+        :param key: cache key
+        :param model: loaded model
+        :param size: estimated memory of the model in bytes
+        :param load_time: seconds spent loading the model
+        :param model_id: FileManager id the model was loaded for
+        """
+        with self._lock:
+            self._entries[key] = _CacheEntry(model, size)
+            self._entries.move_to_end(key)
+            self.loads += 1
+            self.load_time_total += load_time
+            self.last_load_time = load_time
+            MODEL_LOAD_SECONDS.observe(load_time, model_id='' if model_id is None else model_id)
+            self.trim()
+
+    def pin(self, model_id):
+        with self._lock:
+            self._pinned.add(model_id)
+
+    def unpin(self, model_id):
+        with self._lock:
+            self._pinned.discard(model_id)
+            self.trim()
+
+    def _is_pinned(self, key):
+        model_id = key[0] if isinstance(key, tuple) else key
+        return model_id in self._pinned or bool(self._model_ids.get(key, set()) & self._pinned) \
+            or any(self._active.get(_id) == key for _id in self._pinned)
+
+    def resolve(self, model_id, key):
+        """
+        Pick the key that should serve a request for a version
+        While that version is warming up in the background the active version keeps serving.
+        """
+        with self._lock:
+            active = self._active.get(model_id)
+            if active is not None and active != key and key in self._pending and active in self._entries:
+                return active
+            return key
+
+    def begin_swap(self, key):
+        """
+        Mark a version as loading in the background, requests keep using the active version
+        """
+        with self._lock:
+            self._pending.add(key)
+
+    def cancel_swap(self, key):
+        with self._lock:
+            self._pending.discard(key)
+
+    def activate(self, model_id, key):
+        """
+        Make a version the one served for its model id and retire the previous version
+        """
+        with self._lock:
+            self._pending.discard(key)
+            self._retired.discard(key)
+            previous = self._active.get(model_id)
+            self._active[model_id] = key
+            self._model_ids.setdefault(key, set()).add(model_id)
+            # weights shared with another model id stay cached while it serves them
+            if previous is not None and previous != key and previous not in self._active.values():
+                self._retired.add(previous)
+                self._release_retired(previous)
+                print(f"Switched model {model_id} to version {key[1] if isinstance(key, tuple) else key}")
+
+    def active_key(self, model_id):
+        with self._lock:
+            return self._active.get(model_id)
+
+    def acquire(self, key):
+        """
+        Lease a version for an in-flight request
+        """
+        with self._lock:
+            self._refs[key] += 1
+
+    def release(self, key):
+        """
+        Return a lease, a retired version is evicted when its last lease is returned
+        """
+        with self._lock:
+            self._refs[key] -= 1
+            if self._refs[key] <= 0:
+                del self._refs[key]
+            self._release_retired(key)
+
+    def _release_retired(self, key):
+        if key in self._retired and not self._refs.get(key):
+            self._retired.discard(key)
+            self.evict(key)
+
+    def evict_model(self, model_id):
+        """
+        Remove every version of a model id, e.g. when its FileManager entry is deleted
+        Versions another model id serves are kept.
+        """
+        with self._lock:
+            active = self._active.pop(model_id, None)
+            for model_ids in self._model_ids.values():
+                model_ids.discard(model_id)
+            shared = set(self._active.values())
+            for key in [key for key in self._entries
+                        if (key == active or isinstance(key, tuple) and key[0] == model_id) and key not in shared]:
+                if self._refs.get(key):
+                    self._retired.add(key)
+                else:
+                    self.evict(key)
+
+    def evict(self, key):
+        """
+        Remove a model from the cache
+        :return: True if the model was cached
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._model_ids.pop(key, None)
+            self.evictions += 1
+            MODEL_CACHE_EVICTIONS.inc()
+            print(f"Removed model from cache: {key}")
+            return True
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self.evict(key)
+
+    def evict_idle(self, max_age_minutes):
+        """
+        Evict unpinned models that have not been used for max_age_minutes
+        :return: number of evicted models
+        """
+        cutoff = datetime.now() - timedelta(minutes=max_age_minutes)
+        with self._lock:
+            idle = [key for key, entry in self._entries.items()
+                    if entry.last_access < cutoff and not self._is_pinned(key) and not self._refs.get(key)]
+            for key in idle:
+                self.evict(key)
+            return len(idle)
+
+    def sizes(self):
+        """
+        Estimated memory per cached version, keyed by (FileManager id, version)
+        Weights shared by several ids are reported under each of them.
+        """
+        with self._lock:
+            sizes = {}
+            for key, entry in self._entries.items():
+                version = key[1] if isinstance(key, tuple) else ''
+                model_ids = self._model_ids.get(key) or {'' if isinstance(key, tuple) else key}
+                for model_id in sorted(model_ids, key=str):
+                    sizes[(model_id, version)] = entry.size
+            return sizes
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def _over_budget(self):
+        if self.max_models and len(self._entries) > self.max_models:
+            return True
+        return bool(self.max_bytes) and self.total_bytes > self.max_bytes
+
+    def trim(self):
+        """
+        Evict least recently used unpinned models until the cache fits its budget
+        The most recently used model is kept even if it alone exceeds the budget.
+        :return: number of evicted models
+        """
+        evicted = 0
+        with self._lock:
+            while self._over_budget():
+                candidates = [key for key in list(self._entries)[:-1]
+                              if not self._is_pinned(key) and not self._refs.get(key)]
+                if not candidates:
+                    break
+                self.evict(candidates[0])
+                evicted += 1
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'models': len(self._entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_models': self.max_models,
+                'pinned': sorted(str(key) for key in self._pinned),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced_loads': self.coalesced_loads,
+                'loading': sorted(str(key) for key in self._loading),
+                'swapping': sorted(str(key) for key in self._pending),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'loads': self.loads,
+                'load_time_total': self.load_time_total,
+                'last_load_time': self.last_load_time,
+                'entries': [{
+                    'key': str(key),
+                    'model_ids': sorted(self._model_ids.get(key, set()), key=str),
+                    'size': entry.size,
+                    'pinned': self._is_pinned(key),
+                    'active': key in self._active.values(),
+                    'in_flight': self._refs.get(key, 0),
+                    'loaded_at': entry.loaded_at.isoformat(),
+                    'last_access': entry.last_access.isoformat(),
+                } for key, entry in self._entries.items()],
+            }
+
+
+model_cache = ModelCache()
+MODEL_CACHE_MODELS.set_function(lambda: len(model_cache))
+MODEL_CACHE_BYTES.set_function(model_cache.sizes)
+
 
 def check_gpu():
     """Check GPU availability and return device"""
@@ -18,52 +391,106 @@ def check_gpu():
     return device
 
 
-def clean_model_cache(max_age_minutes=45):
-    current_time = datetime.now()
-    print(f"Running clean_model_cache at {current_time}")
+def get_model_folder(file_type):
+    """
+    Folder of the model files of a FileManager file_type
+    """
+    if file_type == 'cls':
+        return "models/cls"
+    elif file_type == 'detect':
+        return "models/detect"
+    return "models"
 
-    # check clean_model_time to avoid cleaning cache too frequently
-    global clean_model_time
-    if current_time - clean_model_time < timedelta(minutes=5): # 5 minutes
-        print("Skipping cache cleanup as it was recently cleaned.")
-        print(f"Time since last cleanup: {current_time - clean_model_time}")
-        return
 
-    clean_model_time = current_time # Update clean_model_time
+def estimate_model_size(model, model_path=None):
+    """
+    Estimate the memory used by a loaded model from its parameters and buffers
+    Falls back to the size of the model file when the model has no torch module.
+    """
+    module = getattr(model, 'model', None)
+    if isinstance(module, torch.nn.Module):
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if model_path and os.path.exists(model_path):
+        return os.path.getsize(model_path)
+    return 0
 
-    to_delete = []
-    for model_name, access_time in model_access_time.items():
-        if current_time - access_time > timedelta(minutes=max_age_minutes):
-            to_delete.append(model_name)
 
-    for model_name in to_delete:
-        del model_cache[model_name]
-        del model_access_time[model_name]
-        print(f"Removed model from cache: {model_name}")
+def clean_model_cache(max_age_minutes=None):
+    """
+    Scheduled cache maintenance
+    Evicts models over the cache budget and, if max_age_minutes is given, unpinned models idle that long.
+    """
+    print(f"Running clean_model_cache at {datetime.now()}")
+    removed = model_cache.trim()
+    if max_age_minutes:
+        removed += model_cache.evict_idle(max_age_minutes)
+    print(f"Cleaning up model cache: {removed} models removed.")
 
-    print(f"Cleaning up model cache: {len(to_delete)} models removed.")
+def _model_loader(model_path):
+    def load():
+        if not os.path.exists(model_path):
+            return None
 
-# noinspection PyTypeChecker
-def get_model(model_name, model_folder,model_id):
-    # Check if model is in cache and update last accessed time
-    if model_id in model_cache:
-        model_access_time[model_id] = datetime.now()
-        return model_cache[model_id]
+        # Check GPU availability
+        device = check_gpu()
+        model = YOLO(model_path)
 
-    # Load the model and store it in the cache
-    model_path = os.path.join(model_folder, model_name)
-    if not os.path.exists(model_path):
-        return None
+        if device == 'cuda':
+            if model_path.endswith('.pt'):
+                model.to('cuda')
+            else:
+                # Exported models (onnx, openvino, int8) are not torch modules, their runtime
+                # picks the device from the predict arguments, which default to the overrides
+                model.overrides['device'] = device
 
-    # Check GPU availability
-    device = check_gpu()
-    model = YOLO(model_path)
+        return model, estimate_model_size(model, model_path)
+    return load
 
-    if device == 'cuda':
-        model.to('cuda')
 
+def model_key(model_name, model_folder, model_id, content_hash=None):
+    """
+    Cache key of a model version: the content hash of the weights (the FileManager id when the
+    entry has none) and the file that is loaded for it (the original weights or the exported
+    artifact of its backend)
+    """
+    return content_hash or model_id, resolve_model_file(model_folder, model_name, model_id)
+
+
+def load_model_version(model_name, model_folder, model_id, content_hash=None):
+    """
+    Load exactly this version of a model without activating it, used for background swaps
+    :return: (key, model)
+    """
+    key = model_key(model_name, model_folder, model_id, content_hash)
+    return key, model_cache.get_or_load(key, _model_loader(os.path.join(model_folder, key[1])), model_id)
 
-    model_cache[model_id] = model # Store model in cache
-    model_access_time[model_id] = datetime.now()  # Set access time
-    return model
 
+def acquire_model(model_name, model_folder, model_id, content_hash=None):
+    """
+    Get the model serving a FileManager entry and lease it, return the lease with release_model(key)
+    :return: (key, model), model is None if the file does not exist
+    """
+    requested = model_key(model_name, model_folder, model_id, content_hash)
+    key = model_cache.resolve(model_id, requested)
+    # Cached models are returned directly, a cold model is loaded by a single thread
+    model = model_cache.get_or_load(key, _model_loader(os.path.join(model_folder, key[1])), model_id)
+    if model is None:
+        return key, None
+
+    if key == requested:
+        model_cache.activate(model_id, key)
+    model_cache.acquire(key)
+    return key, model
+
+
+def release_model(key):
+    if key is not None:
+        model_cache.release(key)
+
+
+# noinspection PyTypeChecker
+def get_model(model_name, model_folder,model_id, content_hash=None):
+    key, model = acquire_model(model_name, model_folder, model_id, content_hash)
+    release_model(key if model is not None else None)
+    return model
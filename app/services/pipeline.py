@@ -0,0 +1,176 @@
+# app/services/pipeline.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_QUEUE_DEPTH = registry.gauge(
+    'pipeline_queue_depth', 'Jobs waiting in the queue of each pipeline stage', ['stage'])
+PIPELINE_QUEUE_WAIT_SECONDS = registry.histogram(
+    'pipeline_queue_wait_seconds', 'Time jobs wait in a pipeline stage queue', ['stage'])
+PIPELINE_STAGE_SECONDS = registry.histogram(
+    'pipeline_stage_seconds', 'Time a pipeline stage worker spends on a job', ['stage'])
+
+
+class PipelineJob:
+    """
+    One request moving through the pipeline
+    Stages keep their intermediate values in `state`, the caller waits on `future`.
+    """
+    __slots__ = ('app', 'state', 'future', 'enqueued_at')
+
+    def __init__(self, app, state):
+        self.app = app
+        self.state = state
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+    def finish(self, result):
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class PipelineStage:
+    """
+    Bounded queue served by a fixed number of worker threads
+    put() blocks while the queue is full, so a slow stage pushes back on the stages before it.
+    """
+
+    def __init__(self, pipeline, name, handler, workers=1, maxsize=64):
+        self.pipeline = pipeline
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.maxsize = max(1, int(maxsize))
+        self._queue = queue.Queue(self.maxsize)
+        self._threads = []
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, job):
+        job.enqueued_at = time.perf_counter()
+        self._queue.put(job)
+
+    def put_nowait(self, job):
+        """
+        :raises queue.Full: when the queue is full
+        """
+        job.enqueued_at = time.perf_counter()
+        self._queue.put_nowait(job)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            started = time.perf_counter()
+            PIPELINE_QUEUE_WAIT_SECONDS.observe(started - job.enqueued_at, stage=self.name)
+            try:
+                with job.app.app_context():
+                    next_stage = self.handler(job)
+                if next_stage:
+                    self.pipeline.forward(job, next_stage)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Pipeline stage {self.name} failed: {str(e)}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - started, stage=self.name)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queue_depth': self.depth(),
+            'max_queue': self.maxsize,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
+
+
+class Pipeline:
+    """
+    Chain of stages with bounded queues between them
+    A handler receives the job and returns the name of the next stage, or None when it finished
+    the job (job.finish) or handed it on itself, e.g. from a callback with hand_off().
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._stages = {}
+        self._first = None
+        self._lock = threading.Lock()
+        # waits for room in a full stage queue on behalf of threads that must not block
+        self._handoff = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pipeline-handoff')
+        self.handed_off = 0
+
+    def configure(self, stages):
+        """
+        Create and start the stages, only the first call has an effect
+        :param stages: list of (name, handler, workers, max queue size) in pipeline order
+        """
+        with self._lock:
+            if self.enabled or not stages:
+                return
+            for name, handler, workers, maxsize in stages:
+                stage = PipelineStage(self, name, handler, workers, maxsize)
+                self._stages[name] = stage
+                stage.start()
+            self._first = stages[0][0]
+            self.enabled = True
+            logger.info(f"Pipeline started with stages {', '.join(self._stages)}")
+
+    def submit(self, app, **state):
+        """
+        Queue a job in the first stage
+        :param app: Flask app, stages run in its app context
+        :return: Future resolved with the value the last stage passes to job.finish
+        """
+        job = PipelineJob(app, state)
+        self._stages[self._first].put(job)
+        return job.future
+
+    def forward(self, job, stage):
+        self._stages[stage].put(job)
+
+    def hand_off(self, job, stage):
+        """
+        Forward a job without blocking the calling thread, e.g. from a model batcher callback
+        When the stage queue is full the job waits for room on a handoff thread instead.
+        """
+        try:
+            self._stages[stage].put_nowait(job)
+        except queue.Full:
+            self.handed_off += 1
+            self._handoff.submit(self._forward_or_fail, job, stage)
+
+    def _forward_or_fail(self, job, stage):
+        try:
+            self.forward(job, stage)
+        except Exception as e:
+            logger.error(f"Pipeline handoff to stage {stage} failed: {str(e)}")
+            if not job.future.done():
+                job.future.set_exception(e)
+
+    def depths(self):
+        return {(name,): stage.depth() for name, stage in self._stages.items()}
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'handed_off': self.handed_off,
+            'stages': {name: stage.stats() for name, stage in self._stages.items()},
+        }
@@ -0,0 +1,112 @@
+# app/services/predict_params.py
+import json
+
+
+def _probability(value):
+    value = float(value)
+    if not 0 <= value <= 1:
+        raise ValueError('must be between 0 and 1')
+    return value
+
+
+def _positive_int(value):
+    value = int(value)
+    if value < 1:
+        raise ValueError('must be at least 1')
+    return value
+
+
+def _imgsz(value):
+    value = int(value)
+    if not 32 <= value <= 4096:
+        raise ValueError('must be between 32 and 4096')
+    return value
+
+
+def _classes(value):
+    if isinstance(value, str):
+        value = [item for item in value.split(',') if item.strip()]
+    if isinstance(value, (int, float)):
+        value = [value]
+    classes = sorted({int(item) for item in value})
+    if any(cls < 0 for cls in classes):
+        raise ValueError('must be non-negative class ids')
+    return classes
+
+
+class PredictParams:
+    """
+    Predict parameters of a request, merged over the per-model defaults stored on the FileManager entry
+    conf, iou, classes, max_det and imgsz go straight into model.predict so filtered boxes are never
+    produced, top_k adds the k best classes to classification results.
+    """
+    FIELDS = {
+        'conf': _probability,
+        'iou': _probability,
+        'classes': _classes,
+        'max_det': _positive_int,
+        'imgsz': _imgsz,
+        'top_k': _positive_int,
+    }
+    # model.predict arguments per model type, the others do not change the result of that type
+    PREDICT_ARGS = {
+        'detect': ('conf', 'iou', 'classes', 'max_det', 'imgsz'),
+        'cls': ('imgsz',),
+    }
+
+    @staticmethod
+    def parse(source):
+        """
+        Validate predict parameters
+        :param source: mapping of parameter name to value (form, query args, JSON) or a JSON string
+        :return: dict with the known parameters that are set
+        :raises ValueError: on invalid values
+        """
+        if not source:
+            return {}
+        if isinstance(source, str):
+            source = json.loads(source)
+            if not isinstance(source, dict):
+                raise ValueError('predict params must be a JSON object')
+
+        params = {}
+        for name, convert in PredictParams.FIELDS.items():
+            value = source.get(name)
+            if value is None or value == '':
+                continue
+            try:
+                params[name] = convert(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Invalid {name}: {str(e)}")
+        return params
+
+    @staticmethod
+    def load(stored):
+        """
+        Per-model defaults from the FileManager column, invalid stored values are ignored
+        """
+        try:
+            return PredictParams.parse(stored)
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def resolve(defaults, overrides, file_type):
+        """
+        Effective parameters of a request: request values win over the model defaults, and only the
+        fields that change the result of this model type are kept, so the result is usable as part
+        of the result cache and batching keys
+        """
+        params = {**(defaults or {}), **(overrides or {})}
+        effective = PredictParams.predict_kwargs(params, file_type)
+        if file_type == 'cls' and 'top_k' in params:
+            effective['top_k'] = params['top_k']
+        return effective
+
+    @staticmethod
+    def predict_kwargs(params, file_type):
+        """
+        Keyword arguments for model.predict
+        """
+        names = PredictParams.PREDICT_ARGS.get(file_type, PredictParams.PREDICT_ARGS['detect'])
+        return {name: params[name] for name in names if name in (params or {})}
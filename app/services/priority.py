@@ -0,0 +1,98 @@
+# app/services/priority.py
+import queue
+import threading
+import time
+from collections import deque
+
+from app.services.metrics import registry
+
+PRIORITY_CLASSES = ('high', 'normal', 'low')
+
+PRIORITY_WAIT_SECONDS = registry.histogram(
+    'priority_wait_seconds', 'Time predict work waits for inference, per priority class', ['priority'])
+PRIORITY_QUEUED = registry.gauge(
+    'priority_queued', 'Predict work waiting for inference, per priority class', ['priority'])
+
+
+class Priority:
+    """
+    Priority class of a predict request
+    The class assigned to the API key (X-API-Key) wins. Otherwise the `priority` field (form or
+    query string), then the X-Priority header, can only lower the priority below the endpoint
+    default, so clients cannot promote themselves; PRIORITY_ALLOW_CLIENT_OVERRIDE lets them raise it too.
+    """
+
+    @staticmethod
+    def resolve(field, header, api_key, config, default=None):
+        """
+        :param config: app config with PRIORITY_API_KEYS ({"key": "low"}), PRIORITY_DEFAULT and
+                       PRIORITY_ALLOW_CLIENT_OVERRIDE
+        :param default: default of the endpoint, PRIORITY_DEFAULT when None
+        :return: one of PRIORITY_CLASSES
+        :raises ValueError: on an unknown class
+        """
+        keyed = config.get('PRIORITY_API_KEYS', {}).get(api_key) if api_key else None
+        default = (default or config.get('PRIORITY_DEFAULT', 'normal')).lower()
+        value = (keyed or field or header or default).lower()
+        for name in (value, default):
+            if name not in PRIORITY_CLASSES:
+                raise ValueError(f"Invalid priority '{name}', expected one of {', '.join(PRIORITY_CLASSES)}")
+
+        if not keyed and not config.get('PRIORITY_ALLOW_CLIENT_OVERRIDE', False):
+            # PRIORITY_CLASSES is ordered from high to low
+            value = PRIORITY_CLASSES[max(PRIORITY_CLASSES.index(value), PRIORITY_CLASSES.index(default))]
+        return value
+
+
+class PriorityQueue:
+    """
+    Queue serving the highest priority class first
+    Starvation protection: an item that waited longer than starvation_ms is served before the
+    higher classes, oldest first, so bulk work keeps moving under sustained interactive load.
+    Items need `priority` and `enqueued_at` (time.perf_counter) attributes.
+    Drop-in for the queue.Queue methods the batcher uses (put, get, qsize).
+    """
+
+    def __init__(self, starvation_ms=500.0):
+        self.starvation = max(0.0, float(starvation_ms)) / 1000.0
+        self._queues = {priority: deque() for priority in PRIORITY_CLASSES}
+        self._condition = threading.Condition()
+        self.promoted = 0
+
+    def put(self, item):
+        if item.priority not in self._queues:
+            item.priority = 'normal'
+        with self._condition:
+            self._queues[item.priority].append(item)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        :raises queue.Empty: when nothing arrived before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self.qsize():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._condition.wait(remaining)
+            item = self._pick()
+        PRIORITY_WAIT_SECONDS.observe(time.perf_counter() - item.enqueued_at, priority=item.priority)
+        return item
+
+    def _pick(self):
+        heads = [(priority, self._queues[priority][0]) for priority in PRIORITY_CLASSES if self._queues[priority]]
+        starved_before = time.perf_counter() - self.starvation
+        starved = [(item.enqueued_at, priority) for priority, item in heads[1:] if item.enqueued_at <= starved_before]
+        if starved:
+            self.promoted += 1
+            return self._queues[min(starved)[1]].popleft()
+        return self._queues[heads[0][0]].popleft()
+
+    def qsize(self):
+        return sum(len(items) for items in self._queues.values())
+
+    def depths(self):
+        with self._condition:
+            return {priority: len(items) for priority, items in self._queues.items()}
@@ -0,0 +1,281 @@
+# app/services/quantization.py
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import numpy as np
+from flask import current_app
+from PIL import Image, ImageOps
+from ultralytics import YOLO
+
+from app.services.backends import artifact_name, export_model
+from app.services.model_loader import get_model_folder
+
+
+class QuantizationService:
+    """
+    Produce an INT8 variant of a classification model and validate it against the FP32 model
+    The variant is the ONNX export quantized with ONNX Runtime static quantization, activation
+    ranges are calibrated on part of the uploaded images and the agreement is measured on the
+    held-out rest. It is only stored under its served name (<stem>.int8.onnx) when it passes
+    validation. Jobs run in the background, one per model, finished ones are kept for QUANTIZE_JOB_TTL.
+    """
+    jobs = {} # model id -> {'status': running, done or failed, 'started_at', 'finished_at', 'error'}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def report_path(model_folder, model_name):
+        return os.path.join(model_folder, f"{os.path.splitext(model_name)[0]}.int8.json")
+
+    @staticmethod
+    def check(file_manager, images):
+        """
+        Validate a quantize request
+        :return: error response data and status code, or None
+        """
+        if file_manager.file_type != 'cls':
+            return {
+                'status': 'error',
+                'message': 'Quantization is only supported for cls models'
+            }, HTTPStatus.BAD_REQUEST
+
+        if len(images) < 2:
+            return {
+                'status': 'error',
+                'message': 'At least 2 images are needed, for calibration and for validation'
+            }, HTTPStatus.BAD_REQUEST
+
+        if not os.path.exists(os.path.join(get_model_folder(file_manager.file_type), file_manager.filename)):
+            return {
+                'status': 'error',
+                'message': 'Model not found'
+            }, HTTPStatus.NOT_FOUND
+        return None
+
+    @staticmethod
+    def start(app, file_manager, images, min_agreement=0.98):
+        """
+        Quantize a cls model in the background, poll get_report / job for the result
+        :return: response data and status code
+        """
+        error = QuantizationService.check(file_manager, images)
+        if error:
+            return error
+
+        model_id = file_manager.id
+        with QuantizationService._lock:
+            QuantizationService._prune()
+            if QuantizationService.jobs.get(model_id, {}).get('status') == 'running':
+                return {
+                    'status': 'error',
+                    'message': 'Quantization of this model is already running'
+                }, HTTPStatus.CONFLICT
+            QuantizationService.jobs[model_id] = {
+                'status': 'running',
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'error': None,
+            }
+
+        def run():
+            with app.app_context():
+                job = QuantizationService.jobs[model_id]
+                try:
+                    result, status_code = QuantizationService.quantize(file_manager, images, min_agreement)
+                    job['status'] = 'done' if status_code == HTTPStatus.OK else 'failed'
+                    job['error'] = None if status_code == HTTPStatus.OK else result['message']
+                except Exception as e:
+                    job.update({'status': 'failed', 'error': str(e)})
+                    app.logger.error(f"Error quantizing model {model_id}: {str(e)}")
+                finally:
+                    job['finished_at'] = datetime.now().isoformat()
+
+        threading.Thread(target=run, name=f"model-quantize-{model_id}", daemon=True).start()
+        return {
+            'status': 'success',
+            'data': QuantizationService.jobs[model_id],
+            'message': 'Quantization started'
+        }, HTTPStatus.ACCEPTED
+
+    @staticmethod
+    def job(model_id):
+        """
+        State of the quantize job of a model, None when none ran in this process or it expired
+        """
+        with QuantizationService._lock:
+            QuantizationService._prune()
+            return QuantizationService.jobs.get(model_id)
+
+    @staticmethod
+    def _prune():
+        """
+        Forget jobs finished more than QUANTIZE_JOB_TTL seconds ago, called with _lock held
+        """
+        cutoff = (datetime.now() - timedelta(seconds=current_app.config.get('QUANTIZE_JOB_TTL', 3600))).isoformat()
+        for model_id, job in list(QuantizationService.jobs.items()):
+            if job['status'] != 'running' and job['finished_at'] and job['finished_at'] < cutoff:
+                del QuantizationService.jobs[model_id]
+
+    @staticmethod
+    def split(images, validation_fraction=0.2):
+        """
+        Split the uploaded images into a calibration set and a held-out validation set
+        Every n-th image is held out, so both sets cover the whole upload.
+        :return: (calibration images, validation images), both non-empty for 2 images or more
+        """
+        count = min(len(images) - 1, max(1, round(len(images) * validation_fraction)))
+        step = len(images) / count
+        held_out = {int(i * step) for i in range(count)}
+        return ([image for index, image in enumerate(images) if index not in held_out],
+                [images[index] for index in sorted(held_out)])
+
+    @staticmethod
+    def quantize(file_manager, images, min_agreement=0.98):
+        """
+        Quantize a cls model, calibrated and validated on disjoint parts of the images
+        Validating on the calibration images would overstate the agreement.
+        :param file_manager: FileManager entry
+        :param images: uploaded images, split by QUANTIZE_VALIDATION_FRACTION
+        :param min_agreement: minimum top-1 agreement with the FP32 model to serve the INT8 variant
+        :return: response data and status code
+        """
+        error = QuantizationService.check(file_manager, images)
+        if error:
+            return error
+
+        model_folder = get_model_folder(file_manager.file_type)
+        model_path = os.path.join(model_folder, file_manager.filename)
+        onnx_path = os.path.join(model_folder, artifact_name(file_manager.filename, 'onnx'))
+        if not os.path.exists(onnx_path) and 'onnx' not in export_model(model_path, ['onnx']):
+            return {
+                'status': 'error',
+                'message': 'ONNX export failed'
+            }, HTTPStatus.INTERNAL_SERVER_ERROR
+
+        from onnxruntime.quantization import QuantType, quantize_static
+
+        calibration, validation = QuantizationService.split(
+            images, current_app.config.get('QUANTIZE_VALIDATION_FRACTION', 0.2))
+
+        int8_path = os.path.join(model_folder, artifact_name(file_manager.filename, 'int8'))
+        candidate_path = os.path.join(model_folder, f".{uuid.uuid4().hex}.int8.onnx")
+        try:
+            fp32_model = YOLO(model_path)
+            imgsz = fp32_model.overrides.get('imgsz') or 224
+            reader = QuantizationService.calibration_reader(onnx_path, calibration, imgsz)
+            quantize_static(onnx_path, candidate_path, reader, weight_type=QuantType.QInt8,
+                            activation_type=QuantType.QUInt8)
+
+            int8_model = YOLO(candidate_path, task='classify')
+            fp32_top1, fp32_ms = QuantizationService._top1(fp32_model, validation)
+            int8_top1, int8_ms = QuantizationService._top1(int8_model, validation)
+
+            agreement = float(np.mean([a == b for a, b in zip(fp32_top1, int8_top1)]))
+            report = {
+                'model_id': file_manager.id,
+                'filename': file_manager.filename,
+                'samples': len(validation),
+                'calibration_samples': len(calibration),
+                'top1_agreement': agreement,
+                'min_agreement': min_agreement,
+                'fp32_latency_ms': fp32_ms,
+                'int8_latency_ms': int8_ms,
+                'speedup': fp32_ms / int8_ms if int8_ms else 0.0,
+                'fp32_size': os.path.getsize(model_path),
+                'int8_size': os.path.getsize(candidate_path),
+                'passed': agreement >= min_agreement,
+            }
+
+            if report['passed']:
+                os.replace(candidate_path, int8_path)
+            elif os.path.exists(int8_path):
+                # a previous variant no longer matches this validation, stop serving it
+                os.remove(int8_path)
+
+            with open(QuantizationService.report_path(model_folder, file_manager.filename), 'w') as f:
+                json.dump(report, f, indent=2)
+        finally:
+            if os.path.exists(candidate_path):
+                os.remove(candidate_path)
+
+        current_app.logger.info(f"Quantized model {file_manager.id}: agreement={agreement:.4f} "
+                                f"speedup={report['speedup']:.2f}x passed={report['passed']}")
+
+        # Swap the served version to (or back from) the INT8 variant
+        from app.services.warmup import WarmupService
+        WarmupService.warm_async(current_app._get_current_object(), file_manager.id, swap=True)
+
+        return {
+            'status': 'success',
+            'data': report,
+            'message': 'INT8 variant is served' if report['passed'] else 'INT8 variant rejected'
+        }, HTTPStatus.OK
+
+    @staticmethod
+    def calibration_reader(onnx_path, images, imgsz):
+        """
+        CalibrationDataReader feeding the calibration images to quantize_static, preprocessed like
+        ultralytics classification inputs (RGB, resized and center cropped, scaled to 0..1, NCHW)
+        """
+        import onnxruntime
+        from onnxruntime.quantization import CalibrationDataReader
+
+        if isinstance(imgsz, (list, tuple)):
+            imgsz = imgsz[0]
+        session = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+        input_name = session.get_inputs()[0].name
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self._images = iter(images)
+
+            def get_next(self):
+                image = next(self._images, None)
+                if image is None:
+                    return None
+                return {input_name: QuantizationService.preprocess(image, int(imgsz))}
+
+            def rewind(self):
+                self._images = iter(images)
+
+        return Reader()
+
+    @staticmethod
+    def preprocess(image, imgsz):
+        """
+        :param image: PIL image (RGB) or numpy array (BGR), as returned by ImageIngest
+        :return: float32 array of shape (1, 3, imgsz, imgsz)
+        """
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(np.ascontiguousarray(image[:, :, ::-1]))
+        image = ImageOps.fit(image.convert('RGB'), (imgsz, imgsz))
+        array = np.asarray(image, dtype=np.float32) / 255.0
+        return np.ascontiguousarray(array.transpose(2, 0, 1)[np.newaxis])
+
+    @staticmethod
+    def get_report(file_manager):
+        path = QuantizationService.report_path(get_model_folder(file_manager.file_type), file_manager.filename)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _top1(model, images):
+        """
+        Predict the validation images one by one
+        :return: list of top-1 classes, mean latency in ms
+        """
+        model.predict(images[0], verbose=False) # warm-up
+        classes = []
+        latencies = []
+        for image in images:
+            started = time.perf_counter()
+            result = model.predict(image, verbose=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+            classes.append(int(result[0].probs.top1))
+        return classes, float(np.mean(latencies))
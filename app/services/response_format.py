@@ -0,0 +1,84 @@
+# app/services/response_format.py
+import msgpack
+from flask import Response, jsonify
+
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_MIMETYPE = 'application/vnd.predict.columnar+json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+class ResponseFormat:
+    """
+    Predict response formats negotiated from the Accept header
+    - application/json (default): one object per detection
+    - application/vnd.predict.columnar+json: detections as parallel arrays (boxes, confidence, class)
+    - application/msgpack: columnar payload packed with msgpack
+    The columnar formats are predicted with layout 'columnar', the arrays then come straight from
+    the result tensors (PredictService.process_detect_result) without building one object per box.
+    """
+
+    @staticmethod
+    def negotiate(accept):
+        """
+        :param accept: werkzeug MIMEAccept of the request
+        :return: mimetype of the response
+        """
+        offered = [JSON_MIMETYPE, COLUMNAR_MIMETYPE, *MSGPACK_MIMETYPES]
+        # a missing Accept header or */* matches the first offer, so plain JSON stays the default
+        return accept.best_match(offered, default=JSON_MIMETYPE)
+
+    @staticmethod
+    def layout(mimetype):
+        """
+        Layout detections are predicted in for a response mimetype: rows or columnar
+        """
+        return 'rows' if mimetype == JSON_MIMETYPE else 'columnar'
+
+    @staticmethod
+    def columnar(detections):
+        """
+        Detection rows as parallel arrays, class names are sent once per class
+        Only used for results predicted as rows, e.g. cached before the layout was requested.
+        """
+        classes = [detection['class'] for detection in detections]
+        return {
+            'boxes': [detection['box'] for detection in detections],
+            'confidence': [detection['confidence'] for detection in detections],
+            'class': classes,
+            'names': {str(cls): detection['name'] for cls, detection in zip(classes, detections)},
+        }
+
+    @staticmethod
+    def to_columnar(payload):
+        """
+        Convert the detections of a predict or batch predict response to the columnar layout
+        Classification results, error responses and results already in columns are returned unchanged.
+        """
+        if payload.get('type') != 'detect':
+            return payload
+        payload = dict(payload)
+        if isinstance(payload.get('result'), list):
+            payload['result'] = ResponseFormat.columnar(payload['result'])
+        if isinstance(payload.get('results'), list):
+            payload['results'] = [
+                {**entry, 'result': ResponseFormat.columnar(entry['result'])}
+                if isinstance(entry.get('result'), list) else entry
+                for entry in payload['results']
+            ]
+        return payload
+
+    @staticmethod
+    def render(payload, status_code, mimetype=JSON_MIMETYPE):
+        """
+        Build the response in the negotiated format
+        """
+        if mimetype == JSON_MIMETYPE:
+            return jsonify(payload), status_code
+
+        body = ResponseFormat.to_columnar(payload)
+        if mimetype in MSGPACK_MIMETYPES:
+            return Response(msgpack.packb(body), status=status_code, mimetype=mimetype)
+
+        response = jsonify(body)
+        response.mimetype = mimetype
+        return response, status_code
@@ -0,0 +1,142 @@
+# app/services/result_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.services.metrics import registry
+
+RESULT_CACHE_LOOKUPS = registry.counter(
+    'result_cache_lookups_total', 'Result cache lookups by result (hit, disk_hit, miss)', ['result'])
+RESULT_CACHE_ENTRIES = registry.gauge(
+    'result_cache_entries', 'Predict results held in the in-memory result cache')
+
+
+class ResultCache:
+    """
+    Cache of predict responses keyed by (model id, model version, image hash, predict params)
+    The in-memory tier is LRU with a TTL. The optional on-disk tier is a SQLite file that
+    survives restarts, disk hits are promoted to memory.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600, disk_path=None):
+        self.enabled = False
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self._disk_path = disk_path
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def configure(self, enabled, max_entries=None, ttl=None, disk_path=None):
+        with self._lock:
+            self.enabled = enabled
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttl is not None:
+                self.ttl = ttl
+            if disk_path and enabled:
+                os.makedirs(os.path.dirname(disk_path) or '.', exist_ok=True)
+                self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self._disk.execute('CREATE TABLE IF NOT EXISTS result_cache '
+                                   '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+                self._disk.commit()
+                self._disk_path = disk_path
+
+    @staticmethod
+    def make_key(model_id, version, digest, params=None):
+        """
+        Cache key of a prediction
+        :param model_id: FileManager id
+        :param version: file the model was loaded from, changes when the model is replaced
+        :param digest: SHA-256 of the image bytes
+        :param params: predict parameters that change the result
+        """
+        params_hash = hashlib.sha256(json.dumps(params or {}, sort_keys=True).encode()).hexdigest()[:16]
+        return f"{model_id}:{version}:{digest}:{params_hash}"
+
+    def get(self, key):
+        """
+        :return: cached response or None
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                if cached[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    RESULT_CACHE_LOOKUPS.inc(result='hit')
+                    return cached[0]
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute('SELECT value, expires_at FROM result_cache WHERE key = ?',
+                                         (key,)).fetchone()
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._store(key, value, row[1])
+                    self.disk_hits += 1
+                    RESULT_CACHE_LOOKUPS.inc(result='disk_hit')
+                    return value
+
+            self.misses += 1
+            RESULT_CACHE_LOOKUPS.inc(result='miss')
+            return None
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._disk is not None:
+                self._disk.execute('INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                                   (key, json.dumps(value), expires_at))
+                self._disk.commit()
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge_expired(self):
+        """
+        Drop expired entries from both tiers, run by the scheduler
+        """
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+            if self._disk is not None:
+                self._disk.execute('DELETE FROM result_cache WHERE expires_at <= ?', (now,))
+                self._disk.commit()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'disk_path': self._disk_path if self._disk is not None else None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache()
+RESULT_CACHE_ENTRIES.set_function(lambda: len(result_cache))
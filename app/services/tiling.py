@@ -0,0 +1,97 @@
+# app/services/tiling.py
+import numpy as np
+import torch
+import torchvision
+from ultralytics.engine.results import Results
+
+
+class TiledDetection:
+    """
+    Sliced inference for detect models on images much larger than the model input
+    The image is split into overlapping tiles, the tiles are predicted in batches, the boxes are
+    moved back to image coordinates and duplicates from the overlaps are removed with a class-aware NMS.
+    """
+
+    @staticmethod
+    def tiles(width, height, tile_size, overlap):
+        """
+        Tile windows covering the image, the last row / column is shifted back so every tile is full size
+        :param overlap: fraction of the tile size shared with the neighbour tile, 0 <= overlap < 1
+        :return: list of (x0, y0, x1, y1)
+        """
+        step = max(1, int(tile_size * (1 - overlap)))
+
+        def starts(length):
+            if length <= tile_size:
+                return [0]
+            positions = list(range(0, length - tile_size, step))
+            positions.append(length - tile_size)
+            return positions
+
+        return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+                for y in starts(height) for x in starts(width)]
+
+    @staticmethod
+    def count(width, height, tile_size, overlap):
+        """
+        Number of tiles TiledDetection.tiles returns, without building them
+        """
+        step = max(1, int(tile_size * (1 - overlap)))
+
+        def starts(length):
+            return 1 if length <= tile_size else len(range(0, length - tile_size, step)) + 1
+
+        return starts(width) * starts(height)
+
+    @staticmethod
+    def image_size(image):
+        """
+        :return: (width, height) of a PIL image or an array
+        """
+        if isinstance(image, np.ndarray):
+            return image.shape[1], image.shape[0]
+        return image.size
+
+    @staticmethod
+    def to_array(image):
+        """
+        Image as a BGR uint8 array, the format ultralytics uses for numpy inputs
+        """
+        if isinstance(image, np.ndarray):
+            return image
+        return np.ascontiguousarray(np.asarray(image.convert('RGB'))[:, :, ::-1])
+
+    @staticmethod
+    def predict(image, tile_size, overlap, iou, predict_tiles, max_det=None):
+        """
+        Run tiled detection
+        :param image: PIL image or BGR array
+        :param predict_tiles: callable taking a list of tile arrays and returning one Results per tile
+        :param max_det: maximum detections kept for the whole image after the merge
+        :return: single element list of merged ultralytics Results
+        """
+        array = TiledDetection.to_array(image)
+        height, width = array.shape[:2]
+        windows = TiledDetection.tiles(width, height, tile_size, overlap)
+        crops = [np.ascontiguousarray(array[y0:y1, x0:x1]) for x0, y0, x1, y1 in windows]
+
+        results = predict_tiles(crops)
+        names = results[0].names if results else {}
+
+        merged = []
+        for (x0, y0, _, _), result in zip(windows, results):
+            data = result.boxes.data
+            if len(data):
+                data = data.clone()
+                data[:, [0, 2]] += x0
+                data[:, [1, 3]] += y0
+                merged.append(data)
+
+        if merged:
+            data = torch.cat(merged)
+            keep = torchvision.ops.batched_nms(data[:, :4].float(), data[:, 4].float(), data[:, 5].long(), iou)
+            data = data[keep[:max_det] if max_det else keep]
+        else:
+            data = torch.zeros((0, 6))
+
+        return [Results(orig_img=array, path='', names=names, boxes=data)]
@@ -0,0 +1,382 @@
+# app/services/upload_session.py
+import hashlib
+import math
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.upload_session import UploadChunk, UploadSession
+
+# part files live next to the final models so finalizing is a same-directory rename
+UPLOAD_PREFIX = '.upload_'
+_WRITE_BLOCK = 1024 * 1024
+
+
+class UploadInProgress(Exception):
+    """
+    Another upload is using the implicit session of a legacy chunk upload
+    """
+
+
+class UploadSessionService:
+    """
+    Chunked uploads written in place
+    The target file is preallocated once and every chunk is written at its offset with pwrite,
+    so chunks can arrive in any order and in parallel. Finalizing is an fsync and an atomic rename.
+    """
+
+    @staticmethod
+    def part_path(session):
+        return os.path.join('models', session.file_type, f"{UPLOAD_PREFIX}{session.id}.part")
+
+    @staticmethod
+    def create(data):
+        """
+        Create an upload session and preallocate its part file
+        :param data: filename, file_type, total_size, chunk_size (optional) and the FileManager fields
+                     (name, description, id, image_name, predict_params) applied on completion
+        :return: UploadSession
+        :raises ValueError: on invalid sizes or file type
+        """
+        file_type = data.get('file_type') or 'cls'
+        if secure_filename(file_type) != file_type:
+            raise ValueError("Invalid file type")
+        total_size = int(data.get('total_size') or 0)
+        if total_size <= 0:
+            raise ValueError("total_size must be greater than 0")
+        max_size = current_app.config.get('UPLOAD_MAX_SIZE', 0)
+        if max_size and total_size > max_size:
+            raise ValueError(f"total_size must be at most {max_size} bytes")
+        chunk_size = int(data.get('chunk_size') or current_app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+        # a chunk is sent as one request body
+        max_chunk_size = current_app.config.get('MAX_CONTENT_LENGTH')
+        if chunk_size <= 0 or (max_chunk_size and chunk_size > max_chunk_size):
+            raise ValueError(f"chunk_size must be greater than 0 and at most {max_chunk_size} bytes")
+        sha256 = UploadSessionService._checksum(data.get('sha256'))
+
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            filename=data.get('filename') or 'uploaded_file',
+            file_type=file_type,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            total_chunks=math.ceil(total_size / chunk_size),
+            status='open',
+            sha256=sha256,
+            expires_at=UploadSessionService._expires_at(),
+            name=data.get('name'),
+            description=data.get('description'),
+            file_manager_id=int(data.get('id') or 0) or None,
+            image_name=data.get('image_name'),
+            predict_params=data.get('predict_params')
+        )
+
+        path = UploadSessionService.part_path(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            UploadSessionService._preallocate(path, total_size)
+            db.session.add(session)
+            db.session.commit()
+        except Exception:
+            # no part file without its session row, nothing would ever remove it
+            db.session.rollback()
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return session
+
+    @staticmethod
+    def _preallocate(path, size):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def legacy_session(data, chunk_size):
+        """
+        Implicit session of a client that sends chunk_number / total_chunks without an upload_id
+        Such clients send the chunks in order, so the chunk size is known from chunk 0 and the
+        file grows as chunks are written. Chunk 0 starts the upload over once the previous upload
+        of the same file has been idle for UPLOAD_LEGACY_IDLE_SECONDS; the chunks of two
+        concurrent uploads of one file cannot be told apart, so the second one is rejected.
+        :return: UploadSession or None when the upload was not started with chunk 0
+        :raises UploadInProgress: when another upload of the same file is still running
+        """
+        file_type = data['file_type']
+        if secure_filename(file_type) != file_type:
+            raise ValueError("Invalid file type")
+        session_id = hashlib.sha1(f"{file_type}/{data['filename']}".encode()).hexdigest()[:32]
+        session = db.session.get(UploadSession, session_id)
+
+        if data['chunk_number'] != 0:
+            return session if session and session.status == 'open' else None
+
+        total_chunks = data['total_chunks']
+        if total_chunks < 1:
+            raise ValueError("total_chunks must be greater than 0")
+        max_size = current_app.config.get('UPLOAD_MAX_SIZE', 0)
+        if max_size and total_chunks * chunk_size > max_size:
+            raise ValueError(f"The file must be at most {max_size} bytes")
+
+        if session:
+            if session.status != 'complete' and session.expires_at:
+                idle = current_app.config.get('UPLOAD_LEGACY_IDLE_SECONDS', 30)
+                last_chunk_at = session.expires_at - timedelta(
+                    hours=current_app.config.get('UPLOAD_SESSION_TTL_HOURS', 24))
+                if datetime.now() - last_chunk_at < timedelta(seconds=idle):
+                    raise UploadInProgress(f"Another upload of {data['filename']} is in progress")
+            UploadSessionService.discard(session)
+        session = UploadSession(
+            id=session_id,
+            filename=data['filename'],
+            file_type=file_type,
+            chunk_size=chunk_size,
+            total_chunks=total_chunks,
+            status='open',
+            expires_at=UploadSessionService._expires_at()
+        )
+        path = UploadSessionService.part_path(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+        db.session.add(session)
+        db.session.commit()
+        return session
+
+    @staticmethod
+    def write_chunk(session, chunk_number, stream, checksum=None):
+        """
+        Write a chunk at its offset, a chunk sent again overwrites the same range
+        The chunk is hashed before it is written. A chunk that does not match its checksum is not
+        written nor recorded as received, so it shows up as missing in the status and is sent again.
+        :param stream: seekable stream of the chunk data, copied in blocks
+        :param checksum: SHA-256 hex digest of the chunk sent by the client, optional
+        :return: UploadChunk
+        :raises ValueError: when the chunk does not fit the session or does not match its checksum
+        """
+        checksum = UploadSessionService._checksum(checksum)
+        if not 0 <= chunk_number < session.total_chunks:
+            raise ValueError(f"chunk_number must be between 0 and {session.total_chunks - 1}")
+
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        offset = chunk_number * session.chunk_size
+        if session.total_size is not None:
+            expected = min(session.chunk_size, session.total_size - offset)
+            if size != expected:
+                raise ValueError(f"Chunk {chunk_number} has {size} bytes, expected {expected}")
+        elif size > session.chunk_size:
+            raise ValueError(f"Chunk {chunk_number} is larger than the first chunk")
+
+        digest = hashlib.sha256()
+        for block in iter(lambda: stream.read(_WRITE_BLOCK), b''):
+            digest.update(block)
+        if checksum and digest.hexdigest() != checksum:
+            # the range keeps any valid copy of this chunk received before
+            raise ValueError(f"Checksum mismatch for chunk {chunk_number}")
+
+        stream.seek(0)
+        fd = os.open(UploadSessionService.part_path(session), os.O_WRONLY)
+        try:
+            position = offset
+            for block in iter(lambda: stream.read(_WRITE_BLOCK), b''):
+                os.pwrite(fd, block, position)
+                position += len(block)
+        finally:
+            os.close(fd)
+
+        chunk = db.session.merge(UploadChunk(session_id=session.id, chunk_number=chunk_number,
+                                             offset=offset, size=size, sha256=digest.hexdigest()))
+        session.expires_at = UploadSessionService._expires_at()
+        db.session.commit()
+        return chunk
+
+    @staticmethod
+    def status(session):
+        """
+        Upload progress for resuming: received byte ranges ([start, end), contiguous chunks merged),
+        the missing chunk numbers and the checksum of every received chunk
+        """
+        chunks = session.chunks.order_by(UploadChunk.chunk_number).all()
+        ranges = []
+        for chunk in chunks:
+            if ranges and ranges[-1][1] == chunk.offset:
+                ranges[-1][1] = chunk.offset + chunk.size
+            else:
+                ranges.append([chunk.offset, chunk.offset + chunk.size])
+        received = {chunk.chunk_number for chunk in chunks}
+        return dict(
+            session.to_dict(),
+            received_ranges=ranges,
+            received_chunks=len(chunks),
+            missing_chunks=[number for number in range(session.total_chunks) if number not in received],
+            chunks={chunk.chunk_number: chunk.sha256 for chunk in chunks}
+        )
+
+    @staticmethod
+    def is_complete(session):
+        return session.chunks.count() == session.total_chunks
+
+    @staticmethod
+    def claim(session):
+        """
+        Take the session for finalizing, only one of the requests completing it concurrently wins
+        :return: True for the winner
+        """
+        claimed = UploadSession.query.filter_by(id=session.id, status='open').update(
+            {'status': 'finalizing'}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    @staticmethod
+    def file_hash(session):
+        """
+        SHA-256 of the whole part file, checked against the one given when the session was created
+        and used as the name of the model file
+        """
+        digest = hashlib.sha256()
+        with open(UploadSessionService.part_path(session), 'rb') as part:
+            for block in iter(lambda: part.read(_WRITE_BLOCK), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def reopen(session):
+        """
+        Open a claimed session again with no chunk received, after the whole-file check failed
+        """
+        UploadChunk.query.filter_by(session_id=session.id).delete()
+        session.status = 'open'
+        session.expires_at = UploadSessionService._expires_at()
+        db.session.commit()
+
+    @staticmethod
+    def release(session, content_hash=None):
+        """
+        Open a claimed session again after completing it failed, the received chunks are kept so
+        sending any chunk again completes the upload
+        A part file that was already renamed to the model file is restored as a copy of it: the model
+        file may be shared with other entries and chunks are written into the part file in place.
+        """
+        db.session.rollback()
+        path = UploadSessionService.part_path(session)
+        if not os.path.exists(path) and content_hash:
+            target = os.path.join(os.path.dirname(path), UploadSessionService.final_name(session, content_hash))
+            if os.path.exists(target):
+                shutil.copyfile(target, path)
+        if os.path.exists(path):
+            UploadSession.query.filter_by(id=session.id).update({'status': 'open'}, synchronize_session=False)
+            db.session.commit()
+        else:
+            UploadSessionService._preallocate(path, session.total_size or 0)
+            UploadSessionService.reopen(session)
+
+    @staticmethod
+    def final_name(session, content_hash):
+        """
+        Content-addressed name of the model file of an upload
+        """
+        return secure_filename(f"{content_hash}{os.path.splitext(session.filename)[1]}")
+
+    @staticmethod
+    def finalize(session, content_hash):
+        """
+        Flush the part file and rename it to its content-addressed model file name
+        When a file with the same content is already stored the upload is dropped and the
+        stored file is shared.
+        :param content_hash: SHA-256 of the file (file_hash)
+        :return: final file name in models/<file_type>
+        """
+        path = UploadSessionService.part_path(session)
+        directory = os.path.dirname(path)
+        new_filename = UploadSessionService.final_name(session, content_hash)
+        target = os.path.join(directory, new_filename)
+
+        if os.path.exists(target):
+            try:
+                # the stored file may be an orphan older than the cleanup cutoff or being deleted with
+                # its last entry, both keep a recently touched file
+                os.utime(target)
+            except FileNotFoundError:
+                pass # removed meanwhile, the part file is stored in its place below
+            else:
+                os.remove(path)
+                session.status = 'complete'
+                db.session.commit()
+                return new_filename
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(path, target)
+        # persist the rename itself
+        if hasattr(os, 'O_DIRECTORY'):
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+        session.status = 'complete'
+        db.session.commit()
+        return new_filename
+
+    @staticmethod
+    def discard(session):
+        """
+        Delete a session, its chunk records and its part file
+        """
+        path = UploadSessionService.part_path(session)
+        if os.path.exists(path):
+            os.remove(path)
+        db.session.delete(session)
+        db.session.commit()
+
+    @staticmethod
+    def purge_expired(app):
+        """
+        Garbage-collect sessions past their expiry: abandoned uploads with their part files and
+        the records of completed ones, run by the scheduler
+        :param app: Flask app, the scheduler runs outside of any app context
+        :return: number of sessions removed
+        """
+        with app.app_context():
+            expired = UploadSession.query.filter(UploadSession.expires_at < datetime.now()).all()
+            for session in expired:
+                try:
+                    UploadSessionService.discard(session)
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Error removing upload session {session.id}: {str(e)}")
+            if expired:
+                current_app.logger.info(f"Removed {len(expired)} expired upload sessions")
+            return len(expired)
+
+    @staticmethod
+    def _expires_at():
+        return datetime.now() + timedelta(hours=current_app.config.get('UPLOAD_SESSION_TTL_HOURS', 24))
+
+    @staticmethod
+    def _checksum(value):
+        """
+        :return: lower case SHA-256 hex digest or None
+        :raises ValueError: when the value is not a SHA-256 hex digest
+        """
+        if not value:
+            return None
+        value = value.strip().lower()
+        if len(value) != 64 or any(c not in '0123456789abcdef' for c in value):
+            raise ValueError("Checksum must be a SHA-256 hex digest")
+        return value
@@ -0,0 +1,236 @@
+# app/services/warmup.py
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+
+from app.services.batching import BatchScheduler
+from app.services.inference_pool import inference_pool
+from app.services.model_loader import get_model_folder, load_model_version, model_cache, model_key
+
+logger = logging.getLogger(__name__)
+
+
+class ModelUsage:
+    """
+    Prediction score per model id, persisted to a JSON file so top-N preloading survives restarts
+    Every prediction adds 1 and scores halve every half_life seconds, so the ranking follows recent
+    usage instead of all-time totals.
+    """
+    half_life = 72 * 3600.0
+    _scores = {} # model id -> (score, time of the score)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _decayed(score, updated_at, now):
+        if ModelUsage.half_life <= 0:
+            return score
+        return score * 0.5 ** (max(0.0, now - updated_at) / ModelUsage.half_life)
+
+    @staticmethod
+    def _add(model_id, score, updated_at, now):
+        current = ModelUsage._scores.get(model_id)
+        if current:
+            score += ModelUsage._decayed(*current, now)
+        ModelUsage._scores[model_id] = (ModelUsage._decayed(score, updated_at, now), now)
+
+    @staticmethod
+    def record(model_id, now=None):
+        now = time.time() if now is None else now
+        with ModelUsage._lock:
+            ModelUsage._add(int(model_id), 1.0, now, now)
+
+    @staticmethod
+    def top(n, now=None):
+        now = time.time() if now is None else now
+        with ModelUsage._lock:
+            scores = {model_id: ModelUsage._decayed(score, updated_at, now)
+                      for model_id, (score, updated_at) in ModelUsage._scores.items()}
+        return sorted(scores, key=scores.get, reverse=True)[:n]
+
+    @staticmethod
+    def load(path):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                scores = json.load(f)
+            now = time.time()
+            # Files written before the decay hold plain counts, they date from the file's last write
+            saved_at = os.path.getmtime(path)
+            with ModelUsage._lock:
+                for model_id, value in scores.items():
+                    score, updated_at = value if isinstance(value, list) else (value, saved_at)
+                    ModelUsage._add(int(model_id), float(score), float(updated_at), now)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Could not read model usage from {path}: {str(e)}")
+
+    @staticmethod
+    def save(path):
+        with ModelUsage._lock:
+            scores = {str(model_id): [score, updated_at]
+                      for model_id, (score, updated_at) in ModelUsage._scores.items()}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(scores, f)
+        os.replace(temp_path, path)
+
+
+class WarmupService:
+    """
+    Preload models in the background and run a dummy inference so the first request is warm
+    """
+    state = {
+        'status': 'idle', # idle, running, ready
+        'total': 0,
+        'loaded': 0,
+        'failed': [],
+        'started_at': None,
+        'finished_at': None,
+    }
+    _lock = threading.Lock()
+    _thread = None
+
+    @staticmethod
+    def warmup_model(model, model_id, config):
+        """
+        Run one dummy prediction through the model
+        """
+        imgsz = model.overrides.get('imgsz') or 640
+        if isinstance(imgsz, (list, tuple)):
+            height, width = imgsz[0], imgsz[-1]
+        else:
+            height = width = int(imgsz)
+        dummy = np.zeros((height, width, 3), dtype=np.uint8)
+
+        if config.get('BATCH_ENABLED', True):
+            # Go through the batcher so warm-up never runs concurrently with real requests on the model
+            BatchScheduler.submit(model_id, model, dummy, config).result()
+        else:
+            with torch.no_grad():
+                model.predict(dummy, verbose=False)
+
+    @staticmethod
+    def load_and_warm(file_manager, config, swap=False):
+        """
+        Load a FileManager model into the cache, warm it up and make it the served version
+        :param swap: the file behind the id was replaced, keep serving the old version until this one is warm
+        :return: True if the model was loaded
+        """
+        folder = get_model_folder(file_manager.file_type)
+        key = model_key(file_manager.filename, folder, file_manager.id, file_manager.content_hash)
+        if inference_pool.enabled:
+            # The worker process owning the model loads it on the dummy prediction
+            model_path = os.path.join(folder, key[1])
+            if not os.path.exists(model_path):
+                return False
+            dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+            future = inference_pool.submit(file_manager.id, key, model_path, file_manager.file_type, [dummy])
+            inference_pool.wait(future)
+            return True
+
+        if swap:
+            model_cache.begin_swap(key)
+        try:
+            key, model = load_model_version(file_manager.filename, folder, file_manager.id,
+                                            file_manager.content_hash)
+            if not model:
+                return False
+
+            WarmupService.warmup_model(model, file_manager.id, config)
+            model_cache.activate(file_manager.id, key)
+            return True
+        finally:
+            model_cache.cancel_swap(key)
+
+    @staticmethod
+    def select_models(config):
+        """
+        Resolve the PRELOAD_MODELS setting: "none", "all", "top:N" or a comma separated list of ids
+        :return: list of FileManager entries
+        """
+        from app.models.filemanager import FileManager
+
+        setting = str(config.get('PRELOAD_MODELS', 'none')).strip().lower()
+        if setting in ('', 'none'):
+            return []
+        if setting == 'all':
+            return FileManager.query.order_by(FileManager.updated_at.desc()).all()
+
+        if setting.startswith('top:'):
+            ids = ModelUsage.top(int(setting.split(':', 1)[1]))
+        else:
+            ids = [int(_id) for _id in setting.split(',') if _id.strip()]
+
+        entries = {entry.id: entry for entry in FileManager.query.filter(FileManager.id.in_(ids)).all()}
+        return [entries[_id] for _id in ids if _id in entries]
+
+    @staticmethod
+    def preload(app):
+        """
+        Load and warm up the configured models, called in a background thread
+        """
+        with app.app_context():
+            with WarmupService._lock:
+                WarmupService.state.update({
+                    'status': 'running',
+                    'loaded': 0,
+                    'failed': [],
+                    'started_at': datetime.now().isoformat(),
+                    'finished_at': None,
+                })
+            try:
+                entries = WarmupService.select_models(app.config)
+                WarmupService.state['total'] = len(entries)
+
+                for entry in entries:
+                    try:
+                        if WarmupService.load_and_warm(entry, app.config):
+                            WarmupService.state['loaded'] += 1
+                        else:
+                            WarmupService.state['failed'].append(entry.id)
+                    except Exception as e:
+                        WarmupService.state['failed'].append(entry.id)
+                        app.logger.error(f"Error warming up model {entry.id}: {str(e)}")
+            except Exception as e:
+                app.logger.error(f"Error in model preload: {str(e)}")
+            finally:
+                WarmupService.state['status'] = 'ready'
+                WarmupService.state['finished_at'] = datetime.now().isoformat()
+                app.logger.info(f"Model preload finished: {WarmupService.state['loaded']} loaded, "
+                                f"{len(WarmupService.state['failed'])} failed")
+
+    @staticmethod
+    def start_preload(app):
+        WarmupService.state['status'] = 'running'
+        WarmupService._thread = threading.Thread(target=WarmupService.preload, args=(app,), name='model-preload',
+                                                 daemon=True)
+        WarmupService._thread.start()
+
+    @staticmethod
+    def warm_async(app, model_id, swap=False):
+        """
+        Load and warm up one model in the background, e.g. right after it was uploaded
+        """
+        def run():
+            from app.models.filemanager import FileManager
+            with app.app_context():
+                try:
+                    entry = FileManager.query.get(model_id)
+                    if entry:
+                        WarmupService.load_and_warm(entry, app.config, swap=swap)
+                        app.logger.info(f"Model {model_id} warmed up")
+                except Exception as e:
+                    app.logger.error(f"Error warming up model {model_id}: {str(e)}")
+
+        threading.Thread(target=run, name=f"model-warmup-{model_id}", daemon=True).start()
+
+    @staticmethod
+    def is_ready():
+        return WarmupService.state['status'] == 'ready'
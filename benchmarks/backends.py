@@ -0,0 +1,88 @@
+"""
+Compare inference latency of one model across backends
+
+    python benchmarks/backends.py --model models/cls/example.pt --backends torch,onnx,openvino
+
+Missing ONNX / OpenVINO artifacts are exported next to the model first.
+Prints one JSON object with the latency per backend.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add the project root to the sys.path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import numpy as np
+from PIL import Image
+from ultralytics import YOLO
+
+from app.services.backends import artifact_name, export_model
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def benchmark(model, images, runs, warmup):
+    for _ in range(warmup):
+        model.predict(images, verbose=False)
+
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model.predict(images, verbose=False)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'runs': runs,
+        'batch': len(images),
+        'mean_ms': float(np.mean(latencies)),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'throughput': len(images) * runs / (sum(latencies) / 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', required=True, help='path of the .pt model')
+    parser.add_argument('--backends', default='torch,onnx', help='comma separated backends')
+    parser.add_argument('--image', help='image to predict, a random image is used if omitted')
+    parser.add_argument('--imgsz', type=int, default=640, help='size of the random image')
+    parser.add_argument('--batch', type=int, default=1)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.image:
+        image = Image.open(args.image).convert('RGB')
+    else:
+        image = np.random.randint(0, 255, (args.imgsz, args.imgsz, 3), dtype=np.uint8)
+    images = [image] * args.batch
+
+    folder, name = os.path.split(args.model)
+    backends = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    missing = [backend for backend in backends
+               if backend != 'torch' and not os.path.exists(os.path.join(folder, artifact_name(name, backend)))]
+    if missing:
+        export_model(args.model, missing)
+
+    task = YOLO(args.model).task
+    report = {}
+    for backend in backends:
+        path = os.path.join(folder, artifact_name(name, backend))
+        if not os.path.exists(path):
+            report[backend] = {'error': 'export failed'}
+            continue
+        report[backend] = benchmark(YOLO(path, task=task), images, args.runs, args.warmup)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
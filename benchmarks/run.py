@@ -0,0 +1,214 @@
+"""
+Load-testing and benchmark harness for the predict and upload APIs
+
+    python benchmarks/run.py --requests 200 --concurrency 8 --output bench.json
+
+Runs against create_app with a throwaway SQLite database and working directory, and with tiny
+synthetic YOLO cls / detect models built from the model yaml (no network, no GPU needed).
+The models are registered through /upload-chunk-model, which is benchmarked as well.
+Prints one JSON report with throughput, p50/p95/p99 latency and peak RSS per scenario.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to the sys.path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import numpy as np
+from PIL import Image
+
+SCENARIOS = ('upload', 'predict_cls', 'predict_detect', 'batch_cls', 'batch_detect')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def build_model(task, path, imgsz):
+    """
+    Build an untrained model from the ultralytics yaml and save it as a checkpoint
+    """
+    import torch
+    from ultralytics import YOLO
+
+    model = YOLO('yolov8n-cls.yaml' if task == 'classify' else 'yolov8n.yaml')
+    torch.save({'model': model.model, 'train_args': {'imgsz': imgsz, 'task': task}}, path)
+    return path
+
+
+def make_image(size, seed=0):
+    rng = np.random.default_rng(seed)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def run_load(app, requests, concurrency, call):
+    """
+    Run call(client, index) requests times over concurrency threads
+    :return: scenario report
+    """
+    local = threading.local()
+
+    def timed(index):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        started = time.perf_counter()
+        ok, items = call(local.client, index)
+        return (time.perf_counter() - started) * 1000, ok, items
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _, _ in results]
+    items = sum(count for _, _, count in results)
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, ok, _ in results if not ok),
+        'duration_s': elapsed,
+        'throughput_rps': requests / elapsed if elapsed else 0.0,
+        'throughput_items_s': items / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': float(np.mean(latencies)) if latencies else 0.0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def upload_model(client, path, file_type, name, chunk_size, filename=None):
+    """
+    Upload a model file through /upload-chunk-model
+    :return: (ok, FileManager id)
+    """
+    filename = filename or os.path.basename(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)] or [b'']
+    response = None
+    for number, chunk in enumerate(chunks):
+        response = client.post('/api/v1/filemanager/upload-chunk-model', data={
+            'file': (io.BytesIO(chunk), filename),
+            'name': name,
+            'chunk_number': number,
+            'total_chunks': len(chunks),
+            'filename': filename,
+            'file_type': file_type,
+            'description': 'benchmark',
+        }, content_type='multipart/form-data')
+        if response.status_code >= 400:
+            return False, None
+    return True, response.get_json()['filename']['id']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma separated scenarios')
+    parser.add_argument('--requests', type=int, default=100, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=8, help='images per batch request')
+    parser.add_argument('--image-size', type=int, default=640)
+    parser.add_argument('--imgsz', type=int, default=64, help='input size of the synthetic models')
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024)
+    parser.add_argument('--uploads', type=int, default=10, help='uploads in the upload scenario')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(',') if scenario.strip()]
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+    os.environ.setdefault('DEBUG', 'false')
+
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+    cls_path = build_model('classify', os.path.join(workdir, 'bench_cls.pt'), args.imgsz)
+    detect_path = build_model('detect', os.path.join(workdir, 'bench_detect.pt'), args.imgsz)
+    image = make_image(args.image_size)
+
+    report = {
+        'config': vars(args),
+        'environment': {'python': sys.version.split()[0], 'cpu_count': os.cpu_count()},
+        'scenarios': {},
+    }
+
+    client = app.test_client()
+    ok_cls, cls_id = upload_model(client, cls_path, 'cls', 'bench-cls', args.chunk_size)
+    ok_detect, detect_id = upload_model(client, detect_path, 'detect', 'bench-detect', args.chunk_size)
+    if not (ok_cls and ok_detect):
+        print(json.dumps({'error': 'model upload failed'}))
+        sys.exit(1)
+
+    def predict(model_id):
+        def call(test_client, _):
+            response = test_client.post('/api/v1/predict/', data={
+                'id': model_id,
+                'file': (io.BytesIO(image), 'bench.jpg'),
+            }, content_type='multipart/form-data')
+            return response.status_code == 200, 1
+        return call
+
+    def batch(model_id):
+        def call(test_client, _):
+            response = test_client.post('/api/v1/predict/batch', data={
+                'id': model_id,
+                'files': [(io.BytesIO(image), f'bench_{i}.jpg') for i in range(args.batch)],
+            }, content_type='multipart/form-data')
+            return response.status_code == 200, args.batch
+        return call
+
+    def upload(test_client, index):
+        path = cls_path if index % 2 == 0 else detect_path
+        ok, _ = upload_model(test_client, path, 'cls' if index % 2 == 0 else 'detect',
+                             f'bench-upload-{index}', args.chunk_size, f'bench_upload_{index}.pt')
+        return ok, 1
+
+    calls = {
+        'upload': (upload, args.uploads),
+        'predict_cls': (predict(cls_id), args.requests),
+        'predict_detect': (predict(detect_id), args.requests),
+        'batch_cls': (batch(cls_id), max(1, args.requests // args.batch)),
+        'batch_detect': (batch(detect_id), max(1, args.requests // args.batch)),
+    }
+
+    for scenario in scenarios:
+        call, requests = calls[scenario]
+        if scenario.startswith(('predict', 'batch')):
+            # one request to load the model, so the scenario measures the warm path
+            call(client, 0)
+        report['scenarios'][scenario] = run_load(app, requests, args.concurrency, call)
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+"""
+Gunicorn server hooks, loaded automatically from the working directory
+The inference worker pool (INFERENCE_WORKERS > 0) is started once in the master process. Every
+HTTP worker forked from it attaches to its own reply slot, so the models are loaded once
+instead of once per HTTP worker.
+"""
+from app.config import Config
+from app.services.inference_pool import inference_pool, pool_settings
+
+
+def on_starting(server):
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    inference_pool.start(config['INFERENCE_WORKERS'], config['INFERENCE_WORKER_MODELS'], pool_settings(config),
+                         slots=server.cfg.workers)
+
+
+def pre_fork(server, worker):
+    # slots of exited workers are free again, they were removed from WORKERS before the respawn
+    used = {getattr(other, 'inference_slot', None) for other in server.WORKERS.values()}
+    worker.inference_slot = next((slot for slot in range(inference_pool.slots) if slot not in used), None)
+
+
+def post_fork(server, worker):
+    if worker.inference_slot is not None:
+        inference_pool.attach(worker.inference_slot)
+    elif inference_pool.slots:
+        server.log.warning(f"No inference reply slot left for worker {worker.pid}, it runs inference itself")
+
+
+def on_exit(server):
+    inference_pool.stop()
@@ -0,0 +1,36 @@
+"""upload_session sha256 and expires_at, upload_chunk sha256
+
+Revision ID: 017cd6c42f38
+Revises: e38bd9bfa26b
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '017cd6c42f38'
+down_revision = 'e38bd9bfa26b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = [column['name'] for column in inspector.get_columns('upload_session')]
+    if 'sha256' not in columns:
+        op.add_column('upload_session', sa.Column('sha256', sa.String(length=64), nullable=True))
+    if 'expires_at' not in columns:
+        op.add_column('upload_session', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    if 'sha256' not in [column['name'] for column in inspector.get_columns('upload_chunk')]:
+        # chunks written before checksums were recorded have none
+        op.add_column('upload_chunk', sa.Column('sha256', sa.String(length=64), nullable=False, server_default=''))
+
+
+def downgrade():
+    with op.batch_alter_table('upload_chunk') as batch_op:
+        batch_op.drop_column('sha256')
+    with op.batch_alter_table('upload_session') as batch_op:
+        batch_op.drop_column('expires_at')
+        batch_op.drop_column('sha256')
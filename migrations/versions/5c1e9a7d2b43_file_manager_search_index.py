@@ -0,0 +1,63 @@
+"""file_manager search index
+
+Revision ID: 5c1e9a7d2b43
+Revises: f017c70ef76b
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e9a7d2b43'
+down_revision = 'f017c70ef76b'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_COLUMNS = ['name', 'description', 'file_type']
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS file_manager_fts_ai AFTER INSERT ON file_manager BEGIN "
+    "INSERT INTO file_manager_fts(rowid, name, description, file_type) "
+    "VALUES (new.id, new.name, new.description, new.file_type); END",
+    "CREATE TRIGGER IF NOT EXISTS file_manager_fts_ad AFTER DELETE ON file_manager BEGIN "
+    "INSERT INTO file_manager_fts(file_manager_fts, rowid, name, description, file_type) "
+    "VALUES ('delete', old.id, old.name, old.description, old.file_type); END",
+    "CREATE TRIGGER IF NOT EXISTS file_manager_fts_au AFTER UPDATE ON file_manager BEGIN "
+    "INSERT INTO file_manager_fts(file_manager_fts, rowid, name, description, file_type) "
+    "VALUES ('delete', old.id, old.name, old.description, old.file_type); "
+    "INSERT INTO file_manager_fts(rowid, name, description, file_type) "
+    "VALUES (new.id, new.name, new.description, new.file_type); END",
+]
+
+
+def upgrade():
+    # substring search of the file listing (app/services/file_listing.py FileSearch)
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # pg_trgm GIN indexes are used by the planner for ILIKE '%term%'
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in TRIGRAM_COLUMNS:
+            op.execute(f"CREATE INDEX IF NOT EXISTS ix_file_manager_{column}_trgm "
+                       f"ON file_manager USING gin ({column} gin_trgm_ops)")
+    elif bind.dialect.name == 'sqlite':
+        # FTS5 trigram table kept in sync by triggers, needs SQLite 3.34+
+        if sa.inspect(bind).has_table('file_manager_fts'):
+            return
+        op.execute("CREATE VIRTUAL TABLE file_manager_fts USING fts5("
+                   "name, description, file_type, content='file_manager', content_rowid='id', tokenize='trigram')")
+        for statement in SQLITE_TRIGGERS:
+            op.execute(statement)
+        op.execute("INSERT INTO file_manager_fts(file_manager_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # the pg_trgm extension is left installed, other schemas may use it
+        for column in TRIGRAM_COLUMNS:
+            op.execute(f"DROP INDEX IF EXISTS ix_file_manager_{column}_trgm")
+    elif bind.dialect.name == 'sqlite':
+        for trigger in ('file_manager_fts_ai', 'file_manager_fts_ad', 'file_manager_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS file_manager_fts")
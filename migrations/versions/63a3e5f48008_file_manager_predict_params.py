@@ -0,0 +1,27 @@
+"""file_manager predict_params
+
+Revision ID: 63a3e5f48008
+Revises: d0caffb300d5
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '63a3e5f48008'
+down_revision = 'd0caffb300d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('file_manager')]
+    if 'predict_params' not in columns:
+        op.add_column('file_manager', sa.Column('predict_params', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('file_manager') as batch_op:
+        batch_op.drop_column('predict_params')
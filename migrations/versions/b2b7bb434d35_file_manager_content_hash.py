@@ -0,0 +1,30 @@
+"""file_manager content_hash
+
+Revision ID: b2b7bb434d35
+Revises: 017cd6c42f38
+Create Date: 2026-10-18 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2b7bb434d35'
+down_revision = '017cd6c42f38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'content_hash' not in [column['name'] for column in inspector.get_columns('file_manager')]:
+        op.add_column('file_manager', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    if 'ix_file_manager_content_hash' not in [index['name'] for index in inspector.get_indexes('file_manager')]:
+        op.create_index('ix_file_manager_content_hash', 'file_manager', ['content_hash'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_file_manager_content_hash', table_name='file_manager')
+    with op.batch_alter_table('file_manager') as batch_op:
+        batch_op.drop_column('content_hash')
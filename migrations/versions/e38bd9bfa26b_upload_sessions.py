@@ -0,0 +1,55 @@
+"""upload_session and upload_chunk
+
+Revision ID: e38bd9bfa26b
+Revises: 63a3e5f48008
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e38bd9bfa26b'
+down_revision = '63a3e5f48008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('upload_session'):
+        op.create_table(
+            'upload_session',
+            sa.Column('id', sa.String(length=32), nullable=False),
+            sa.Column('filename', sa.String(length=255), nullable=False),
+            sa.Column('file_type', sa.String(length=255), nullable=False),
+            sa.Column('total_size', sa.BigInteger(), nullable=True),
+            sa.Column('chunk_size', sa.Integer(), nullable=True),
+            sa.Column('total_chunks', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('name', sa.String(length=255), nullable=True),
+            sa.Column('description', sa.String(length=255), nullable=True),
+            sa.Column('file_manager_id', sa.Integer(), nullable=True),
+            sa.Column('image_name', sa.String(length=255), nullable=True),
+            sa.Column('predict_params', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if not inspector.has_table('upload_chunk'):
+        op.create_table(
+            'upload_chunk',
+            sa.Column('session_id', sa.String(length=32), nullable=False),
+            sa.Column('chunk_number', sa.Integer(), nullable=False),
+            sa.Column('offset', sa.BigInteger(), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+            sa.ForeignKeyConstraint(['session_id'], ['upload_session.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('session_id', 'chunk_number')
+        )
+
+
+def downgrade():
+    op.drop_table('upload_chunk')
+    op.drop_table('upload_session')
@@ -0,0 +1,27 @@
+"""file_manager (created_at, id) index
+
+Revision ID: f017c70ef76b
+Revises: b2b7bb434d35
+Create Date: 2026-10-18 09:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f017c70ef76b'
+down_revision = 'b2b7bb434d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keyset pagination of the file listing orders by (created_at, id)
+    indexes = [index['name'] for index in sa.inspect(op.get_bind()).get_indexes('file_manager')]
+    if 'ix_file_manager_created_at_id' not in indexes:
+        op.create_index('ix_file_manager_created_at_id', 'file_manager', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_file_manager_created_at_id', table_name='file_manager')
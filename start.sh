@@ -12,7 +12,9 @@ if torch.cuda.is_available():
     print('Device name:', torch.cuda.get_device_name(0))
 "
 
-exec gunicorn --bind :${PORT:-10011} --workers ${WORKERS:-1} --threads ${THREADS:-2} --timeout 0 --worker-class gthread server:app
+# Threads only wait on the inference batcher, admission control (ADMISSION_MAX_INFLIGHT) bounds the real work.
+# worker-connections bounds the connections gthread accepts, so overload is rejected instead of queued forever.
+exec gunicorn --bind :${PORT:-10011} --workers ${WORKERS:-1} --threads ${THREADS:-16} --worker-connections ${WORKER_CONNECTIONS:-128} --timeout 0 --worker-class gthread server:app
 #exec gunicorn --bind :${PORT:-10011} \
 #    --workers ${WORKERS:-1} \
 #    --threads ${THREADS:-4} \
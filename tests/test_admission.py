@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from app.services.admission import AdmissionController, Deadline, DeadlineExceeded
+
+
+def test_admission_limits_per_model_and_globally():
+    """Test requests over the per-model and global limits are rejected and released slots reused"""
+    controller = AdmissionController()
+    controller.configure(max_inflight=3, max_inflight_per_model=2, model_limits={'9': 1})
+
+    assert controller.try_acquire(1) is None
+    assert controller.try_acquire(1) is None
+    assert controller.try_acquire(1) == 'model'
+    assert controller.try_acquire(9) is None
+    assert controller.try_acquire(2) == 'global'
+
+    controller.release(1)
+    assert controller.try_acquire(2) is None
+    stats = controller.stats()
+    assert stats['inflight'] == 3
+    assert stats['rejected'] == {'global': 1, 'model': 1, 'deadline': 0}
+
+
+def test_admission_release_drops_idle_models():
+    """Test models without in-flight requests do not stay in the table"""
+    controller = AdmissionController()
+    controller.try_acquire('unknown')
+    controller.release('unknown')
+    assert controller.stats()['models'] == {}
+
+
+def test_deadline_from_headers():
+    """Test absolute and relative deadline headers"""
+    now = time.time()
+    assert Deadline.from_headers({}) is None
+    assert Deadline.expired(Deadline.from_headers({'X-Request-Deadline': str(now - 1)}, now))
+    assert not Deadline.expired(Deadline.from_headers({'X-Request-Timeout-Ms': '5000'}))
+    with pytest.raises(DeadlineExceeded):
+        Deadline.check(Deadline.from_headers({'X-Request-Timeout-Ms': '0'}))
+
+
+def test_deadline_from_headers_rejects_non_finite_and_clamps():
+    """Test inf / nan headers are rejected and huge budgets are clamped to the maximum"""
+    for value in ('inf', '-inf', 'nan'):
+        with pytest.raises(ValueError):
+            Deadline.from_headers({'X-Request-Timeout-Ms': value})
+        with pytest.raises(ValueError):
+            Deadline.from_headers({'X-Request-Deadline': value})
+
+    deadline = Deadline.from_headers({'X-Request-Timeout-Ms': '1e300'}, max_budget=60)
+    assert 0 < Deadline.remaining(deadline) <= 60
+
+
+def test_predict_rejects_expired_deadline(client):
+    """Test a request whose deadline already passed is not processed"""
+    response = client.post('/api/v1/predict/', data={'id': 1}, headers={'X-Request-Timeout-Ms': '0'})
+    assert response.status_code == 504
+
+
+def test_queue_endpoint(client):
+    """Test the queue depth endpoint"""
+    response = client.get('/api/v1/queue')
+    assert response.status_code == 200
+    assert 'inflight' in response.get_json()['admission']
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from app.services import backends
+
+
+@pytest.fixture
+def settings():
+    yield backends
+    backends.configure()
+
+
+def test_artifact_and_source_names():
+    """Test artifact names of every backend map back to the original weights"""
+    assert backends.artifact_name('model.pt', 'torch') == 'model.pt'
+    assert backends.artifact_name('model.pt', 'onnx') == 'model.onnx'
+    assert backends.artifact_name('model.pt', 'openvino') == 'model_openvino_model'
+    assert backends.artifact_name('model.pt', 'int8') == 'model.int8.onnx'
+
+    for backend in ('onnx', 'openvino', 'int8'):
+        assert backends.source_name(backends.artifact_name('model.pt', backend)) == 'model.pt'
+    assert backends.source_name('model.int8.json') == 'model.pt'
+    assert backends.source_name('model.pt') == 'model.pt'
+
+
+def test_resolve_model_file_falls_back_to_weights(tmp_path, settings):
+    """Test the configured backend is only used once its artifact exists"""
+    (tmp_path / 'model.pt').write_bytes(b'pt')
+    settings.configure('onnx')
+    assert settings.resolve_model_file(str(tmp_path), 'model.pt', 1) == 'model.pt'
+
+    (tmp_path / 'model.onnx').write_bytes(b'onnx')
+    assert settings.resolve_model_file(str(tmp_path), 'model.pt', 1) == 'model.onnx'
+    assert settings.resolve_model_file(str(tmp_path), 'model.pt', 1, backend='torch') == 'model.pt'
+
+
+def test_resolve_model_file_per_model_backend_and_int8(tmp_path, settings):
+    """Test per-model overrides and the validated INT8 variant"""
+    for name in ('model.pt', 'model.onnx', 'model_openvino_model'):
+        (tmp_path / name).write_bytes(b'')
+    settings.configure('onnx', models={'2': 'openvino'})
+    assert settings.resolve_model_file(str(tmp_path), 'model.pt', 1) == 'model.onnx'
+    assert settings.resolve_model_file(str(tmp_path), 'model.pt', 2) == 'model_openvino_model'
+
+    (tmp_path / 'model.int8.onnx').write_bytes(b'')
+    assert settings.resolve_model_file(str(tmp_path), 'model.pt', 1) == 'model.int8.onnx'
+    settings.configure('onnx', serve_quantized=False)
+    assert settings.resolve_model_file(str(tmp_path), 'model.pt', 1) == 'model.onnx'
+
+
+class _ExportingModel:
+    """Stand-in for YOLO whose export writes the artifact next to the weights"""
+    fail = ()
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, format, dynamic=False, **kwargs):
+        if format in self.fail:
+            raise RuntimeError('export failed')
+        stem = os.path.splitext(self.path)[0]
+        if format == 'onnx':
+            with open(f"{stem}.onnx", 'w') as f:
+                f.write('onnx')
+        else:
+            os.makedirs(f"{stem}_openvino_model")
+
+
+def test_export_model_moves_artifacts_into_place(tmp_path, monkeypatch):
+    """Test successful exports land next to the weights and the staging folder is removed"""
+    monkeypatch.setattr('ultralytics.YOLO', _ExportingModel)
+    monkeypatch.setattr(_ExportingModel, 'fail', ('openvino',))
+    model_path = tmp_path / 'model.pt'
+    model_path.write_bytes(b'pt')
+
+    exported = backends.export_model(str(model_path), ['torch', 'onnx', 'openvino'])
+
+    assert exported == {'onnx': str(tmp_path / 'model.onnx')}
+    assert sorted(os.listdir(tmp_path)) == ['model.onnx', 'model.pt']
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from app.services.admission import DeadlineExceeded
+from app.services.batching import ModelBatcher, _BatchItem
+
+
+class FakeModel:
+    """Fake model that records the size of every predict call"""
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, images, **kwargs):
+        self.calls.append(len(images))
+        return [f"result-{image}" for image in images]
+
+
+def test_batcher_groups_concurrent_requests():
+    """Test concurrent submits are predicted as one batch and each caller gets its own slice"""
+    model = FakeModel()
+    batcher = ModelBatcher('test', max_batch_size=4, max_wait_ms=200)
+
+    futures = []
+    lock = threading.Lock()
+
+    def submit(i):
+        future = batcher.submit(model, i)
+        with lock:
+            futures.append((i, future))
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i, future in futures:
+        assert future.result(timeout=5) == [f"result-{i}"]
+    assert model.calls == [4]
+    assert batcher.stats()['batches'] == 1
+
+
+def test_batcher_flushes_after_max_wait():
+    """Test a single request is not held longer than the batching window"""
+    model = FakeModel()
+    batcher = ModelBatcher('test-wait', max_batch_size=8, max_wait_ms=5)
+
+    assert batcher.submit(model, 'a').result(timeout=5) == ['result-a']
+    assert model.calls == [1]
+
+
+def test_batcher_splits_by_predict_kwargs():
+    """Test items with different predict params are not predicted in the same call"""
+    model = FakeModel()
+    batcher = ModelBatcher('test-kwargs', max_batch_size=4, max_wait_ms=200)
+
+    futures = [batcher.submit(model, i, {'conf': 0.5} if i % 2 else None) for i in range(4)]
+    for i, future in enumerate(futures):
+        assert future.result(timeout=5) == [f"result-{i}"]
+    assert sorted(model.calls) == [2, 2]
+
+
+def test_batcher_drops_expired_items():
+    """Test items whose deadline passed while queued are not predicted"""
+    model = FakeModel()
+    batcher = ModelBatcher('test-deadline', max_batch_size=4, max_wait_ms=50)
+
+    expired = batcher.submit(model, 0, deadline=time.monotonic() - 1)
+    live = batcher.submit(model, 1, deadline=time.monotonic() + 30)
+    with pytest.raises(DeadlineExceeded):
+        expired.result(timeout=5)
+    assert live.result(timeout=5) == ["result-1"]
+    assert model.calls == [1]
+
+
+def test_batcher_takes_high_priority_first():
+    """Test queued high priority items are batched before low priority ones"""
+    model = FakeModel()
+    batcher = ModelBatcher('test-priority', max_batch_size=2, max_wait_ms=0, starvation_ms=10000)
+    batcher._queue.put(_BatchItem(model, 'low-0', priority='low'))
+    batcher._queue.put(_BatchItem(model, 'low-1', priority='low'))
+    batcher._queue.put(_BatchItem(model, 'high-0', priority='high'))
+
+    batch = batcher._collect()
+    assert [item.image for item in batch] == ['high-0', 'low-0']
+
+
+def test_batcher_fails_every_item_on_missing_results():
+    """Test callers get an error instead of waiting forever when model.predict drops results"""
+    class ShortModel(FakeModel):
+        def predict(self, images, **kwargs):
+            return super().predict(images, **kwargs)[:-1]
+
+    batcher = ModelBatcher('test-short', max_batch_size=2, max_wait_ms=200)
+    model = ShortModel()
+    futures = [batcher.submit(model, i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
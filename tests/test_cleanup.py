@@ -0,0 +1,60 @@
+import os
+import time
+
+from app.services.cleanup import CleanupService
+
+
+def _reset_state():
+    CleanupService.state.update({'scanned': 0, 'removed': 0, 'reclaimed_bytes': 0, 'errors': 0, 'files': []})
+
+
+def test_sweep_dry_run_reports_without_removing(tmp_path):
+    """Test a dry run counts unreferenced files and reclaimable bytes but keeps them"""
+    _reset_state()
+    (tmp_path / 'kept.pt').write_bytes(b'1' * 10)
+    (tmp_path / 'orphan.pt').write_bytes(b'1' * 20)
+    (tmp_path / '.upload_abc.part').write_bytes(b'1' * 30)
+
+    CleanupService._sweep(str(tmp_path), lambda name: name == 'kept.pt', time.time() + 1, dry_run=True)
+
+    assert CleanupService.state['scanned'] == 2
+    assert CleanupService.state['removed'] == 1
+    assert CleanupService.state['reclaimed_bytes'] == 20
+    assert (tmp_path / 'orphan.pt').exists()
+
+
+def test_sweep_removes_old_unreferenced_files_only(tmp_path):
+    """Test files newer than the cutoff and in-progress dot files are kept"""
+    _reset_state()
+    old = tmp_path / 'old.pt'
+    old.write_bytes(b'1' * 5)
+    os.utime(old, (time.time() - 3600, time.time() - 3600))
+    (tmp_path / 'new.pt').write_bytes(b'1' * 5)
+    (tmp_path / '.export_123').mkdir()
+
+    CleanupService._sweep(str(tmp_path), lambda name: False, time.time() - 60, dry_run=False)
+
+    assert not old.exists()
+    assert (tmp_path / 'new.pt').exists()
+    assert (tmp_path / '.export_123').exists()
+    assert CleanupService.state['reclaimed_bytes'] == 5
+
+
+def test_sweep_keeps_files_referenced_since_the_names_were_loaded(tmp_path):
+    """Test candidates referenced again by the check before removing are kept"""
+    _reset_state()
+    for name in ('orphan.pt', 'reused.pt'):
+        (tmp_path / name).write_bytes(b'1' * 5)
+    checked = []
+
+    def still_referenced(names):
+        checked.append(sorted(names))
+        return {'reused.pt'}
+
+    CleanupService._sweep(str(tmp_path), lambda name: False, time.time() + 1, dry_run=False,
+                          still_referenced=still_referenced)
+
+    assert checked == [['orphan.pt', 'reused.pt']]
+    assert not (tmp_path / 'orphan.pt').exists()
+    assert (tmp_path / 'reused.pt').exists()
+    assert CleanupService.state['removed'] == 1
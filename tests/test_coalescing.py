@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from app.services.admission import Deadline, DeadlineExceeded
+from app.services.coalescing import RequestCoalescer
+
+
+def test_coalescer_runs_work_once_for_concurrent_callers():
+    """Test callers arriving while the work runs share its result"""
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.run('key', work))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ['result'] * 3
+    assert calls == [1]
+    assert coalescer.stats()['coalesced'] == 2
+
+
+def test_coalescer_follower_waits_until_its_own_deadline():
+    """Test a follower gives up at its deadline while the work goes on for the others"""
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    leader = []
+    thread = threading.Thread(target=lambda: leader.append(coalescer.run('key', lambda: release.wait(5) and 'done')))
+    thread.start()
+    time.sleep(0.05)
+
+    with pytest.raises(DeadlineExceeded):
+        coalescer.run('key', lambda: 'unused', Deadline.from_headers({'X-Request-Timeout-Ms': '50'}))
+    release.set()
+    thread.join(5)
+    assert leader == ['done']
+
+
+def test_coalescer_leader_work_outlives_its_deadline():
+    """Test a leader with a short deadline does not cut the work short for a follower with more time"""
+    coalescer = RequestCoalescer()
+    outcome = {}
+
+    def lead():
+        try:
+            coalescer.run('key', lambda: time.sleep(0.2) or 'done',
+                          Deadline.from_headers({'X-Request-Timeout-Ms': '50'}))
+        except DeadlineExceeded:
+            outcome['leader'] = 'deadline'
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    time.sleep(0.05)
+    outcome['follower'] = coalescer.run('key', lambda: 'unused',
+                                        Deadline.from_headers({'X-Request-Timeout-Ms': '5000'}))
+    thread.join(5)
+    assert outcome == {'leader': 'deadline', 'follower': 'done'}
+
+
+def test_coalescer_leader_returns_at_its_deadline():
+    """Test the first caller gets DeadlineExceeded at its deadline, not when the work finishes"""
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        coalescer.run('key', lambda: release.wait(5) and 'done', Deadline.from_headers({'X-Request-Timeout-Ms': '50'}))
+    assert time.monotonic() - started < 1
+
+    # the work goes on for a caller with more time
+    threading.Timer(0.05, release.set).start()
+    assert coalescer.run('key', lambda: 'unused', Deadline.from_headers({'X-Request-Timeout-Ms': '5000'})) == 'done'
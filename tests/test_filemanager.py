@@ -1,6 +1,50 @@
+import os
 import pytest
 from http import HTTPStatus
 
+from flask_migrate import upgrade
+
+from app import create_app, db
+from app.config import Config
+from app.models.filemanager import FileManager
+from app.services.file_listing import FileSearch, file_counts
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture
+def listing_client(tmp_path, monkeypatch):
+    """Client of a migrated SQLite database seeded with five entries, newest first: ids 5 to 1"""
+    class _Config(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'db.sqlite3'}"
+
+    monkeypatch.setattr(FileSearch, 'fts_enabled', False)
+    app = create_app(_Config)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        FileSearch.detect()
+        file_counts.clear()
+        for name, description, file_type in [
+            ('yolo-detector', 'people and cars', 'detect'),
+            ('resnet', 'animal classifier', 'cls'),
+            ('unet', 'road segmentation', 'segment'),
+            ('yolo-pose', 'keypoints of people', 'pose'),
+            ('efficientnet', 'plant classifier', 'cls'),
+        ]:
+            db.session.add(FileManager(name=name, filename=f'{name}.pt', description=description,
+                                       file_type=file_type))
+        db.session.commit()
+        yield app.test_client()
+        file_counts.clear()
+        db.session.remove()
+
+
+def _listing(client, query):
+    response = client.get(f'/api/v1/filemanager/?{query}')
+    assert response.status_code == HTTPStatus.OK
+    return response.get_json()['data']
+
+
 def test_server_is_up_and_running(client):
     """Test if the server is running"""
     response = client.get('/')
@@ -42,4 +86,124 @@ def test_get_filemanager_pagination(client):
 #     assert response.status_code == HTTPStatus.BAD_REQUEST
 #     data = response.get_json()
 #     assert data['status'] == 'error'
-#     assert data['message'] == 'Name is invalid'
\ No newline at end of file
+#     assert data['message'] == 'Name is invalid'
+
+def test_create_upload_session_requires_total_size(client):
+    """Test upload session creation without the size of the model file"""
+    response = client.post('/api/v1/filemanager/upload-sessions', data={'filename': 'model.pt', 'file_type': 'cls'})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    data = response.get_json()
+    assert data['status'] == 'error'
+
+
+def test_create_upload_session_rejects_invalid_file_type(client):
+    """Test upload session creation with a file type outside the models directory"""
+    response = client.post('/api/v1/filemanager/upload-sessions', data={
+        'filename': 'model.pt', 'file_type': '../cls', 'total_size': 10
+    })
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_create_upload_session_rejects_invalid_sha256(client):
+    """Test upload session creation with a whole-file hash that is not a SHA-256 digest"""
+    response = client.post('/api/v1/filemanager/upload-sessions', data={
+        'filename': 'model.pt', 'file_type': 'cls', 'total_size': 10, 'sha256': 'abc'
+    })
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_upload_checksum_format():
+    """Test chunk checksums are normalized SHA-256 hex digests"""
+    from app.services.upload_session import UploadSessionService
+    digest = 'A' * 64
+    assert UploadSessionService._checksum(digest) == 'a' * 64
+    assert UploadSessionService._checksum('') is None
+    with pytest.raises(ValueError):
+        UploadSessionService._checksum('g' * 64)
+
+
+def test_get_filemanager_cursor_pagination(listing_client):
+    """Test keyset pagination walks every entry once, newest first, and ends without a next cursor"""
+    ids, cursor, pages = [], '', 0
+    while cursor is not None:
+        data = _listing(listing_client, f'cursor={cursor}&per_page=2')
+        pagination = data['pagination']
+        assert pagination['total_items'] is None
+        assert pagination['has_next'] == (pagination['next_cursor'] is not None)
+        ids += [item['id'] for item in data['items']]
+        cursor = pagination['next_cursor']
+        pages += 1
+    # the seeded entries share created_at, the order falls back to the id
+    assert ids == [5, 4, 3, 2, 1]
+    assert pages == 3
+
+
+def test_get_filemanager_search(listing_client):
+    """Test search matches name, description and file_type, through FTS5 and ILIKE for short terms"""
+    assert FileSearch.fts_enabled
+    assert [item['id'] for item in _listing(listing_client, 'search=yolo')['items']] == [4, 1]
+    assert [item['id'] for item in _listing(listing_client, 'search=classifier')['items']] == [5, 2]
+    assert [item['id'] for item in _listing(listing_client, 'search=segment')['items']] == [3]
+    assert [item['id'] for item in _listing(listing_client, 'search=ca')['items']] == [1]
+    assert _listing(listing_client, 'search=missing')['items'] == []
+
+    # the triggers keep the index in sync with updates and deletes
+    entry = db.session.get(FileManager, 3)
+    entry.name = 'yolo-segment'
+    db.session.commit()
+    assert [item['id'] for item in _listing(listing_client, 'search=yolo')['items']] == [4, 3, 1]
+    db.session.delete(db.session.get(FileManager, 4))
+    db.session.commit()
+    assert [item['id'] for item in _listing(listing_client, 'search=yolo')['items']] == [3, 1]
+
+
+def test_get_filemanager_total_modes(listing_client):
+    """Test exact totals follow the table, cached and approximate totals are kept, none skips the count"""
+    pagination = _listing(listing_client, 'per_page=2&total=exact')['pagination']
+    assert (pagination['total_items'], pagination['total_pages']) == (5, 3)
+    assert _listing(listing_client, 'per_page=2&total=cached')['pagination']['total_items'] == 5
+
+    db.session.add(FileManager(name='added', filename='added.pt'))
+    db.session.commit()
+    assert _listing(listing_client, 'per_page=2&total=exact')['pagination']['total_items'] == 6
+    # approximate has no planner estimate on SQLite and uses the cached total
+    assert _listing(listing_client, 'per_page=2&total=cached')['pagination']['total_items'] == 5
+    assert _listing(listing_client, 'per_page=2&total=approximate')['pagination']['total_items'] == 5
+    assert _listing(listing_client, 'per_page=2&total=cached&search=yolo')['pagination']['total_items'] == 2
+
+    pagination = _listing(listing_client, 'per_page=2&total=none')['pagination']
+    assert (pagination['total_items'], pagination['total_pages']) == (None, None)
+    assert pagination['has_next']
+
+
+def test_get_filemanager_invalid_cursor_and_total(client):
+    """Test malformed cursors and unknown total modes are rejected"""
+    assert client.get('/api/v1/filemanager/?cursor=not-a-cursor').status_code == HTTPStatus.BAD_REQUEST
+    assert client.get('/api/v1/filemanager/?total=maybe').status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_listing_cursor_round_trip():
+    """Test a cursor decodes to the created_at and id it was made from"""
+    from datetime import datetime
+    from types import SimpleNamespace
+    from app.services.file_listing import Cursor
+
+    cursor = Cursor.encode(SimpleNamespace(created_at=datetime(2024, 5, 1, 8, 30), id=42))
+    assert Cursor.decode(cursor) == ('2024-05-01 08:30:00', 42)
+
+
+def test_create_upload_session_rejects_oversized_file(client, app):
+    """Test upload session creation with a file larger than UPLOAD_MAX_SIZE"""
+    response = client.post('/api/v1/filemanager/upload-sessions', data={
+        'filename': 'model.pt', 'file_type': 'cls', 'total_size': app.config['UPLOAD_MAX_SIZE'] + 1
+    })
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_create_upload_session_rejects_chunks_over_max_content_length(client, app):
+    """Test upload session creation with chunks that could not be sent in one request"""
+    response = client.post('/api/v1/filemanager/upload-sessions', data={
+        'filename': 'model.pt', 'file_type': 'cls', 'total_size': 10,
+        'chunk_size': app.config['MAX_CONTENT_LENGTH'] + 1
+    })
+    assert response.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,44 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.image_ingest import ImageIngest
+
+
+def _jpeg(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (255, 0, 0)).save(buffer, format='JPEG')
+    buffer.seek(0)
+    return buffer
+
+
+def test_decode_stream_uses_jpeg_draft():
+    """Test large JPEGs are decoded at a reduced scale that still covers the model input size"""
+    image = ImageIngest.decode_stream(_jpeg(4000, 3000), 'frame.jpg', target_size=640)
+    assert image.mode == 'RGB'
+    assert 640 <= min(image.size) < 3000
+
+
+def test_from_raw_returns_bgr_array():
+    """Test raw RGB buffers are wrapped without PIL and converted to BGR"""
+    data = bytes([255, 0, 0] * 4)
+    array = ImageIngest.from_raw(data, 2, 2)
+    assert array.shape == (2, 2, 3)
+    assert array[0, 0].tolist() == [0, 0, 255]
+
+
+def test_from_raw_rejects_wrong_shape():
+    """Test raw buffers that do not match the shape headers"""
+    with pytest.raises(ValueError):
+        ImageIngest.from_raw(b'\x00' * 10, 2, 2)
+
+
+def test_decode_npy():
+    """Test .npy uploads skip PIL"""
+    buffer = io.BytesIO()
+    np.save(buffer, np.zeros((4, 5), dtype=np.uint8))
+    buffer.seek(0)
+    array = ImageIngest.decode_stream(buffer, 'frame.npy')
+    assert array.shape == (4, 5, 3)
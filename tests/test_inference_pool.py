@@ -0,0 +1,62 @@
+import os
+import time
+
+import pytest
+
+from app.services.admission import DeadlineExceeded
+from app.services.inference_pool import InferencePool
+
+
+def _echo_worker(index, tasks, results, settings):
+    """Worker answering every image with its own index, exits on the image 'crash'"""
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, slot, _, _, _, images, _ = task
+        if 'crash' in images:
+            os._exit(1)
+        if 'hang' in images:
+            continue
+        results[slot].put((task_id, True, [f"{index}:{image}" for image in images]))
+
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(target=_echo_worker, check_interval=0.1)
+    pool.start(2, assignments={'7': 1})
+    pool.attach(0)
+    yield pool
+    pool.stop()
+
+
+def test_pool_routes_results_to_their_futures(pool):
+    """Test every future gets the result of its own task from the worker owning the model"""
+    futures = [(model_id, pool.submit(model_id, 'key', 'model.pt', 'detect', [f"image-{model_id}"]))
+               for model_id in (2, 3, 7)]
+    assert [future.result(timeout=30) for _, future in futures] == [['0:image-2'], ['1:image-3'], ['1:image-7']]
+    assert [worker['pending'] for worker in pool.stats()['workers']] == [0, 0]
+
+
+def test_pool_restarts_dead_worker_and_fails_its_futures(pool):
+    """Test the futures held by a worker that died fail and the worker is replaced"""
+    pool.submit(1, 'key', 'model.pt', 'detect', ['warm']).result(timeout=30)
+    pid = pool.stats()['workers'][1]['pid']
+
+    lost = pool.submit(1, 'key', 'model.pt', 'detect', ['hang'])
+    pool.submit(1, 'key', 'model.pt', 'detect', ['crash'])
+    with pytest.raises(RuntimeError, match='Inference worker 1 exited'):
+        lost.result(timeout=30)
+
+    assert pool.submit(1, 'key', 'model.pt', 'detect', ['after']).result(timeout=30) == ['1:after']
+    assert pool.stats()['workers'][1]['pid'] not in (None, pid)
+
+
+def test_pool_wait_is_bounded_by_the_timeout(pool):
+    """Test waiting for a result never blocks longer than the pool timeout"""
+    pool.timeout = 0.2
+    future = pool.submit(0, 'key', 'model.pt', 'detect', ['hang'])
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        pool.wait(future)
+    assert time.monotonic() - started < 5
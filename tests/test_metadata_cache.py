@@ -0,0 +1,87 @@
+import time
+
+from app.services.metadata_cache import MetadataCache, ModelMetadata
+
+
+class _Cache(MetadataCache):
+    """MetadataCache reading rows from a dict instead of the database"""
+
+    def __init__(self, rows, **kwargs):
+        super().__init__(**kwargs)
+        self.rows = rows
+        self.loads = 0
+        self.during_load = None
+
+    def _load(self, _id):
+        self.loads += 1
+        row = self.rows.get(_id)
+        if self.during_load:
+            self.during_load()
+        return row and ModelMetadata(_id, row, 'detect', 'models/detect', {}, None)
+
+
+def test_metadata_cache_ttl_expiry():
+    """Test entries are served from the cache until the TTL passed"""
+    cache = _Cache({1: 'a.pt'}, ttl=0.05)
+    assert cache.get(1).filename == 'a.pt'
+    cache.rows[1] = 'b.pt'
+    assert cache.get(1).filename == 'a.pt'
+    assert cache.loads == 1
+
+    time.sleep(0.1)
+    assert cache.get(1).filename == 'b.pt'
+    assert cache.loads == 2
+
+
+def test_metadata_cache_invalidate():
+    """Test an invalidated entry is read again"""
+    cache = _Cache({1: 'a.pt', 2: 'c.pt'})
+    cache.get(1)
+    cache.get(2)
+    cache.rows[1] = 'b.pt'
+    cache.invalidate(1)
+    assert cache.get(1).filename == 'b.pt'
+    assert cache.get(2).filename == 'c.pt'
+    assert cache.loads == 3
+
+
+def test_metadata_cache_skips_rows_read_before_an_invalidation():
+    """Test a lookup racing with an invalidation does not cache the stale row"""
+    cache = _Cache({1: 'a.pt'})
+    cache.during_load = lambda: cache.invalidate(1)
+    assert cache.get(1).filename == 'a.pt'
+
+    cache.during_load = None
+    cache.rows[1] = 'b.pt'
+    assert cache.get(1).filename == 'b.pt'
+    assert cache.get(1).filename == 'b.pt'
+    assert cache.loads == 2
+
+
+def test_metadata_cache_max_entries():
+    """Test the least recently used entry is dropped over max_entries"""
+    cache = _Cache({1: 'a.pt', 2: 'b.pt', 3: 'c.pt'}, max_entries=2)
+    cache.get(1)
+    cache.get(2)
+    cache.get(1)
+    cache.get(3)
+    assert cache.stats()['entries'] == 2
+
+    loads = cache.loads
+    cache.get(1)
+    assert cache.loads == loads
+    cache.get(2)
+    assert cache.loads == loads + 1
+
+
+def test_metadata_cache_keeps_invalidations_only_for_lookups_in_flight():
+    """Test invalidations are forgotten once no lookup started before them is running"""
+    cache = _Cache({1: 'a.pt', 2: 'b.pt'})
+    for _id in range(100):
+        cache.invalidate(_id)
+    assert cache._invalidated == {}
+
+    cache.during_load = lambda: cache.invalidate(2)
+    cache.get(1)
+    assert cache._invalidated == {}
+    assert cache._loading == {}
@@ -0,0 +1,34 @@
+from http import HTTPStatus
+
+from app.services.metrics import Counter, Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test histogram buckets, sum and count in the text format"""
+    histogram = Histogram('test_seconds', 'Test histogram', ['stage'], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage='decode')
+    histogram.observe(0.5, stage='decode')
+    histogram.observe(5, stage='decode')
+
+    lines = histogram.collect()
+    assert 'test_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="decode",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="decode",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="decode"} 3' in lines
+
+
+def test_counter_labels():
+    """Test counter values per label set"""
+    counter = Counter('test_total', 'Test counter', ['result'])
+    counter.inc(result='hit')
+    counter.inc(2, result='hit')
+    assert 'test_total{result="hit"} 3.0' in counter.collect()
+
+
+def test_metrics_endpoint(client):
+    """Test the metrics endpoint exposes the predict and cache metrics"""
+    response = client.get('/metrics')
+    assert response.status_code == HTTPStatus.OK
+    body = response.get_data(as_text=True)
+    assert '# TYPE predict_stage_seconds histogram' in body
+    assert '# TYPE model_cache_models gauge' in body
@@ -0,0 +1,148 @@
+from app.services.model_loader import ModelCache
+
+
+def test_model_cache_evicts_least_recently_used():
+    """Test models over the byte budget are evicted in LRU order"""
+    cache = ModelCache(max_bytes=100)
+    cache.put(1, 'model-1', 40)
+    cache.put(2, 'model-2', 40)
+    assert cache.get(1) == 'model-1'
+
+    cache.put(3, 'model-3', 40)
+
+    assert 1 in cache
+    assert 2 not in cache
+    assert 3 in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test_model_cache_keeps_pinned_models():
+    """Test pinned models are never evicted"""
+    cache = ModelCache(max_bytes=100)
+    cache.pin(1)
+    cache.put(1, 'model-1', 60)
+    cache.put(2, 'model-2', 60)
+    cache.put(3, 'model-3', 60)
+
+    assert 1 in cache
+    assert 2 not in cache
+    assert 3 in cache
+
+
+def test_model_cache_counts_hits_and_misses():
+    """Test hit and miss counters"""
+    cache = ModelCache()
+    assert cache.get(1) is None
+    cache.put(1, 'model-1', 10, load_time=0.5)
+    assert cache.get(1) == 'model-1'
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['loads'] == 1
+    assert stats['load_time_total'] == 0.5
+
+
+def test_model_cache_loads_once_for_concurrent_misses():
+    """Test concurrent misses for one key run the loader a single time"""
+    import threading
+    import time
+
+    cache = ModelCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'model-1', 10
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load(1, loader))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['model-1'] * 5
+
+
+def test_model_cache_hot_swap_keeps_old_version_until_released():
+    """Test the active version serves while a new one warms up and is released after its last lease"""
+    cache = ModelCache()
+    old_key, new_key = (1, 'old.pt'), (1, 'new.pt')
+    cache.put(old_key, 'old-model', 10)
+    cache.activate(1, old_key)
+
+    cache.begin_swap(new_key)
+    assert cache.resolve(1, new_key) == old_key
+
+    cache.acquire(old_key)
+    cache.put(new_key, 'new-model', 10)
+    cache.activate(1, new_key)
+
+    assert cache.resolve(1, new_key) == new_key
+    assert old_key in cache
+    cache.release(old_key)
+    assert old_key not in cache
+    assert cache.active_key(1) == new_key
+
+
+def test_model_cache_shares_identical_weights_between_ids():
+    """Test model ids with the same content hash serve one cached entry until the last one is removed"""
+    cache = ModelCache()
+    key = ('a' * 64, 'a' * 64 + '.pt')
+    cache.put(key, 'model', 10)
+    cache.activate(1, key)
+    cache.activate(2, key)
+    assert len(cache) == 1
+
+    cache.evict_model(1)
+    assert key in cache
+    assert cache.active_key(2) == key
+
+    cache.evict_model(2)
+    assert key not in cache
+
+
+class _LoadedModel:
+    """Stand-in for YOLO recording device moves"""
+
+    def __init__(self, path):
+        self.path = path
+        self.overrides = {}
+        self.devices = []
+
+    def to(self, device):
+        self.devices.append(device)
+
+
+def test_model_loader_moves_only_torch_weights_to_cuda(tmp_path, monkeypatch):
+    """Test exported models get the device as a predict argument instead of .to()"""
+    from app.services import model_loader
+
+    monkeypatch.setattr(model_loader, 'YOLO', _LoadedModel)
+    monkeypatch.setattr(model_loader, 'check_gpu', lambda: 'cuda')
+    for name in ('model.pt', 'model.onnx'):
+        (tmp_path / name).write_bytes(b'weights')
+
+    model, _ = model_loader._model_loader(str(tmp_path / 'model.pt'))()
+    assert model.devices == ['cuda']
+
+    model, _ = model_loader._model_loader(str(tmp_path / 'model.onnx'))()
+    assert model.devices == []
+    assert model.overrides['device'] == 'cuda'
+
+
+def test_model_cache_reports_shared_weights_per_model_id():
+    """Test sizes and metrics use the FileManager ids, not the content hash of the cache key"""
+    cache = ModelCache()
+    key = ('a' * 64, 'model.pt')
+    cache.get_or_load(key, lambda: ('model', 10), model_id=1)
+    cache.get_or_load(key, lambda: ('unused', 10), model_id=2)
+
+    assert cache.sizes() == {(1, 'model.pt'): 10, (2, 'model.pt'): 10}
+    assert cache.stats()['entries'][0]['model_ids'] == [1, 2]
+
+    cache.evict_model(1)
+    assert cache.sizes() == {(2, 'model.pt'): 10}
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from app.services.pipeline import Pipeline
+
+
+def test_pipeline_runs_stages_in_order(app):
+    """Test a job passes through every stage and the last stage resolves the future"""
+    pipeline = Pipeline()
+
+    def first(job):
+        job.state['seen'] = ['first']
+        return 'second'
+
+    def second(job):
+        job.state['seen'].append('second')
+        job.finish(job.state['seen'])
+
+    pipeline.configure([('first', first, 2, 4), ('second', second, 1, 4)])
+    futures = [pipeline.submit(app, value=i) for i in range(10)]
+    assert all(future.result(timeout=5) == ['first', 'second'] for future in futures)
+    assert pipeline.stats()['stages']['first']['processed'] == 10
+
+
+def test_pipeline_forward_from_callback(app):
+    """Test a stage can hand the job on later, e.g. from a batch callback"""
+    pipeline = Pipeline()
+    release = threading.Event()
+
+    def start(job):
+        threading.Thread(target=lambda: (release.wait(), pipeline.forward(job, 'finish'))).start()
+
+    pipeline.configure([('start', start, 1, 4), ('finish', lambda job: job.finish('done'), 1, 4)])
+    future = pipeline.submit(app)
+    assert not future.done()
+    release.set()
+    assert future.result(timeout=5) == 'done'
+
+
+def test_pipeline_stage_error_fails_the_job(app):
+    """Test an exception in a stage is raised to the caller"""
+    pipeline = Pipeline()
+
+    def broken(job):
+        raise RuntimeError('boom')
+
+    pipeline.configure([('broken', broken, 1, 1)])
+    with pytest.raises(RuntimeError):
+        pipeline.submit(app).result(timeout=5)
+    assert pipeline.stats()['stages']['broken']['failed'] == 1
+
+
+def test_pipeline_endpoint(client):
+    """Test the pipeline stats endpoint"""
+    response = client.get('/api/v1/pipeline')
+    assert response.status_code == 200
+    assert 'enabled' in response.get_json()
+
+
+def test_pipeline_hand_off_never_blocks_on_a_full_stage(app):
+    """Test hand_off returns at once when the next stage is full and the job still gets there"""
+    import time
+
+    from app.services.pipeline import PipelineJob
+
+    pipeline = Pipeline()
+    release = threading.Event()
+
+    def slow(job):
+        release.wait()
+        job.finish(job.state['value'])
+
+    pipeline.configure([('slow', slow, 1, 1)])
+    jobs = [PipelineJob(app, {'value': value}) for value in range(4)]
+    started = time.monotonic()
+    for job in jobs:
+        pipeline.hand_off(job, 'slow')
+    assert time.monotonic() - started < 1
+    assert pipeline.stats()['handed_off'] >= 2
+
+    release.set()
+    assert sorted(job.future.result(timeout=5) for job in jobs) == [0, 1, 2, 3]
@@ -0,0 +1,112 @@
+import io
+from http import HTTPStatus
+
+def test_predict_batch_requires_images(client):
+    """Test batch predict without images"""
+    response = client.post('/api/v1/predict/batch', data={'id': 1})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    data = response.get_json()
+    assert data['status'] == 'error'
+
+def test_predict_batch_unknown_model(client):
+    """Test batch predict with a model id that does not exist"""
+    data = {
+        'id': 0,
+        'files': [(io.BytesIO(b'not an image'), 'a.jpg'), (io.BytesIO(b'x'), 'b.txt')]
+    }
+    response = client.post('/api/v1/predict/batch', data=data, content_type='multipart/form-data')
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+def test_ready_reports_preload_state(client):
+    """Test readiness endpoint reports ready once the preload finished"""
+    from app.services.warmup import WarmupService
+    WarmupService._thread.join(timeout=30)
+    response = client.get('/api/v1/ready')
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json()['status'] == 'ready'
+
+
+def test_ready_unavailable_while_preloading(client, monkeypatch):
+    """Test readiness endpoint answers 503 while models are still preloading"""
+    from app.services.warmup import WarmupService
+    WarmupService._thread.join(timeout=30)
+    monkeypatch.setitem(WarmupService.state, 'status', 'running')
+    response = client.get('/api/v1/ready')
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.get_json()['status'] == 'running'
+
+
+def test_model_usage_ranks_recent_usage_first(monkeypatch):
+    """Test usage scores decay so recent predictions outrank old totals"""
+    from app.services.warmup import ModelUsage
+    monkeypatch.setattr(ModelUsage, '_scores', {})
+    monkeypatch.setattr(ModelUsage, 'half_life', 3600.0)
+    for _ in range(8):
+        ModelUsage.record(1, now=0.0)
+    for _ in range(2):
+        ModelUsage.record(2, now=3 * 3600.0)
+    # model 1: 8 halved three times = 1, model 2: 2
+    assert ModelUsage.top(2, now=3 * 3600.0) == [2, 1]
+    assert ModelUsage.top(2, now=0.0) == [1, 2]
+
+
+class _Upload:
+    """Minimal stand-in for an uploaded file"""
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.stream = io.BytesIO(data)
+
+    def read(self):
+        return self.stream.read()
+
+
+def _zip(entries):
+    import zipfile
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_read_batch_uploads_counts_zip_entries_before_reading():
+    """Test an archive with more entries than allowed is rejected up front"""
+    import pytest
+    from app.services.PredictService import PredictService
+
+    archive = _Upload('images.zip', _zip([(f'{i}.jpg', b'x') for i in range(5)]))
+    with pytest.raises(ValueError):
+        PredictService.read_batch_uploads([archive], max_files=4)
+
+
+def test_read_batch_uploads_skips_oversized_zip_entries():
+    """Test entries over the uncompressed size limit are not decompressed"""
+    from app.services.PredictService import PredictService
+
+    archive = _Upload('images.zip', _zip([('big.jpg', b'\0' * 1000), ('small.jpg', b'x')]))
+    uploads = PredictService.read_batch_uploads([archive], max_files=4, max_image_bytes=100)
+    assert uploads[0] == ('big.jpg', None, 'Image too large')
+    assert uploads[1] == ('small.jpg', b'x', None)
+
+
+def test_predict_batch_reports_missing_model_results(app, monkeypatch):
+    """Test images are reported as failed when the model returns fewer results than images"""
+    from types import SimpleNamespace
+    from app.services import PredictService as predict_module
+    from app.services.PredictService import PredictService
+
+    class _Model:
+        def predict(self, images, **kwargs):
+            return images[:-1]
+
+    file_manager = SimpleNamespace(id=1, file_type='cls', predict_params=None)
+    monkeypatch.setattr(PredictService, '_load_model',
+                        staticmethod(lambda _id: (file_manager, 'key', _Model(), None)))
+    monkeypatch.setattr(predict_module, 'release_model', lambda key: None)
+    app.config['BATCH_ENABLED'] = False
+
+    with app.app_context():
+        response, status_code = PredictService.predict_batch(1, [('a.jpg', 'a', None), ('b.jpg', 'b', None)])
+
+    assert status_code == HTTPStatus.OK
+    assert [entry['status'] for entry in response['results']] == ['error', 'error']
@@ -0,0 +1,34 @@
+import pytest
+
+from app.services.predict_params import PredictParams
+
+
+def test_parse_converts_form_values():
+    """Test form / query string values are converted and unknown fields ignored"""
+    params = PredictParams.parse({'conf': '0.4', 'classes': '2,0,2', 'max_det': '50', 'id': '3', 'iou': ''})
+    assert params == {'conf': 0.4, 'classes': [0, 2], 'max_det': 50}
+
+
+def test_parse_json_string():
+    """Test stored JSON defaults are parsed"""
+    assert PredictParams.parse('{"imgsz": 320, "top_k": 3}') == {'imgsz': 320, 'top_k': 3}
+
+
+@pytest.mark.parametrize('source', [{'conf': '1.5'}, {'max_det': '0'}, {'imgsz': 'big'}, {'classes': '-1'}, '[1]'])
+def test_parse_rejects_invalid_values(source):
+    """Test invalid predict params"""
+    with pytest.raises(ValueError):
+        PredictParams.parse(source)
+
+
+def test_resolve_request_wins_over_model_defaults():
+    """Test request params override the model defaults and only fields of the model type are kept"""
+    defaults = {'conf': 0.25, 'max_det': 100, 'top_k': 5}
+    assert PredictParams.resolve(defaults, {'conf': 0.6}, 'detect') == {'conf': 0.6, 'max_det': 100}
+    assert PredictParams.resolve(defaults, {'imgsz': 224}, 'cls') == {'imgsz': 224, 'top_k': 5}
+
+
+def test_load_ignores_invalid_stored_defaults():
+    """Test a broken stored value does not break predictions"""
+    assert PredictParams.load('not json') == {}
+    assert PredictParams.load(None) == {}
@@ -0,0 +1,58 @@
+import queue
+import time
+
+import pytest
+
+from app.services.priority import Priority, PriorityQueue
+
+
+class Item:
+    def __init__(self, name, priority, waited=0.0):
+        self.name = name
+        self.priority = priority
+        self.enqueued_at = time.perf_counter() - waited
+
+
+def test_resolve_precedence():
+    """Test the API key class wins over the request field and header"""
+    config = {'PRIORITY_API_KEYS': {'bulk': 'low', 'operator': 'high'}, 'PRIORITY_DEFAULT': 'normal'}
+    assert Priority.resolve('high', None, 'bulk', config) == 'low'
+    assert Priority.resolve(None, None, 'operator', config, 'low') == 'high'
+    assert Priority.resolve('low', 'high', None, config) == 'low'
+    assert Priority.resolve(None, 'LOW', None, config) == 'low'
+    assert Priority.resolve(None, None, 'unknown-key', config) == 'normal'
+    assert Priority.resolve(None, None, None, config, 'low') == 'low'
+    with pytest.raises(ValueError):
+        Priority.resolve('urgent', None, None, config)
+
+
+def test_resolve_client_cannot_raise_priority_by_default():
+    """Test a client declared class only lowers the priority unless overrides are allowed"""
+    config = {'PRIORITY_DEFAULT': 'normal'}
+    assert Priority.resolve('high', None, None, config) == 'normal'
+    assert Priority.resolve(None, 'high', 'unknown-key', config) == 'normal'
+    assert Priority.resolve('normal', None, None, config, 'low') == 'low'
+
+    config['PRIORITY_ALLOW_CLIENT_OVERRIDE'] = True
+    assert Priority.resolve('high', None, None, config) == 'high'
+    assert Priority.resolve('normal', None, None, config, 'low') == 'normal'
+
+
+def test_queue_serves_high_priority_first():
+    """Test higher classes are served first and FIFO within a class"""
+    items = PriorityQueue(starvation_ms=10000)
+    for item in (Item('low', 'low'), Item('normal', 'normal'), Item('high-1', 'high'), Item('high-2', 'high')):
+        items.put(item)
+    assert [items.get().name for _ in range(4)] == ['high-1', 'high-2', 'normal', 'low']
+    with pytest.raises(queue.Empty):
+        items.get(timeout=0.01)
+
+
+def test_queue_promotes_starved_items():
+    """Test low priority work that waited too long is served before new high priority work"""
+    items = PriorityQueue(starvation_ms=100)
+    items.put(Item('high', 'high'))
+    items.put(Item('old-low', 'low', waited=1.0))
+    assert items.get().name == 'old-low'
+    assert items.get().name == 'high'
+    assert items.promoted == 1
@@ -0,0 +1,86 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import numpy as np
+from PIL import Image
+
+from app.services.quantization import QuantizationService
+
+Entry = namedtuple('Entry', ['id', 'filename', 'file_type'])
+
+
+def test_preprocess_matches_classification_input():
+    """Test PIL (RGB) and numpy (BGR) images become the same NCHW float input"""
+    rgb = np.zeros((40, 60, 3), dtype=np.uint8)
+    rgb[:, :, 0] = 255
+    from_pil = QuantizationService.preprocess(Image.fromarray(rgb), 32)
+    from_array = QuantizationService.preprocess(rgb[:, :, ::-1], 32)
+
+    assert from_pil.shape == (1, 3, 32, 32)
+    assert from_pil.dtype == np.float32
+    np.testing.assert_allclose(from_pil, from_array)
+    assert from_pil[0, 0].min() == 1.0
+    assert from_pil[0, 1:].max() == 0.0
+
+
+def test_check_rejects_invalid_requests():
+    """Test only cls models with calibration images are quantized"""
+    image = Image.new('RGB', (8, 8))
+    assert QuantizationService.check(Entry(1, 'model.pt', 'detect'), [image])[1] == HTTPStatus.BAD_REQUEST
+    assert QuantizationService.check(Entry(1, 'model.pt', 'cls'), [image])[1] == HTTPStatus.BAD_REQUEST
+    assert QuantizationService.check(Entry(1, 'missing.pt', 'cls'), [image, image])[1] == HTTPStatus.NOT_FOUND
+
+
+def test_start_runs_in_background_and_rejects_concurrent_jobs(app, monkeypatch):
+    """Test quantize returns 202 at once, a second request while running gets 409"""
+    started = []
+
+    def quantize(file_manager, images, min_agreement=0.98):
+        started.append(file_manager.id)
+        time.sleep(0.2)
+        return {'status': 'success', 'data': {}}, HTTPStatus.OK
+
+    monkeypatch.setattr(QuantizationService, 'jobs', {})
+    monkeypatch.setattr(QuantizationService, 'check', staticmethod(lambda file_manager, images: None))
+    monkeypatch.setattr(QuantizationService, 'quantize', staticmethod(quantize))
+    entry = Entry(7, 'model.pt', 'cls')
+
+    result, status_code = QuantizationService.start(app, entry, ['image'])
+    assert status_code == HTTPStatus.ACCEPTED
+    assert QuantizationService.start(app, entry, ['image'])[1] == HTTPStatus.CONFLICT
+
+    for _ in range(50):
+        if QuantizationService.jobs[7]['status'] != 'running':
+            break
+        time.sleep(0.05)
+    assert QuantizationService.jobs[7]['status'] == 'done'
+    assert QuantizationService.jobs[7]['finished_at']
+    assert started == [7]
+
+
+def test_split_holds_out_validation_images():
+    """Test the validation images are never used for calibration"""
+    images = list(range(10))
+    calibration, validation = QuantizationService.split(images, 0.2)
+
+    assert validation == [0, 5]
+    assert calibration == [1, 2, 3, 4, 6, 7, 8, 9]
+    assert QuantizationService.split([1, 2], 0.2) == ([2], [1])
+
+
+def test_finished_jobs_expire(app, monkeypatch):
+    """Test finished jobs are forgotten after QUANTIZE_JOB_TTL, running ones are kept"""
+    old = (datetime.now() - timedelta(hours=2)).isoformat()
+    monkeypatch.setattr(QuantizationService, 'jobs', {
+        1: {'status': 'done', 'finished_at': old},
+        2: {'status': 'failed', 'finished_at': datetime.now().isoformat()},
+        3: {'status': 'running', 'finished_at': None},
+    })
+    app.config['QUANTIZE_JOB_TTL'] = 3600
+
+    with app.app_context():
+        assert QuantizationService.job(1) is None
+
+    assert sorted(QuantizationService.jobs) == [2, 3]
@@ -0,0 +1,77 @@
+from werkzeug.datastructures import MIMEAccept
+
+from app.services.response_format import COLUMNAR_MIMETYPE, JSON_MIMETYPE, ResponseFormat
+
+DETECT_RESPONSE = {
+    'status': 'success',
+    'type': 'detect',
+    'result': [
+        {'box': [0.0, 0.0, 10.0, 10.0], 'confidence': 0.9, 'class': 0, 'name': 'scratch'},
+        {'box': [5.0, 5.0, 20.0, 20.0], 'confidence': 0.7, 'class': 2, 'name': 'dent'},
+    ]
+}
+
+
+def test_negotiate_defaults_to_json():
+    """Test plain JSON stays the default for clients without or with a wildcard Accept header"""
+    assert ResponseFormat.negotiate(MIMEAccept()) == JSON_MIMETYPE
+    assert ResponseFormat.negotiate(MIMEAccept([('*/*', 1)])) == JSON_MIMETYPE
+    assert ResponseFormat.negotiate(MIMEAccept([(COLUMNAR_MIMETYPE, 1)])) == COLUMNAR_MIMETYPE
+
+
+def test_to_columnar():
+    """Test detections are converted to parallel arrays"""
+    columnar = ResponseFormat.to_columnar(DETECT_RESPONSE)['result']
+    assert columnar['boxes'] == [[0.0, 0.0, 10.0, 10.0], [5.0, 5.0, 20.0, 20.0]]
+    assert columnar['confidence'] == [0.9, 0.7]
+    assert columnar['class'] == [0, 2]
+    assert columnar['names'] == {'0': 'scratch', '2': 'dent'}
+
+
+def test_to_columnar_keeps_cls_and_errors():
+    """Test classification and error responses are not changed"""
+    cls_response = {'status': 'success', 'type': 'cls', 'result': {'class': 1}}
+    assert ResponseFormat.to_columnar(cls_response) == cls_response
+    assert ResponseFormat.to_columnar({'status': 'error', 'message': 'x'}) == {'status': 'error', 'message': 'x'}
+
+
+def test_layout_follows_the_negotiated_mimetype():
+    """Test columnar formats are predicted in the columnar layout"""
+    assert ResponseFormat.layout(JSON_MIMETYPE) == 'rows'
+    assert ResponseFormat.layout(COLUMNAR_MIMETYPE) == 'columnar'
+    assert ResponseFormat.layout('application/msgpack') == 'columnar'
+
+
+def test_to_columnar_keeps_results_already_in_columns():
+    """Test results predicted in the columnar layout are sent as they are"""
+    columns = {'boxes': [[0.0, 0.0, 10.0, 10.0]], 'confidence': [0.9], 'class': [0], 'names': {'0': 'scratch'}}
+    response = {'status': 'success', 'type': 'detect', 'result': columns}
+    assert ResponseFormat.to_columnar(response)['result'] == columns
+
+
+def test_detect_result_columns_come_from_the_tensors():
+    """Test the columnar layout matches the rows converted to columns"""
+    from types import SimpleNamespace
+    from app.services.PredictService import PredictService
+
+    class _Tensor(list):
+        def tolist(self):
+            return list(self)
+
+        def int(self):
+            return _Tensor(int(value) for value in self)
+
+    boxes = SimpleNamespace(xyxy=_Tensor([[0.0, 0.0, 10.0, 10.0], [5.0, 5.0, 20.0, 20.0]]),
+                            conf=_Tensor([0.9, 0.7]), cls=_Tensor([2.0, 0.0]))
+    boxes.cpu = lambda: boxes
+    result = [SimpleNamespace(boxes=boxes, names={0: 'scratch', 2: 'dent'})]
+
+    columns = PredictService.process_detect_result(result, columnar=True)
+
+    assert columns == {
+        'boxes': [[0.0, 0.0, 10.0, 10.0], [5.0, 5.0, 20.0, 20.0]],
+        'confidence': [0.9, 0.7],
+        'class': [2, 0],
+        'names': {'0': 'scratch', '2': 'dent'},
+    }
+    assert ResponseFormat.columnar(PredictService.process_detect_result(result)) == columns
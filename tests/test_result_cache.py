@@ -0,0 +1,64 @@
+import time
+
+from app.services.result_cache import ResultCache
+
+
+def test_result_cache_lru_and_ttl():
+    """Test entries are evicted in LRU order and expire after the TTL"""
+    cache = ResultCache(max_entries=2, ttl=0.05)
+    cache.configure(True)
+    cache.put('a', {'result': 1})
+    cache.put('b', {'result': 2})
+    assert cache.get('a') == {'result': 1}
+    cache.put('c', {'result': 3})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'result': 1}
+
+    time.sleep(0.1)
+    assert cache.get('a') is None
+
+
+def test_result_cache_disk_tier_survives_restart(tmp_path):
+    """Test results stored on disk are found by a new cache instance"""
+    path = str(tmp_path / 'results.sqlite3')
+    key = ResultCache.make_key(1, 'model.pt', 'digest', {'conf': 0.5})
+
+    cache = ResultCache()
+    cache.configure(True, disk_path=path)
+    cache.put(key, {'status': 'success'})
+
+    restarted = ResultCache()
+    restarted.configure(True, disk_path=path)
+    assert restarted.get(key) == {'status': 'success'}
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_predict_caches_only_results_of_the_requested_version(app, monkeypatch):
+    """Test a result served by the previous version during a swap is not cached under the new one"""
+    from types import SimpleNamespace
+    from app.services import PredictService as predict_module
+    from app.services.PredictService import PredictService
+
+    file_manager = SimpleNamespace(id=1, filename='new.pt', path='models/detect', file_type='detect',
+                                   predict_params=None, content_hash='new')
+    cache = ResultCache(max_entries=10, ttl=60)
+    cache.configure(True)
+    served_key = ['old', 'old.pt']
+
+    def run(_id, image, tiling, params, deadline, priority, served):
+        served.append(tuple(served_key))
+        return {'status': 'success', 'result': served_key[1]}, 200
+
+    monkeypatch.setattr(predict_module, 'result_cache', cache)
+    monkeypatch.setattr(predict_module, 'metadata_cache', SimpleNamespace(get=lambda _id: file_manager))
+    monkeypatch.setattr(predict_module, 'model_key', lambda name, folder, _id, content_hash: (content_hash, name))
+    monkeypatch.setattr(PredictService, '_run', staticmethod(run))
+
+    with app.app_context():
+        assert PredictService.predict(1, 'image', digest='digest')[0]['result'] == 'old.pt'
+        assert len(cache) == 0
+
+        served_key[:] = ['new', 'new.pt']
+        assert PredictService.predict(1, 'image', digest='digest')[0]['result'] == 'new.pt'
+        assert len(cache) == 1
@@ -0,0 +1,45 @@
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from app.services.tiling import TiledDetection
+
+
+def test_tiles_cover_image_with_full_size_tiles():
+    """Test tile windows cover the whole image and the last row / column is shifted back"""
+    windows = TiledDetection.tiles(1000, 700, 640, 0.2)
+    assert (0, 0, 640, 640) in windows
+    assert max(x1 for _, _, x1, _ in windows) == 1000
+    assert max(y1 for _, _, _, y1 in windows) == 700
+    assert all(x1 - x0 == 640 and y1 - y0 == 640 for x0, y0, x1, y1 in windows)
+
+
+def test_tiles_small_image_is_one_tile():
+    """Test images smaller than a tile are not split"""
+    assert TiledDetection.tiles(300, 200, 640, 0.2) == [(0, 0, 300, 200)]
+
+
+def test_predict_merges_overlapping_boxes():
+    """Test boxes are moved to image coordinates and duplicates from the overlap are removed"""
+    image = np.zeros((100, 180, 3), dtype=np.uint8)
+
+    def predict_tiles(tiles):
+        # windows are (0, 0, 100, 100) and (80, 0, 180, 100), the same object is seen by both
+        assert len(tiles) == 2
+        first = torch.tensor([[85.0, 10.0, 95.0, 20.0, 0.9, 0.0]])
+        second = torch.tensor([[5.0, 10.0, 15.0, 20.0, 0.8, 0.0], [50.0, 50.0, 60.0, 60.0, 0.7, 1.0]])
+        return [Results(orig_img=tile, path='', names={0: 'a', 1: 'b'}, boxes=boxes)
+                for tile, boxes in zip(tiles, (first, second))]
+
+    result = TiledDetection.predict(image, 100, 0.2, 0.5, predict_tiles)
+    data = result[0].boxes.data
+    assert len(data) == 2
+    assert data[:, 0].tolist() == [85.0, 130.0]
+
+
+def test_count_matches_tiles():
+    """Test the tile count used for the TILE_MAX_TILES check equals the number of windows"""
+    for width, height, tile_size, overlap in [(1000, 700, 640, 0.2), (300, 200, 640, 0.2), (4000, 3000, 32, 0.89),
+                                              (641, 641, 640, 0.0), (5000, 100, 128, 0.5)]:
+        assert TiledDetection.count(width, height, tile_size, overlap) == \
+            len(TiledDetection.tiles(width, height, tile_size, overlap))
@@ -0,0 +1,244 @@
+import hashlib
+import io
+import os
+import time
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import pytest
+
+from app import create_app, db
+from app.config import Config
+from app.models.filemanager import FileManager
+from app.models.upload_session import UploadSession
+from app.services.filemanager import FileManagerService
+from app.services.upload_session import UploadSessionService
+
+
+@pytest.fixture
+def upload_app(tmp_path, monkeypatch):
+    class _Config(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'db.sqlite3'}"
+
+    # part files and models are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    app = create_app(_Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def upload_client(upload_app):
+    return upload_app.test_client()
+
+
+def _create(client, total_size, chunk_size, **fields):
+    response = client.post('/api/v1/filemanager/upload-sessions', data=dict(
+        filename='model.pt', file_type='cls', total_size=total_size, chunk_size=chunk_size, **fields))
+    assert response.status_code == HTTPStatus.CREATED
+    return response.get_json()['data']['upload_id']
+
+
+def _send(client, chunk_number, content, **fields):
+    return client.post('/api/v1/filemanager/upload-chunk-model', data=dict(
+        file=(io.BytesIO(content), 'model.pt'), chunk_number=chunk_number, file_type='cls', **fields))
+
+
+def _part_files(tmp_path):
+    return [name for name in os.listdir(tmp_path / 'models' / 'cls') if name.startswith('.upload_')]
+
+
+def test_create_removes_part_file_when_preallocation_fails(upload_app, tmp_path, monkeypatch):
+    """Test a failed preallocation leaves neither a part file nor a session"""
+    def _fail(path, size):
+        open(path, 'wb').close()
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(UploadSessionService, '_preallocate', staticmethod(_fail))
+    with pytest.raises(OSError):
+        UploadSessionService.create({'filename': 'model.pt', 'file_type': 'cls', 'total_size': 10})
+
+    assert _part_files(tmp_path) == []
+    assert UploadSession.query.count() == 0
+
+
+def test_chunk_response_has_session_filename(upload_client):
+    """Test chunks sent with an upload_id answer with the file name of the session"""
+    upload_id = _create(upload_client, 8, 4)
+
+    response = _send(upload_client, 0, b'abcd', upload_id=upload_id)
+
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.get_json()['filename'] == 'model.pt'
+
+
+def test_concurrent_legacy_uploads_of_one_file_conflict(upload_client):
+    """Test a second legacy upload of the same file is rejected while the first one is running"""
+    first = _send(upload_client, 0, b'abcd', filename='model.pt', total_chunks=2)
+    second = _send(upload_client, 0, b'efgh', filename='model.pt', total_chunks=2)
+
+    assert first.status_code == HTTPStatus.CREATED
+    assert second.status_code == HTTPStatus.CONFLICT
+
+
+def test_failed_completion_opens_the_session_again(upload_client, tmp_path, monkeypatch):
+    """Test a session whose completion failed keeps its chunks and part file for a retry"""
+    upload_id = _create(upload_client, 4, 4, name='model')
+
+    def _fail(new_filename, data, content_hash=None):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(FileManagerService, '_process_final_chunk', staticmethod(_fail))
+    response = _send(upload_client, 0, b'abcd', upload_id=upload_id)
+
+    assert response.status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    session = db.session.get(UploadSession, upload_id)
+    db.session.refresh(session)
+    assert session.status == 'open'
+    assert UploadSessionService.is_complete(session)
+    part_path = UploadSessionService.part_path(session)
+    with open(part_path, 'rb') as part:
+        assert part.read() == b'abcd'
+    # the part file is a copy, chunks written into it must not reach the stored model file
+    stored = tmp_path / 'models' / 'cls' / f"{hashlib.sha256(b'abcd').hexdigest()}.pt"
+    assert stored.exists() and not os.path.samefile(part_path, stored)
+
+
+def test_status_lists_received_ranges_and_missing_chunks(upload_client):
+    """Test the status of a session merges contiguous chunks and lists the missing ones"""
+    upload_id = _create(upload_client, 14, 4)
+    for chunk_number, content in [(0, b'abcd'), (1, b'efgh'), (3, b'mn')]:
+        assert _send(upload_client, chunk_number, content, upload_id=upload_id).status_code == HTTPStatus.CREATED
+
+    response = upload_client.get(f'/api/v1/filemanager/upload-sessions/{upload_id}')
+
+    assert response.status_code == HTTPStatus.OK
+    data = response.get_json()['data']
+    assert data['received_ranges'] == [[0, 8], [12, 14]]
+    assert data['missing_chunks'] == [2]
+    assert data['received_chunks'] == 3
+
+
+def test_chunk_with_checksum_mismatch_is_not_received(upload_client):
+    """Test a chunk that does not match its checksum is rejected and stays missing"""
+    upload_id = _create(upload_client, 8, 4)
+
+    response = _send(upload_client, 0, b'abcd', upload_id=upload_id, checksum=hashlib.sha256(b'abce').hexdigest())
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    status = upload_client.get(f'/api/v1/filemanager/upload-sessions/{upload_id}').get_json()['data']
+    assert status['missing_chunks'] == [0, 1]
+
+
+def test_file_hash_mismatch_opens_the_session_again(upload_client, tmp_path):
+    """Test a completed upload that does not match its whole-file hash has to be sent again"""
+    upload_id = _create(upload_client, 8, 4, sha256=hashlib.sha256(b'abcdefgX').hexdigest())
+    _send(upload_client, 0, b'abcd', upload_id=upload_id)
+
+    response = _send(upload_client, 1, b'efgh', upload_id=upload_id)
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert response.get_json()['upload_id'] == upload_id
+    status = upload_client.get(f'/api/v1/filemanager/upload-sessions/{upload_id}').get_json()['data']
+    assert status['status'] == 'open'
+    assert status['missing_chunks'] == [0, 1]
+    assert len(_part_files(tmp_path)) == 1
+
+
+def test_purge_expired_removes_sessions_and_part_files(upload_app, upload_client, tmp_path):
+    """Test expired sessions are removed with their part files and live ones are kept"""
+    expired_id = _create(upload_client, 8, 4)
+    live_id = _create(upload_client, 8, 4)
+    expired = db.session.get(UploadSession, expired_id)
+    expired.expires_at = datetime.now() - timedelta(minutes=1)
+    db.session.commit()
+
+    assert UploadSessionService.purge_expired(upload_app) == 1
+
+    assert db.session.get(UploadSession, expired_id) is None
+    assert db.session.get(UploadSession, live_id) is not None
+    assert _part_files(tmp_path) == [f'.upload_{live_id}.part']
+
+
+def test_finalize_duplicate_touches_the_stored_file(upload_app, tmp_path):
+    """Test an upload matching a stored file shares it and marks it recently used for the cleanup"""
+    session = UploadSessionService.create({'filename': 'model.pt', 'file_type': 'cls', 'total_size': 4})
+    UploadSessionService.write_chunk(session, 0, io.BytesIO(b'abcd'))
+    content_hash = UploadSessionService.file_hash(session)
+    stored = tmp_path / 'models' / 'cls' / f'{content_hash}.pt'
+    stored.write_bytes(b'abcd')
+    os.utime(stored, (0, 0))
+
+    assert UploadSessionService.finalize(session, content_hash) == f'{content_hash}.pt'
+
+    assert stored.stat().st_mtime > 0
+    assert _part_files(tmp_path) == []
+
+
+def test_legacy_upload_is_bounded_by_the_max_size(upload_app, upload_client):
+    """Test a legacy upload announcing more chunks than UPLOAD_MAX_SIZE allows is rejected"""
+    upload_app.config['UPLOAD_MAX_SIZE'] = 10
+
+    response = _send(upload_client, 0, b'abcd', filename='model.pt', total_chunks=3)
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert UploadSession.query.count() == 0
+
+
+def test_legacy_chunk_outside_the_upload_is_rejected(upload_client, tmp_path):
+    """Test legacy chunks past total_chunks are not written"""
+    assert _send(upload_client, 0, b'abcd', filename='model.pt', total_chunks=2).status_code == HTTPStatus.CREATED
+
+    response = _send(upload_client, 1000, b'efgh', filename='model.pt', total_chunks=2)
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert [os.path.getsize(tmp_path / 'models' / 'cls' / name) for name in _part_files(tmp_path)] == [4]
+
+
+def test_chunk_with_checksum_mismatch_is_not_written(upload_client):
+    """Test a corrupt copy of a chunk leaves the valid copy received before in place"""
+    upload_id = _create(upload_client, 8, 4)
+    checksum = hashlib.sha256(b'abcd').hexdigest()
+    assert _send(upload_client, 0, b'abcd', upload_id=upload_id, checksum=checksum).status_code == HTTPStatus.CREATED
+
+    response = _send(upload_client, 0, b'abce', upload_id=upload_id, checksum=checksum)
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    session = db.session.get(UploadSession, upload_id)
+    with open(UploadSessionService.part_path(session), 'rb') as part:
+        assert part.read(4) == b'abcd'
+    status = upload_client.get(f'/api/v1/filemanager/upload-sessions/{upload_id}').get_json()['data']
+    assert status['missing_chunks'] == [1]
+
+
+def _stored_model(tmp_path, age):
+    directory = tmp_path / 'models' / 'cls'
+    directory.mkdir(parents=True, exist_ok=True)
+    stored = directory / f"{'b' * 64}.pt"
+    stored.write_bytes(b'abcd')
+    os.utime(stored, (time.time() - age, time.time() - age))
+    entry = FileManager(name='model', filename=stored.name, file_type='cls', content_hash='b' * 64)
+    db.session.add(entry)
+    db.session.commit()
+    return entry.id, stored
+
+
+def test_delete_removes_the_unreferenced_model_file(upload_app, tmp_path):
+    """Test deleting the last entry of a model file removes it"""
+    _id, stored = _stored_model(tmp_path, 3600)
+
+    FileManagerService.delete_file({'id': _id})
+
+    assert os.listdir(stored.parent) == []
+
+
+def test_delete_keeps_a_model_file_an_upload_was_deduplicated_onto(upload_app, tmp_path):
+    """Test a model file touched by a deduplicated upload whose entry is not committed yet is kept"""
+    _id, stored = _stored_model(tmp_path, 0)
+
+    FileManagerService.delete_file({'id': _id})
+
+    assert os.listdir(stored.parent) == [stored.name]
+    assert FileManager.query.count() == 0